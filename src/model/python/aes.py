@@ -5,7 +5,7 @@
 # aes.py
 # ------
 # Simple, pure Python, word based model of the AES cipher with
-# support for 128 and 256 bit keys.
+# support for 128, 192 and 256 bit keys.
 #
 #
 # Author: Joachim Strömbergson
@@ -44,6 +44,11 @@
 #-------------------------------------------------------------------
 import sys
 
+from aes_sbox import sbox, inv_sbox
+from aes_galois import mul2, mul3, mul9, mul11, mul13, mul14
+import aes_key_schedule
+from aes_key_schedule import rcon
+
 
 #-------------------------------------------------------------------
 # Constants.
@@ -52,77 +57,10 @@ VERBOSE = True
 DUMP_VARS = True
 
 AES_128_ROUNDS = 10
+AES_192_ROUNDS = 12
 AES_256_ROUNDS = 14
 
 
-sbox = [0x63, 0x7c, 0x77, 0x7b, 0xf2, 0x6b, 0x6f, 0xc5,
-        0x30, 0x01, 0x67, 0x2b, 0xfe, 0xd7, 0xab, 0x76,
-        0xca, 0x82, 0xc9, 0x7d, 0xfa, 0x59, 0x47, 0xf0,
-        0xad, 0xd4, 0xa2, 0xaf, 0x9c, 0xa4, 0x72, 0xc0,
-        0xb7, 0xfd, 0x93, 0x26, 0x36, 0x3f, 0xf7, 0xcc,
-        0x34, 0xa5, 0xe5, 0xf1, 0x71, 0xd8, 0x31, 0x15,
-        0x04, 0xc7, 0x23, 0xc3, 0x18, 0x96, 0x05, 0x9a,
-        0x07, 0x12, 0x80, 0xe2, 0xeb, 0x27, 0xb2, 0x75,
-        0x09, 0x83, 0x2c, 0x1a, 0x1b, 0x6e, 0x5a, 0xa0,
-        0x52, 0x3b, 0xd6, 0xb3, 0x29, 0xe3, 0x2f, 0x84,
-        0x53, 0xd1, 0x00, 0xed, 0x20, 0xfc, 0xb1, 0x5b,
-        0x6a, 0xcb, 0xbe, 0x39, 0x4a, 0x4c, 0x58, 0xcf,
-        0xd0, 0xef, 0xaa, 0xfb, 0x43, 0x4d, 0x33, 0x85,
-        0x45, 0xf9, 0x02, 0x7f, 0x50, 0x3c, 0x9f, 0xa8,
-        0x51, 0xa3, 0x40, 0x8f, 0x92, 0x9d, 0x38, 0xf5,
-        0xbc, 0xb6, 0xda, 0x21, 0x10, 0xff, 0xf3, 0xd2,
-        0xcd, 0x0c, 0x13, 0xec, 0x5f, 0x97, 0x44, 0x17,
-        0xc4, 0xa7, 0x7e, 0x3d, 0x64, 0x5d, 0x19, 0x73,
-        0x60, 0x81, 0x4f, 0xdc, 0x22, 0x2a, 0x90, 0x88,
-        0x46, 0xee, 0xb8, 0x14, 0xde, 0x5e, 0x0b, 0xdb,
-        0xe0, 0x32, 0x3a, 0x0a, 0x49, 0x06, 0x24, 0x5c,
-        0xc2, 0xd3, 0xac, 0x62, 0x91, 0x95, 0xe4, 0x79,
-        0xe7, 0xc8, 0x37, 0x6d, 0x8d, 0xd5, 0x4e, 0xa9,
-        0x6c, 0x56, 0xf4, 0xea, 0x65, 0x7a, 0xae, 0x08,
-        0xba, 0x78, 0x25, 0x2e, 0x1c, 0xa6, 0xb4, 0xc6,
-        0xe8, 0xdd, 0x74, 0x1f, 0x4b, 0xbd, 0x8b, 0x8a,
-        0x70, 0x3e, 0xb5, 0x66, 0x48, 0x03, 0xf6, 0x0e,
-        0x61, 0x35, 0x57, 0xb9, 0x86, 0xc1, 0x1d, 0x9e,
-        0xe1, 0xf8, 0x98, 0x11, 0x69, 0xd9, 0x8e, 0x94,
-        0x9b, 0x1e, 0x87, 0xe9, 0xce, 0x55, 0x28, 0xdf,
-        0x8c, 0xa1, 0x89, 0x0d, 0xbf, 0xe6, 0x42, 0x68,
-        0x41, 0x99, 0x2d, 0x0f, 0xb0, 0x54, 0xbb, 0x16]
-
-
-inv_sbox = [0x52, 0x09, 0x6a, 0xd5, 0x30, 0x36, 0xa5, 0x38,
-            0xbf, 0x40, 0xa3, 0x9e, 0x81, 0xf3, 0xd7, 0xfb,
-            0x7c, 0xe3, 0x39, 0x82, 0x9b, 0x2f, 0xff, 0x87,
-            0x34, 0x8e, 0x43, 0x44, 0xc4, 0xde, 0xe9, 0xcb,
-            0x54, 0x7b, 0x94, 0x32, 0xa6, 0xc2, 0x23, 0x3d,
-            0xee, 0x4c, 0x95, 0x0b, 0x42, 0xfa, 0xc3, 0x4e,
-            0x08, 0x2e, 0xa1, 0x66, 0x28, 0xd9, 0x24, 0xb2,
-            0x76, 0x5b, 0xa2, 0x49, 0x6d, 0x8b, 0xd1, 0x25,
-            0x72, 0xf8, 0xf6, 0x64, 0x86, 0x68, 0x98, 0x16,
-            0xd4, 0xa4, 0x5c, 0xcc, 0x5d, 0x65, 0xb6, 0x92,
-            0x6c, 0x70, 0x48, 0x50, 0xfd, 0xed, 0xb9, 0xda,
-            0x5e, 0x15, 0x46, 0x57, 0xa7, 0x8d, 0x9d, 0x84,
-            0x90, 0xd8, 0xab, 0x00, 0x8c, 0xbc, 0xd3, 0x0a,
-            0xf7, 0xe4, 0x58, 0x05, 0xb8, 0xb3, 0x45, 0x06,
-            0xd0, 0x2c, 0x1e, 0x8f, 0xca, 0x3f, 0x0f, 0x02,
-            0xc1, 0xaf, 0xbd, 0x03, 0x01, 0x13, 0x8a, 0x6b,
-            0x3a, 0x91, 0x11, 0x41, 0x4f, 0x67, 0xdc, 0xea,
-            0x97, 0xf2, 0xcf, 0xce, 0xf0, 0xb4, 0xe6, 0x73,
-            0x96, 0xac, 0x74, 0x22, 0xe7, 0xad, 0x35, 0x85,
-            0xe2, 0xf9, 0x37, 0xe8, 0x1c, 0x75, 0xdf, 0x6e,
-            0x47, 0xf1, 0x1a, 0x71, 0x1d, 0x29, 0xc5, 0x89,
-            0x6f, 0xb7, 0x62, 0x0e, 0xaa, 0x18, 0xbe, 0x1b,
-            0xfc, 0x56, 0x3e, 0x4b, 0xc6, 0xd2, 0x79, 0x20,
-            0x9a, 0xdb, 0xc0, 0xfe, 0x78, 0xcd, 0x5a, 0xf4,
-            0x1f, 0xdd, 0xa8, 0x33, 0x88, 0x07, 0xc7, 0x31,
-            0xb1, 0x12, 0x10, 0x59, 0x27, 0x80, 0xec, 0x5f,
-            0x60, 0x51, 0x7f, 0xa9, 0x19, 0xb5, 0x4a, 0x0d,
-            0x2d, 0xe5, 0x7a, 0x9f, 0x93, 0xc9, 0x9c, 0xef,
-            0xa0, 0xe0, 0x3b, 0x4d, 0xae, 0x2a, 0xf5, 0xb0,
-            0xc8, 0xeb, 0xbb, 0x3c, 0x83, 0x53, 0x99, 0x61,
-            0x17, 0x2b, 0x04, 0x7e, 0xba, 0x77, 0xd6, 0x26,
-            0xe1, 0x69, 0x14, 0x63, 0x55, 0x21, 0x0c, 0x7d]
-
-
 #-------------------------------------------------------------------
 # check_block()
 #
@@ -179,6 +117,10 @@ def print_key(key):
         (k0, k1, k2, k3, k4, k5, k6, k7) = key
         print_block((k0, k1, k2, k3))
         print_block((k4, k5, k6, k7))
+    elif len(key) == 6:
+        (k0, k1, k2, k3, k4, k5) = key
+        print_block((k0, k1, k2, k3))
+        print("0x%08x, 0x%08x" % (k4, k5))
     else:
         print_block(key)
 
@@ -212,7 +154,7 @@ def w2b(w):
 # The specific Galois Multiplication by two for a given byte.
 #-------------------------------------------------------------------
 def gm2(b):
-    return ((b << 1) ^ (0x1b & ((b >> 7) * 0xff))) & 0xff
+    return mul2[b]
 
 
 #-------------------------------------------------------------------
@@ -221,7 +163,7 @@ def gm2(b):
 # The specific Galois Multiplication by three for a given byte.
 #-------------------------------------------------------------------
 def gm3(b):
-    return gm2(b) ^ b
+    return mul3[b]
 
 
 #-------------------------------------------------------------------
@@ -248,7 +190,7 @@ def gm8(b):
 # The specific Galois Multiplication by nine for a given byte.
 #-------------------------------------------------------------------
 def gm09(b):
-    return gm8(b) ^ b
+    return mul9[b]
 
 
 #-------------------------------------------------------------------
@@ -257,7 +199,7 @@ def gm09(b):
 # The specific Galois Multiplication by 11 for a given byte.
 #-------------------------------------------------------------------
 def gm11(b):
-    return gm8(b) ^ gm2(b) ^ b
+    return mul11[b]
 
 
 #-------------------------------------------------------------------
@@ -266,7 +208,7 @@ def gm11(b):
 # The specific Galois Multiplication by 13 for a given byte.
 #-------------------------------------------------------------------
 def gm13(b):
-    return gm8(b) ^ gm4(b) ^ b
+    return mul13[b]
 
 
 #-------------------------------------------------------------------
@@ -275,7 +217,7 @@ def gm13(b):
 # The specific Galois Multiplication by 14 for a given byte.
 #-------------------------------------------------------------------
 def gm14(b):
-    return gm8(b) ^ gm4(b) ^ gm2(b)
+    return mul14[b]
 
 
 #-------------------------------------------------------------------
@@ -342,50 +284,16 @@ def rolx(w, x):
     return ((w << x) | (w >> (32 - x))) & 0xffffffff
 
 
-#-------------------------------------------------------------------
-# next_128bit_key()
-#
-# Generate the next four key words for aes-128 based on given
-# rcon and previous key words.
-#-------------------------------------------------------------------
-def next_128bit_key(prev_key, rcon):
-    (w0, w1, w2, w3) = prev_key
-
-    rol = rolx(w3, 8)
-    subst = substw(rol)
-    t = subst ^ (rcon << 24)
-
-    k0 = w0 ^ t
-    k1 = w1 ^ w0 ^ t
-    k2 = w2 ^ w1 ^ w0 ^ t
-    k3 = w3 ^ w2 ^ w1 ^ w0 ^ t
-
-    if VERBOSE:
-        print("Inside next 128bit key:")
-        print("w0 = 0x%08x, w1 = 0x%08x, w2 = 0x%08x, w3 = 0x%08x" %
-              (w0, w1, w2, w3))
-        print("rol = 0x%08x, subst = 0x%08x, rcon = 0x%02x, t = 0x%08x" %
-              (rol, subst, rcon, t))
-        print("k0 = 0x%08x, k1 = 0x%08x, k2 = 0x%08x, k3 = 0x%08x" %
-              (k0, k1, k2, k3))
-
-    return (k0, k1, k2, k3)
-
-
 #-------------------------------------------------------------------
 # key_gen128()
 #
-# Generating the keys for 128 bit keys.
+# Generating the keys for 128 bit keys with the shared key
+# schedule.
 #-------------------------------------------------------------------
 def key_gen128(key):
     print("Doing the 128 bit key expansion")
 
-    round_keys = []
-
-    round_keys.append(key)
-
-    for i in range(10):
-        round_keys.append(next_128bit_key(round_keys[i], get_rcon(i + 1)))
+    round_keys = aes_key_schedule.key_gen(key)
 
     if VERBOSE:
         print("Input key:")
@@ -401,91 +309,41 @@ def key_gen128(key):
 
 
 #-------------------------------------------------------------------
-# next_256bit_key_a()
+# key_gen192()
 #
-# Generate the next four key words for aes-256 using algorithm A
-# based on given rcon and the previous two keys.
+# Generating the keys for 192 bit keys. The six word key does
+# not align with the four word round keys, so the expansion is
+# done by the shared, non printing key schedule.
 #-------------------------------------------------------------------
-def next_256it_key_a(key0, key1, rcon):
-    (w0, w1, w2, w3) = key0
-    (w4, w5, w6, w7) = key1
-
-    sw = substw(rolx(w7, 8))
-    rw = (rcon << 24)
-    t = sw ^ rw
+def key_gen192(key):
+    round_keys = aes_key_schedule.key_gen(key)
 
-    k0 = w0 ^ t
-    k1 = w1 ^ w0 ^ t
-    k2 = w2 ^ w1 ^ w0 ^ t
-    k3 = w3 ^ w2 ^ w1 ^ w0 ^ t
-
-    if (DUMP_VARS):
-        print("next_256bit_key_a:")
-        print("w0 = 0x%08x, w0 = 0x%08x, w0 = 0x%08x, w0 = 0x%08x" % (w0, w1, w2, w3))
-        print("w4 = 0x%08x, w5 = 0x%08x, w6 = 0x%08x, w7 = 0x%08x" % (w4, w5, w6, w7))
-        print("t = 0x%08x, sw = 0x%08x, rw = 0x%08x" % (t, sw, rw))
-        print("k0 = 0x%08x, k0 = 0x%08x, k0 = 0x%08x, k0 = 0x%08x" % (k0, k1, k2, k3))
+    if VERBOSE:
+        print("Input key:")
+        print_key(key)
         print("")
 
-    return (k0, k1, k2, k3)
-
-
-#-------------------------------------------------------------------
-# next_256bit_key_b()
-#
-# Generate the next four key words for aes-256 using algorithm B
-# based on given previous eight keywords.
-#-------------------------------------------------------------------
-def next_256it_key_b(key0, key1):
-    (w0, w1, w2, w3) = key0
-    (w4, w5, w6, w7) = key1
-
-    t = substw(w7)
-
-    k0 = w0 ^ t
-    k1 = w1 ^ w0 ^ t
-    k2 = w2 ^ w1 ^ w0 ^ t
-    k3 = w3 ^ w2 ^ w1 ^ w0 ^ t
-
-    if (DUMP_VARS):
-        print("next_256bit_key_b:")
-        print("w0 = 0x%08x, w0 = 0x%08x, w0 = 0x%08x, w0 = 0x%08x" % (w0, w1, w2, w3))
-        print("w4 = 0x%08x, w5 = 0x%08x, w6 = 0x%08x, w7 = 0x%08x" % (w4, w5, w6, w7))
-        print("t = 0x%08x" % (t))
-        print("k0 = 0x%08x, k0 = 0x%08x, k0 = 0x%08x, k0 = 0x%08x" % (k0, k1, k2, k3))
+        print("Generated keys:")
+        for k in round_keys:
+            print_block(k)
         print("")
 
-    return (k0, k1, k2, k3)
+    return round_keys
 
 
 #-------------------------------------------------------------------
 # key_gen256()
 #
-# Generating the keys for 256 bit keys.
+# Generating the keys for 256 bit keys with the shared key
+# schedule.
 #-------------------------------------------------------------------
 def key_gen256(key):
-    round_keys = []
-    (k0, k1, k2, k3, k4, k5, k6, k7) = key
-
-    round_keys.append((k0, k1, k2, k3))
-    round_keys.append((k4, k5, k6, k7))
-
-    j = 1
-    for i in range(0, (AES_256_ROUNDS - 2), 2):
-        k = next_256it_key_a(round_keys[i], round_keys[i + 1], get_rcon(j))
-        round_keys.append(k)
-        k = next_256it_key_b(round_keys[i + 1], round_keys[i + 2])
-        round_keys.append(k)
-        j += 1
-
-    # One final key needs to be generated.
-    k = next_256it_key_a(round_keys[12], round_keys[13], get_rcon(7))
-    round_keys.append(k)
+    round_keys = aes_key_schedule.key_gen(key)
 
     if VERBOSE:
         print("Input key:")
-        print_block((k0, k1, k2, k3))
-        print_block((k4, k5, k6, k7))
+        print_block(key[0 : 4])
+        print_block(key[4 : 8])
         print("")
 
         print("Generated keys:")
@@ -499,16 +357,11 @@ def key_gen256(key):
 #-------------------------------------------------------------------
 # get_rcon()
 #
-# Function implementation of rcon. Calculates rcon for a
-# given round. This could be implemented as an iterator.
+# Returns rcon for a given round from the precomputed table
+# in the shared key schedule.
 #-------------------------------------------------------------------
 def get_rcon(round):
-    rcon = 0x8d
-
-    for i in range(0, round):
-        rcon = ((rcon << 1) ^ (0x11b & - (rcon >> 7))) & 0xff
-
-    return rcon
+    return rcon[round]
 
 
 #-------------------------------------------------------------------
@@ -539,14 +392,17 @@ def addroundkey(key, block):
 # Perform bit mixing of the given words.
 #-------------------------------------------------------------------
 def mixw(w):
-    (b0, b1, b2, b3) = w2b(w)
+    b0 = w >> 24
+    b1 = w >> 16 & 0xff
+    b2 = w >> 8 & 0xff
+    b3 = w & 0xff
 
-    mb0 = gm2(b0) ^ gm3(b1) ^ b2      ^ b3
-    mb1 = b0      ^ gm2(b1) ^ gm3(b2) ^ b3
-    mb2 = b0      ^ b1      ^ gm2(b2) ^ gm3(b3)
-    mb3 = gm3(b0) ^ b1      ^ b2      ^ gm2(b3)
+    mb0 = mul2[b0] ^ mul3[b1] ^ b2       ^ b3
+    mb1 = b0       ^ mul2[b1] ^ mul3[b2] ^ b3
+    mb2 = b0       ^ b1       ^ mul2[b2] ^ mul3[b3]
+    mb3 = mul3[b0] ^ b1       ^ b2       ^ mul2[b3]
 
-    return b2w(mb0, mb1, mb2, mb3)
+    return (mb0 << 24) | (mb1 << 16) | (mb2 << 8) | mb3
 
 
 #-------------------------------------------------------------------
@@ -634,6 +490,9 @@ def aes_encipher_block(key, block):
     if len(key) == 4:
         round_keys = key_gen128(key)
         num_rounds = AES_128_ROUNDS
+    elif len(key) == 6:
+        round_keys = key_gen192(key)
+        num_rounds = AES_192_ROUNDS
     else:
         round_keys = key_gen256(key)
         num_rounds = AES_256_ROUNDS
@@ -669,14 +528,17 @@ def aes_encipher_block(key, block):
 # Perform inverse bit mixing of the given words.
 #-------------------------------------------------------------------
 def inv_mixw(w):
-    (b0, b1, b2, b3) = w2b(w)
+    b0 = w >> 24
+    b1 = w >> 16 & 0xff
+    b2 = w >> 8 & 0xff
+    b3 = w & 0xff
 
-    mb0 = gm14(b0) ^ gm11(b1) ^ gm13(b2) ^ gm09(b3)
-    mb1 = gm09(b0) ^ gm14(b1) ^ gm11(b2) ^ gm13(b3)
-    mb2 = gm13(b0) ^ gm09(b1) ^ gm14(b2) ^ gm11(b3)
-    mb3 = gm11(b0) ^ gm13(b1) ^ gm09(b2) ^ gm14(b3)
+    mb0 = mul14[b0] ^ mul11[b1] ^ mul13[b2] ^ mul9[b3]
+    mb1 = mul9[b0]  ^ mul14[b1] ^ mul11[b2] ^ mul13[b3]
+    mb2 = mul13[b0] ^ mul9[b1]  ^ mul14[b2] ^ mul11[b3]
+    mb3 = mul11[b0] ^ mul13[b1] ^ mul9[b2]  ^ mul14[b3]
 
-    return b2w(mb0, mb1, mb2, mb3)
+    return (mb0 << 24) | (mb1 << 16) | (mb2 << 8) | mb3
 
 
 #-------------------------------------------------------------------
@@ -764,6 +626,9 @@ def aes_decipher_block(key, block):
     if len(key) == 4:
         round_keys = key_gen128(key)
         num_rounds = AES_128_ROUNDS
+    elif len(key) == 6:
+        round_keys = key_gen192(key)
+        num_rounds = AES_192_ROUNDS
     else:
         round_keys = key_gen256(key)
         num_rounds = AES_256_ROUNDS
@@ -792,6 +657,68 @@ def aes_decipher_block(key, block):
     return res_block
 
 
+#-------------------------------------------------------------------
+# eq_dec_key_gen()
+#
+# Generate the round keys for the equivalent inverse cipher
+# from the given round keys. All but the first and last round
+# keys are passed through InvMixColumns.
+#-------------------------------------------------------------------
+def eq_dec_key_gen(round_keys):
+    dec_keys = [round_keys[0]]
+    for (k0, k1, k2, k3) in round_keys[1 : -1]:
+        dec_keys.append((inv_mixw(k0), inv_mixw(k1), inv_mixw(k2), inv_mixw(k3)))
+    dec_keys.append(round_keys[-1])
+    return dec_keys
+
+
+#-------------------------------------------------------------------
+# aes_eq_decipher_block()
+#
+# Perform AES decipher operation for the given block using the
+# equivalent inverse cipher in FIPS-197 section 5.3.5. The rounds
+# have the same order of operations as the encipher rounds.
+#-------------------------------------------------------------------
+def aes_eq_decipher_block(key, block):
+    tmp_block = block[:]
+
+    # Get round keys based on the given key.
+    if len(key) == 4:
+        round_keys = key_gen128(key)
+        num_rounds = AES_128_ROUNDS
+    elif len(key) == 6:
+        round_keys = key_gen192(key)
+        num_rounds = AES_192_ROUNDS
+    else:
+        round_keys = key_gen256(key)
+        num_rounds = AES_256_ROUNDS
+
+    dec_keys = eq_dec_key_gen(round_keys)
+
+    # Initial round
+    print("  Initial AddRoundKeys round.")
+    tmp_block4 = addroundkey(dec_keys[num_rounds], tmp_block)
+
+    # Main rounds
+    for i in range(1 , (num_rounds)):
+        print("")
+        print("  Round %02d" % i)
+        print("  ---------")
+
+        tmp_block1 = inv_subbytes(tmp_block4)
+        tmp_block2 = inv_shiftrows(tmp_block1)
+        tmp_block3 = inv_mixcolumns(tmp_block2)
+        tmp_block4 = addroundkey(dec_keys[num_rounds - i], tmp_block3)
+
+    # Final round
+    print("  Final, partial round.")
+    tmp_block1 = inv_subbytes(tmp_block4)
+    tmp_block2 = inv_shiftrows(tmp_block1)
+    res_block = addroundkey(dec_keys[0], tmp_block2)
+
+    return res_block
+
+
 #-------------------------------------------------------------------
 # test_mixcolumns()
 #
@@ -828,6 +755,8 @@ def single_aes_test(title, encdec, key, block, expected):
 
     if encdec == "encipher":
         result = aes_encipher_block(key, block)
+    elif encdec == "eq_decipher":
+        result = aes_eq_decipher_block(key, block)
     else:
         result = aes_decipher_block(key, block)
     return check_block(result, expected)
@@ -836,10 +765,12 @@ def single_aes_test(title, encdec, key, block, expected):
 #-------------------------------------------------------------------
 # test_aes()
 #
-# Test the AES implementation with 128 and 256 bit keys.
+# Test the AES implementation with 128, 192 and 256 bit keys.
 #-------------------------------------------------------------------
 def test_aes():
     nist_aes128_key = (0x2b7e1516, 0x28aed2a6, 0xabf71588, 0x09cf4f3c)
+    nist_aes192_key = (0x8e73b0f7, 0xda0e6452, 0xc810f32b, 0x809079e5,
+                       0x62f8ead2, 0x522c6b7b)
     nist_aes256_key = (0x603deb10, 0x15ca71be, 0x2b73aef0, 0x857d7781,
                        0x1f352c07, 0x3b6108d7, 0x2d9810a3, 0x0914dff4)
 
@@ -853,6 +784,17 @@ def test_aes():
     nist_exp128_2 = (0x43b1cd7f, 0x598ece23, 0x881b00e3, 0xed030688)
     nist_exp128_3 = (0x7b0c785e, 0x27e8ad3f, 0x82232071, 0x04725dd4)
 
+    nist_exp192_0 = (0xbd334f1d, 0x6e45f25f, 0xf712a214, 0x571fa5cc)
+    nist_exp192_1 = (0x97410484, 0x6d0ad3ad, 0x7734ecb3, 0xecee4eef)
+    nist_exp192_2 = (0xef7afd22, 0x70e2e60a, 0xdce0ba2f, 0xace6444e)
+    nist_exp192_3 = (0x9a4b41ba, 0x738d6c72, 0xfb166916, 0x03c18e0e)
+
+    # FIPS-197 Appendix C.2 example vector.
+    fips_aes192_key = (0x00010203, 0x04050607, 0x08090a0b, 0x0c0d0e0f,
+                       0x10111213, 0x14151617)
+    fips_plaintext  = (0x00112233, 0x44556677, 0x8899aabb, 0xccddeeff)
+    fips_exp192     = (0xdda97ca4, 0x864cdfe0, 0x6eaf70a0, 0xec0d7191)
+
     nist_exp256_0 = (0xf3eed1bd, 0xb5d2a03c, 0x064b5a7e, 0x3db181f8)
     nist_exp256_1 = (0x591ccb10, 0xd410ed26, 0xdc5ba74a, 0x31362870)
     nist_exp256_2 = (0xb6ed21b9, 0x9ca6f4f9, 0xf153e7b1, 0xbeafed1d)
@@ -880,6 +822,26 @@ def test_aes():
          nist_aes128_key, nist_plaintext3, nist_exp128_3)
         tc += 1
 
+        tc_errors += single_aes_test("Test 0 for AES-192.", "encipher",
+         nist_aes192_key, nist_plaintext0, nist_exp192_0)
+        tc += 1
+
+        tc_errors += single_aes_test("Test 1 for AES-192.", "encipher",
+         nist_aes192_key, nist_plaintext1, nist_exp192_1)
+        tc += 1
+
+        tc_errors += single_aes_test("Test 2 for AES-192.", "encipher",
+         nist_aes192_key, nist_plaintext2, nist_exp192_2)
+        tc += 1
+
+        tc_errors += single_aes_test("Test 3 for AES-192.", "encipher",
+         nist_aes192_key, nist_plaintext3, nist_exp192_3)
+        tc += 1
+
+        tc_errors += single_aes_test("FIPS-197 C.2 test for AES-192.", "encipher",
+         fips_aes192_key, fips_plaintext, fips_exp192)
+        tc += 1
+
         tc_errors += single_aes_test("Test 0 for AES-256.", "encipher",
          nist_aes256_key, nist_plaintext0, nist_exp256_0)
         tc += 1
@@ -916,6 +878,26 @@ def test_aes():
          nist_aes128_key, nist_exp128_3, nist_plaintext3)
         tc += 1
 
+        tc_errors += single_aes_test("Test 0 for AES-192.", "decipher",
+         nist_aes192_key, nist_exp192_0, nist_plaintext0)
+        tc += 1
+
+        tc_errors += single_aes_test("Test 1 for AES-192.", "decipher",
+         nist_aes192_key, nist_exp192_1, nist_plaintext1)
+        tc += 1
+
+        tc_errors += single_aes_test("Test 2 for AES-192.", "decipher",
+         nist_aes192_key, nist_exp192_2, nist_plaintext2)
+        tc += 1
+
+        tc_errors += single_aes_test("Test 3 for AES-192.", "decipher",
+         nist_aes192_key, nist_exp192_3, nist_plaintext3)
+        tc += 1
+
+        tc_errors += single_aes_test("FIPS-197 C.2 test for AES-192.", "decipher",
+         fips_aes192_key, fips_exp192, fips_plaintext)
+        tc += 1
+
         tc_errors += single_aes_test("Test 0 for AES-256.", "decipher",
          nist_aes256_key, nist_exp256_0, nist_plaintext0)
         tc += 1
@@ -932,6 +914,22 @@ def test_aes():
          nist_aes256_key, nist_exp256_3, nist_plaintext3)
         tc += 1
 
+
+        print("")
+        print("   AES Equivalent Inverse Cipher tests")
+        print("   ===================================")
+        tc_errors += single_aes_test("Test 0 for AES-128.", "eq_decipher",
+         nist_aes128_key, nist_exp128_0, nist_plaintext0)
+        tc += 1
+
+        tc_errors += single_aes_test("FIPS-197 C.2 test for AES-192.", "eq_decipher",
+         fips_aes192_key, fips_exp192, fips_plaintext)
+        tc += 1
+
+        tc_errors += single_aes_test("Test 0 for AES-256.", "eq_decipher",
+         nist_aes256_key, nist_exp256_0, nist_plaintext0)
+        tc += 1
+
         print("Number of test cases executed: %d" % tc)
         if (tc_errors == 0):
             print("All test cases OK.")
@@ -943,8 +941,13 @@ def test_aes():
 # main()
 #
 # If executed tests the ChaCha class using known test vectors.
+# With arguments runs the file encipher command line instead.
 #-------------------------------------------------------------------
 def main():
+    if len(sys.argv) > 1:
+        import aes_cli
+        return aes_cli.run_cli(sys.argv[1:])
+
     print("Testing the AES cipher model")
     print("============================")
     print
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_bench.py
+# ------------
+# Benchmark harness for the model. Times the primitives, single
+# block encipher and decipher for each engine and the bulk
+# throughput of each mode, and emits the results as JSON.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2014, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import io
+import json
+import time
+import timeit
+import argparse
+import platform
+import contextlib
+
+import aes
+import aes_fast
+import aes_ttable
+import aes_state
+import aes_bulk
+import aes_modes
+import aes_gcm
+import aes_ccm
+import aes_cmac
+import aes_xts
+import aes_key_schedule
+from aes_bulk import BLOCK_SIZE, block_struct
+from aes_key_cache import expand_key
+
+try:
+    import numpy
+    import aes_numpy
+except ImportError:
+    numpy = None
+    aes_numpy = None
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+DEFAULT_SIZES = (1 << 10, 1 << 20, 100 << 20)
+
+# Min time in seconds a measurement is repeated for.
+MIN_TIME = 0.2
+
+BENCH_KEY128 = (0x2b7e1516, 0x28aed2a6, 0xabf71588, 0x09cf4f3c)
+BENCH_KEY256 = (0x603deb10, 0x15ca71be, 0x2b73aef0, 0x857d7781,
+                0x1f352c07, 0x3b6108d7, 0x2d9810a3, 0x0914dff4)
+BENCH_BLOCK = (0x6bc1bee2, 0x2e409f96, 0xe93d7e11, 0x7393172a)
+
+
+#-------------------------------------------------------------------
+# quiet()
+#
+# Context manager turning off the tracing in the aes module and
+# hiding its output while a measurement runs.
+#-------------------------------------------------------------------
+@contextlib.contextmanager
+def quiet():
+    verbose = aes.VERBOSE
+    aes.VERBOSE = False
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        aes.VERBOSE = verbose
+
+
+#-------------------------------------------------------------------
+# time_call()
+#
+# Return the best time in seconds per call of the given function
+# over three runs of at least MIN_TIME seconds each.
+#-------------------------------------------------------------------
+def time_call(function):
+    timer = timeit.Timer(function)
+    (number, elapsed) = timer.autorange()
+    while elapsed < MIN_TIME:
+        number *= 2
+        elapsed = timer.timeit(number)
+
+    best = min([elapsed] + timer.repeat(2, number))
+    return best / number
+
+
+#-------------------------------------------------------------------
+# time_once()
+#
+# Return the time in seconds for one call of the given function.
+# Used for the large inputs where a single call is long enough.
+#-------------------------------------------------------------------
+def time_once(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+#-------------------------------------------------------------------
+# scalar_encrypt_blocks()
+#
+# Bulk encipher with the silent scalar engine one block at a
+# time, for comparison with the table and NumPy engines.
+#-------------------------------------------------------------------
+def scalar_encrypt_blocks(key, data):
+    rk = expand_key(key).enc_keys
+    out = bytearray(len(data))
+    for offset in range(0, len(data), BLOCK_SIZE):
+        block_struct.pack_into(out, offset, *aes_fast.encipher_block(
+            rk, block_struct.unpack_from(data, offset)))
+    return out
+
+
+#-------------------------------------------------------------------
+# state_encrypt_blocks()
+#-------------------------------------------------------------------
+def state_encrypt_blocks(key, data):
+    return aes_state.encrypt_blocks_into(key, data, bytearray(len(data)))
+
+
+#-------------------------------------------------------------------
+# get_primitives()
+#
+# Return (name, engine, function) for the primitive operations.
+#-------------------------------------------------------------------
+def get_primitives():
+    w = 0x01234567
+    primitives = [("substw", "tracing", lambda: aes.substw(w)),
+                  ("mixw", "tracing", lambda: aes.mixw(w)),
+                  ("inv_mixw", "tracing", lambda: aes.inv_mixw(w)),
+                  ("key_gen128", "tracing", lambda: aes.key_gen128(BENCH_KEY128)),
+                  ("key_gen256", "tracing", lambda: aes.key_gen256(BENCH_KEY256)),
+                  ("key_gen128", "table", lambda: aes_key_schedule.key_expand(BENCH_KEY128)),
+                  ("key_gen256", "table", lambda: aes_key_schedule.key_expand(BENCH_KEY256))]
+    return primitives
+
+
+#-------------------------------------------------------------------
+# get_block_engines()
+#
+# Return (engine, encipher, decipher) for the single block
+# functions of each engine. All take a key and a block.
+#-------------------------------------------------------------------
+def get_block_engines():
+    engines = [("tracing", aes.aes_encipher_block, aes.aes_decipher_block),
+               ("scalar", aes_fast.aes_encipher_block, aes_fast.aes_decipher_block),
+               ("state", aes_state.aes_encipher_block, aes_state.aes_decipher_block),
+               ("table", aes_ttable.aes_encipher_block, aes_ttable.aes_decipher_block)]
+
+    if aes_numpy:
+        def numpy_encipher(key, block):
+            return aes_numpy.array_to_words(
+                aes_numpy.encrypt_array(key, aes_numpy.words_to_array([block])))[0]
+
+        def numpy_decipher(key, block):
+            return aes_numpy.array_to_words(
+                aes_numpy.decrypt_array(key, aes_numpy.words_to_array([block])))[0]
+
+        engines.append(("numpy", numpy_encipher, numpy_decipher))
+
+    return engines
+
+
+#-------------------------------------------------------------------
+# get_bulk_functions()
+#
+# Return (mode, engine, function) for the bulk operations. All
+# functions take a key and the data. ECB is run on every engine,
+# the other modes on the engine they are built on.
+#-------------------------------------------------------------------
+def get_bulk_functions():
+    iv = bytes(range(16))
+    nonce = bytes(range(12))
+    functions = [("ecb", "scalar", scalar_encrypt_blocks),
+                 ("ecb", "state", state_encrypt_blocks),
+                 ("ecb", "table", aes_bulk.encrypt_blocks)]
+    if aes_numpy:
+        functions.append(("ecb", "numpy", aes_numpy.encrypt_blocks))
+
+    functions += [("cbc", "table", lambda k, d: aes_modes.cbc_encrypt(k, iv, d)),
+                  ("cbc-decrypt", "table", lambda k, d: aes_modes.cbc_decrypt(k, iv, d)),
+                  ("cfb", "table", lambda k, d: aes_modes.cfb_encrypt(k, iv, d)),
+                  ("ofb", "table", lambda k, d: aes_modes.ofb_encrypt(k, iv, d)),
+                  ("ctr", "table", lambda k, d: aes_modes.ctr_encrypt(k, iv, d)),
+                  ("gcm", "table", lambda k, d: aes_gcm.gcm_seal(k, nonce, d)),
+                  ("ccm", "table", lambda k, d: aes_ccm.ccm_seal(k, nonce, d)),
+                  ("cmac", "table", aes_cmac.cmac),
+                  ("xts", aes_xts.block_engine.__name__.replace("aes_", ""),
+                   lambda k, d: aes_xts.xts_encrypt(k + k, 0, d, aes_xts.SECTOR_SIZE))]
+    return functions
+
+
+#-------------------------------------------------------------------
+# log()
+#
+# Print progress to stderr so that stdout only holds the JSON.
+#-------------------------------------------------------------------
+def log(message):
+    sys.stderr.write(message + "\n")
+    sys.stderr.flush()
+
+
+#-------------------------------------------------------------------
+# run_benchmarks()
+#
+# Run the selected benchmarks and return the results as a dict.
+#-------------------------------------------------------------------
+def run_benchmarks(sizes=DEFAULT_SIZES, engines=None, modes=None):
+    results = {"timestamp" : time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+               "python" : platform.python_version(),
+               "implementation" : platform.python_implementation(),
+               "machine" : platform.machine(),
+               "numpy" : numpy.__version__ if numpy else None,
+               "primitives" : [],
+               "blocks" : [],
+               "bulk" : []}
+
+    for (name, engine, function) in get_primitives():
+        if engines and engine not in engines:
+            continue
+        with quiet():
+            seconds = time_call(function)
+        log("%-12s %-8s %10.1f ns" % (name, engine, seconds * 1e9))
+        results["primitives"].append({"name" : name, "engine" : engine,
+                                      "ns_per_op" : seconds * 1e9})
+
+    for (engine, encipher, decipher) in get_block_engines():
+        if engines and engine not in engines:
+            continue
+        for key in (BENCH_KEY128, BENCH_KEY256):
+            for (op, function) in (("encipher", encipher), ("decipher", decipher)):
+                with quiet():
+                    seconds = time_call(lambda: function(key, BENCH_BLOCK))
+                log("%-12s %-8s AES-%d %10.1f ns" % (op, engine, len(key) * 32, seconds * 1e9))
+                results["blocks"].append({"op" : op, "engine" : engine,
+                                          "key_bits" : len(key) * 32,
+                                          "ns_per_block" : seconds * 1e9})
+
+    key = os.urandom(16)
+    for size in sizes:
+        data = os.urandom(size)
+        for (mode, engine, function) in get_bulk_functions():
+            if (engines and engine not in engines) or (modes and mode not in modes):
+                continue
+            if size * 100 < (1 << 20):
+                seconds = time_call(lambda: function(key, data))
+            else:
+                seconds = time_once(lambda: function(key, data))
+            log("%-12s %-8s %10d bytes %10.3f MB/s" % (mode, engine, size, size / seconds / 1e6))
+            results["bulk"].append({"mode" : mode, "engine" : engine, "bytes" : size,
+                                    "seconds" : seconds, "mb_per_s" : size / seconds / 1e6})
+        data = None
+
+    return results
+
+
+#-------------------------------------------------------------------
+# parse_size()
+#
+# Parse a size such as 1024, 1K, 1M or 100M.
+#-------------------------------------------------------------------
+def parse_size(text):
+    units = {"K" : 1 << 10, "M" : 1 << 20, "G" : 1 << 30}
+    text = text.strip().upper()
+    if text[-1:] in units:
+        return int(text[:-1]) * units[text[-1]]
+    return int(text)
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Run the benchmarks and write the results as JSON to stdout or
+# the given file. The 100M inputs take a long time with the
+# pure Python engines, use --sizes to select smaller ones.
+#-------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the AES model.")
+    parser.add_argument("--sizes", default="1K,1M,100M",
+                        help="Comma separated bulk input sizes.")
+    parser.add_argument("--engines", help="Comma separated engines to run.")
+    parser.add_argument("--modes", help="Comma separated modes to run.")
+    parser.add_argument("--output", help="Write the JSON to this file.")
+    args = parser.parse_args(argv)
+
+    try:
+        sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    except ValueError:
+        parser.error("--sizes must be comma separated sizes such as 1K,1M.")
+    for size in sizes:
+        if size <= 0 or size % BLOCK_SIZE:
+            parser.error("--sizes must be positive multiples of %d, got %d." %
+                         (BLOCK_SIZE, size))
+    engines = args.engines.split(",") if args.engines else None
+    modes = args.modes.split(",") if args.modes else None
+
+    results = run_benchmarks(sizes, engines, modes)
+    encoded = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(encoded + "\n")
+    else:
+        print(encoded)
+    return 0
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_bench.py
+#=======================================================================
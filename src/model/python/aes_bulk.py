@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_bulk.py
+# -----------
+# Bytes in, bytes out bulk API on top of the T-table engine.
+# Blocks are unpacked directly from a memoryview of the input
+# and packed into a preallocated output buffer.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2014, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import struct
+
+import aes_ttable
+from aes_key_cache import expand_key
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+BLOCK_SIZE = 16
+
+block_struct = struct.Struct(">4I")
+
+
+#-------------------------------------------------------------------
+# check_length()
+#
+# Check that the given data is a whole number of blocks and
+# return it as a byte memoryview.
+#-------------------------------------------------------------------
+def check_length(data):
+    mv = memoryview(data).cast("B")
+    if len(mv) % BLOCK_SIZE:
+        raise ValueError("Data length %d is not a multiple of %d bytes." %
+                         (len(mv), BLOCK_SIZE))
+    return mv
+
+
+#-------------------------------------------------------------------
+# encrypt_blocks_into()
+#
+# Encipher all blocks in data and write the result into out,
+# which must be a writable buffer at least as long as data.
+# Returns out.
+#-------------------------------------------------------------------
+def encrypt_blocks_into(key, data, out):
+    mv = check_length(data)
+    rk = expand_key(key).enc_keys
+    encipher_block = aes_ttable.encipher_block
+    unpack_from = block_struct.unpack_from
+    pack_into = block_struct.pack_into
+
+    for offset in range(0, len(mv), BLOCK_SIZE):
+        pack_into(out, offset, *encipher_block(rk, unpack_from(mv, offset)))
+
+    return out
+
+
+#-------------------------------------------------------------------
+# decrypt_blocks_into()
+#
+# Decipher all blocks in data and write the result into out,
+# which must be a writable buffer at least as long as data.
+# Returns out.
+#-------------------------------------------------------------------
+def decrypt_blocks_into(key, data, out):
+    mv = check_length(data)
+    rk = expand_key(key).dec_keys
+    decipher_block = aes_ttable.decipher_block
+    unpack_from = block_struct.unpack_from
+    pack_into = block_struct.pack_into
+
+    for offset in range(0, len(mv), BLOCK_SIZE):
+        pack_into(out, offset, *decipher_block(rk, unpack_from(mv, offset)))
+
+    return out
+
+
+#-------------------------------------------------------------------
+# encrypt_blocks()
+#
+# Encipher the given data, a whole number of 16 byte blocks,
+# with the given key. Each block is handled independently.
+# Any buffer is accepted, its length is taken in bytes.
+#-------------------------------------------------------------------
+def encrypt_blocks(key, data):
+    mv = check_length(data)
+    return bytes(encrypt_blocks_into(key, mv, bytearray(mv.nbytes)))
+
+
+#-------------------------------------------------------------------
+# decrypt_blocks()
+#
+# Decipher the given data, a whole number of 16 byte blocks,
+# with the given key. Each block is handled independently.
+# Any buffer is accepted, its length is taken in bytes.
+#-------------------------------------------------------------------
+def decrypt_blocks(key, data):
+    mv = check_length(data)
+    return bytes(decrypt_blocks_into(key, mv, bytearray(mv.nbytes)))
+
+
+#-------------------------------------------------------------------
+# test_bulk()
+#
+# Test the bulk API with the NIST ECB vectors and a random
+# round trip. Returns the number of failing test cases.
+#-------------------------------------------------------------------
+def test_bulk():
+    nist_aes128_key = bytes.fromhex("2b7e151628aed2a6abf7158809cf4f3c")
+    nist_plaintext = bytes.fromhex("6bc1bee22e409f96e93d7e117393172a"
+                                   "ae2d8a571e03ac9c9eb76fac45af8e51"
+                                   "30c81c46a35ce411e5fbc1191a0a52ef"
+                                   "f69f2445df4f9b17ad2b417be66c3710")
+    nist_exp128 = bytes.fromhex("3ad77bb40d7a3660a89ecaf32466ef97"
+                                "f5d3d58503b9699de785895a96fdbaaf"
+                                "43b1cd7f598ece23881b00e3ed030688"
+                                "7b0c785e27e8ad3f8223207104725dd4")
+
+    tc_errors = 0
+
+    if encrypt_blocks(nist_aes128_key, nist_plaintext) != nist_exp128:
+        print("ERROR: Bulk encipher of NIST vectors failed.")
+        tc_errors += 1
+
+    if decrypt_blocks(nist_aes128_key, memoryview(nist_exp128)) != nist_plaintext:
+        print("ERROR: Bulk decipher of NIST vectors failed.")
+        tc_errors += 1
+
+    key = os.urandom(32)
+    data = os.urandom(64 * BLOCK_SIZE)
+    if decrypt_blocks(key, encrypt_blocks(key, data)) != data:
+        print("ERROR: Bulk round trip with AES-256 failed.")
+        tc_errors += 1
+
+    # Buffers with items larger than a byte.
+    words = memoryview(bytearray(nist_plaintext)).cast("I")
+    if encrypt_blocks(nist_aes128_key, words) != nist_exp128:
+        print("ERROR: Bulk encipher of a word memoryview failed.")
+        tc_errors += 1
+
+    try:
+        encrypt_blocks(nist_aes128_key, b"\x00" * 17)
+        print("ERROR: Partial block not rejected.")
+        tc_errors += 1
+    except ValueError:
+        pass
+
+    if tc_errors == 0:
+        print("All bulk tests OK.")
+    else:
+        print("Number of failing bulk tests: %d" % tc_errors)
+
+    return tc_errors
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests the bulk API using known test vectors.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the AES bulk API")
+    print("========================")
+    return test_bulk()
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_bulk.py
+#=======================================================================
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_ccm.py
+# ----------
+# The CCM mode (NIST SP 800-38C, RFC 3610). The CBC-MAC and the
+# CTR keystream share one expanded key and are computed in a single
+# pass over the payload.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2014, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import time
+import hmac
+
+import aes_ttable
+from aes_bulk import BLOCK_SIZE, block_struct
+from aes_modes import xor_bytes
+from aes_key_cache import expand_key
+
+
+#-------------------------------------------------------------------
+# check_params()
+#
+# Check the nonce and tag lengths and the payload length
+# against the limits in SP 800-38C. Returns q, the length in
+# bytes of the payload length field.
+#-------------------------------------------------------------------
+def check_params(nonce_len, tag_len, payload_len):
+    if not 7 <= nonce_len <= 13:
+        raise ValueError("Nonce length must be 7 to 13 bytes, got %d." % nonce_len)
+
+    if tag_len not in (4, 6, 8, 10, 12, 14, 16):
+        raise ValueError("Unsupported tag length %d." % tag_len)
+
+    q = 15 - nonce_len
+    if payload_len >= 1 << (8 * q):
+        raise ValueError("Payload of %d bytes too long for a %d byte nonce." %
+                         (payload_len, nonce_len))
+    return q
+
+
+#-------------------------------------------------------------------
+# encode_aad()
+#
+# Return the associated data prefixed with its encoded length
+# and zero padded to a whole number of blocks.
+#-------------------------------------------------------------------
+def encode_aad(aad):
+    a = len(aad)
+    if a < 0xff00:
+        header = a.to_bytes(2, "big")
+    elif a < 1 << 32:
+        header = b"\xff\xfe" + a.to_bytes(4, "big")
+    else:
+        header = b"\xff\xff" + a.to_bytes(8, "big")
+
+    header += bytes(aad)
+    return header + bytes(-len(header) % BLOCK_SIZE)
+
+
+#-------------------------------------------------------------------
+# ccm_crypt()
+#
+# Encipher or decipher the data and compute the CBC-MAC over
+# the plaintext in the same pass, using one expanded key for
+# both. Returns the output and the tag.
+#-------------------------------------------------------------------
+def ccm_crypt(ek, nonce, data, aad, tag_len, encrypt):
+    n = len(data)
+    q = check_params(len(nonce), tag_len, n)
+    rk = ek.enc_keys
+    encipher_block = aes_ttable.encipher_block
+    unpack_from = block_struct.unpack_from
+    pack_into = block_struct.pack_into
+
+    # B0 and the associated data.
+    flags = (0x40 if aad else 0) | (((tag_len - 2) // 2) << 3) | (q - 1)
+    b0 = bytes([flags]) + bytes(nonce) + n.to_bytes(q, "big")
+    (x0, x1, x2, x3) = encipher_block(rk, block_struct.unpack(b0))
+
+    if aad:
+        header = encode_aad(aad)
+        for offset in range(0, len(header), BLOCK_SIZE):
+            (a0, a1, a2, a3) = unpack_from(header, offset)
+            (x0, x1, x2, x3) = encipher_block(rk, (x0 ^ a0, x1 ^ a1, x2 ^ a2, x3 ^ a3))
+
+    # Ctr0 is used for the tag, the payload starts with Ctr1.
+    ctr0 = block_struct.unpack(bytes([q - 1]) + bytes(nonce) + bytes(q))
+    s0 = encipher_block(rk, ctr0)
+    (c0, c1, c2, c3) = ctr0
+
+    mv = memoryview(data).cast("B")
+    out = bytearray(n)
+    full = n - (n % BLOCK_SIZE)
+
+    for offset in range(0, full, BLOCK_SIZE):
+        c3 = (c3 + 1) & 0xffffffff
+        if c3 == 0:
+            c2 += 1
+        (k0, k1, k2, k3) = encipher_block(rk, (c0, c1, c2, c3))
+        (d0, d1, d2, d3) = unpack_from(mv, offset)
+        (o0, o1, o2, o3) = (d0 ^ k0, d1 ^ k1, d2 ^ k2, d3 ^ k3)
+        pack_into(out, offset, o0, o1, o2, o3)
+
+        if encrypt:
+            (x0, x1, x2, x3) = encipher_block(rk, (x0 ^ d0, x1 ^ d1, x2 ^ d2, x3 ^ d3))
+        else:
+            (x0, x1, x2, x3) = encipher_block(rk, (x0 ^ o0, x1 ^ o1, x2 ^ o2, x3 ^ o3))
+
+    # Partial last block. The MAC covers the zero padded plaintext.
+    if full < n:
+        c3 = (c3 + 1) & 0xffffffff
+        if c3 == 0:
+            c2 += 1
+        keystream = block_struct.pack(*encipher_block(rk, (c0, c1, c2, c3)))
+        tail = xor_bytes(mv[full:], keystream[0 : n - full])
+        out[full:] = tail
+
+        plaintext = mv[full:] if encrypt else tail
+        (p0, p1, p2, p3) = block_struct.unpack(bytes(plaintext).ljust(BLOCK_SIZE, b"\x00"))
+        (x0, x1, x2, x3) = encipher_block(rk, (x0 ^ p0, x1 ^ p1, x2 ^ p2, x3 ^ p3))
+
+    tag = block_struct.pack(x0 ^ s0[0], x1 ^ s0[1], x2 ^ s0[2], x3 ^ s0[3])
+    return (bytes(out), tag[0 : tag_len])
+
+
+#-------------------------------------------------------------------
+# ccm_seal()
+#
+# Authenticated encipher of the plaintext. Returns the
+# ciphertext and the tag.
+#-------------------------------------------------------------------
+def ccm_seal(key, nonce, plaintext, aad=b"", tag_len=16):
+    return ccm_crypt(expand_key(key), nonce, plaintext, aad, tag_len, True)
+
+
+#-------------------------------------------------------------------
+# ccm_open()
+#
+# Authenticated decipher of the ciphertext. Raises ValueError
+# if the tag does not match, in which case no plaintext is
+# returned.
+#-------------------------------------------------------------------
+def ccm_open(key, nonce, ciphertext, tag, aad=b""):
+    (plaintext, expected) = ccm_crypt(expand_key(key), nonce, ciphertext,
+                                      aad, len(tag), False)
+    if not hmac.compare_digest(expected, bytes(tag)):
+        raise ValueError("CCM tag mismatch.")
+    return plaintext
+
+
+#-------------------------------------------------------------------
+# ccm_open_batch()
+#
+# Verify and decipher a batch of packets under the same key.
+# Each packet is a tuple (nonce, ciphertext, tag) or (nonce,
+# ciphertext, tag, aad). The key is expanded once for the whole
+# batch. Returns a list with the plaintext of each packet, or
+# None for packets whose tag does not match or whose nonce, tag
+# or payload length is invalid.
+#-------------------------------------------------------------------
+def ccm_open_batch(key, packets):
+    ek = expand_key(key)
+    results = []
+
+    for packet in packets:
+        (nonce, ciphertext, tag) = packet[0 : 3]
+        aad = packet[3] if len(packet) > 3 else b""
+        try:
+            (plaintext, expected) = ccm_crypt(ek, nonce, ciphertext, aad, len(tag), False)
+        except ValueError:
+            results.append(None)
+            continue
+
+        if hmac.compare_digest(expected, bytes(tag)):
+            results.append(plaintext)
+        else:
+            results.append(None)
+
+    return results
+
+
+#-------------------------------------------------------------------
+# test_ccm()
+#
+# Test CCM with the examples in NIST SP 800-38C appendix C and
+# packet vectors from RFC 3610, and test the batch API on
+# random packets. Returns the number of failing test cases.
+#-------------------------------------------------------------------
+def test_ccm():
+    k = "404142434445464748494a4b4c4d4e4f"
+    rfc_k = "c0c1c2c3c4c5c6c7c8c9cacbcccdcecf"
+
+    # (name, key, nonce, aad, plaintext, ciphertext, tag)
+    tests = (
+        ("SP 800-38C Example 1", k, "10111213141516", "0001020304050607",
+         "20212223", "7162015b", "4dac255d"),
+        ("SP 800-38C Example 2", k, "1011121314151617",
+         "000102030405060708090a0b0c0d0e0f",
+         "202122232425262728292a2b2c2d2e2f",
+         "d2a1f0e051ea5f62081a7792073d593d", "1fc64fbfaccd"),
+        ("SP 800-38C Example 3", k, "101112131415161718191a1b",
+         "000102030405060708090a0b0c0d0e0f10111213",
+         "202122232425262728292a2b2c2d2e2f3031323334353637",
+         "e3b201a9f5b71a7a9b1ceaeccd97e70b6176aad9a4428aa5", "484392fbc1b09951"),
+        ("SP 800-38C Example 4", k, "101112131415161718191a1b1c",
+         bytes(range(256)).hex() * 256,
+         "202122232425262728292a2b2c2d2e2f303132333435363738393a3b3c3d3e3f",
+         "69915dad1e84c6376a68c2967e4dab615ae0fd1faec44cc484828529463ccf72",
+         "b4ac6bec93e8598e7f0dadbcea5b"),
+        ("RFC 3610 Packet Vector #1", rfc_k, "00000003020100a0a1a2a3a4a5",
+         "0001020304050607",
+         "08090a0b0c0d0e0f101112131415161718191a1b1c1d1e",
+         "588c979a61c663d2f066d0c2c0f989806d5f6b61dac384", "17e8d12cfdf926e0"),
+        ("RFC 3610 Packet Vector #2", rfc_k, "00000004030201a0a1a2a3a4a5",
+         "0001020304050607",
+         "08090a0b0c0d0e0f101112131415161718191a1b1c1d1e1f",
+         "72c91a36e135f8cf291ca894085c87e3cc15c439c9e43a3b", "a091d56e10400916"),
+    )
+
+    tc_errors = 0
+    tc = 0
+
+    for (name, key, nonce, aad, pt, ct, tag) in tests:
+        (key, nonce, aad, pt, ct, tag) = [bytes.fromhex(x) for x in
+                                          (key, nonce, aad, pt, ct, tag)]
+
+        (result, result_tag) = ccm_seal(key, nonce, pt, aad, len(tag))
+        if result != ct or result_tag != tag:
+            print("ERROR: %s seal failed." % name)
+            tc_errors += 1
+
+        try:
+            if ccm_open(key, nonce, ct, tag, aad) != pt:
+                print("ERROR: %s open returned wrong plaintext." % name)
+                tc_errors += 1
+        except ValueError:
+            print("ERROR: %s open rejected a valid tag." % name)
+            tc_errors += 1
+
+        bad_tag = bytes([tag[0] ^ 1]) + tag[1:]
+        try:
+            ccm_open(key, nonce, ct, bad_tag, aad)
+            print("ERROR: %s open accepted a bad tag." % name)
+            tc_errors += 1
+        except ValueError:
+            pass
+
+        tc += 1
+
+    # Batch of random packets, every third one corrupted.
+    key = os.urandom(16)
+    packets = []
+    expected = []
+    for i in range(300):
+        nonce = os.urandom(7 + i % 7)
+        pt = os.urandom(i % 97)
+        aad = os.urandom(i % 5)
+        (ct, tag) = ccm_seal(key, nonce, pt, aad, 4 + 2 * (i % 7))
+        if i % 3 == 0:
+            tag = bytes([tag[0] ^ 0x80]) + tag[1:]
+            pt = None
+        packets.append((nonce, ct, tag, aad))
+        expected.append(pt)
+
+    # Malformed packets: short nonce, long nonce, bad tag length.
+    packets += [(os.urandom(6), b"", bytes(8)), (os.urandom(14), b"", bytes(8)),
+                (os.urandom(12), b"", bytes(5))]
+    expected += [None, None, None]
+
+    if ccm_open_batch(key, packets) != expected:
+        print("ERROR: Batch open of random packets failed.")
+        tc_errors += 1
+    tc += 1
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+    return tc_errors
+
+
+#-------------------------------------------------------------------
+# bench_ccm_batch()
+#
+# Measure and print the batch verify rate for packets of the
+# given payload size.
+#-------------------------------------------------------------------
+def bench_ccm_batch(num_packets=2000, size=64):
+    key = os.urandom(16)
+    packets = []
+    for i in range(num_packets):
+        nonce = os.urandom(13)
+        (ct, tag) = ccm_seal(key, nonce, os.urandom(size), b"", 8)
+        packets.append((nonce, ct, tag))
+
+    start = time.perf_counter()
+    ccm_open_batch(key, packets)
+    elapsed = time.perf_counter() - start
+    print("CCM batch open of %d packets of %d bytes: %.3f s, %.0f packets/s" %
+          (num_packets, size, elapsed, num_packets / elapsed))
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests CCM using known test vectors and measures
+# the batch verify rate.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the AES-CCM mode")
+    print("========================")
+    errors = test_ccm()
+    print("")
+    bench_ccm_batch()
+    return errors
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_ccm.py
+#=======================================================================
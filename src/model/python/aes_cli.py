@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_cli.py
+# ----------
+# Command line for enciphering and deciphering files. The input
+# file and a preallocated output file are memory mapped and
+# processed in large chunks through the bulk engine.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2014, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import time
+import mmap
+import argparse
+import tempfile
+
+import aes_modes
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+# Default number of bytes processed per chunk.
+CHUNK_SIZE = 1 << 22
+
+
+#-------------------------------------------------------------------
+# parse_hex()
+#
+# Parse a hex string and check that it has one of the given
+# lengths in bytes.
+#-------------------------------------------------------------------
+def parse_hex(name, text, lengths):
+    try:
+        value = bytes.fromhex(text)
+    except ValueError:
+        raise ValueError("%s is not a valid hex string." % name)
+
+    if len(value) not in lengths:
+        raise ValueError("%s must be %s bytes, got %d." %
+                         (name, " or ".join(str(l) for l in lengths), len(value)))
+    return value
+
+
+#-------------------------------------------------------------------
+# print_progress()
+#
+# Print the progress and throughput to stderr.
+#-------------------------------------------------------------------
+def print_progress(done, total, start, end="\r"):
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    percent = 100.0 * done / total if total else 100.0
+    sys.stderr.write("%d/%d bytes (%5.1f%%), %.3f s, %.3f MB/s%s" %
+                     (done, total, percent, elapsed, done / elapsed / 1e6, end))
+    sys.stderr.flush()
+
+
+#-------------------------------------------------------------------
+# crypt_file()
+#
+# Run the input file through the given mode object into the
+# output file. The input is memory mapped and the output file
+# is preallocated and memory mapped, so only one chunk at a time
+# is held as a Python object. None of the modes change the
+# length of the data. The output must not be the input file,
+# it is truncated before the input is read. On errors the
+# partly written output file is removed.
+#-------------------------------------------------------------------
+def crypt_file(mode, in_path, out_path, chunk_size=CHUNK_SIZE, progress=True):
+    if os.path.exists(out_path) and os.path.samefile(in_path, out_path):
+        raise ValueError("Input and output are the same file: %s" % out_path)
+
+    length = os.path.getsize(in_path)
+    with open(out_path, "wb") as fout:
+        fout.truncate(length)
+
+    start = time.perf_counter()
+    try:
+        if length:
+            with open(in_path, "rb") as fin, open(out_path, "r+b") as fout:
+                in_map = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+                out_map = mmap.mmap(fout.fileno(), 0, access=mmap.ACCESS_WRITE)
+                try:
+                    out_pos = 0
+                    for pos in range(0, length, chunk_size):
+                        result = mode.update(in_map[pos : pos + chunk_size])
+                        out_map[out_pos : out_pos + len(result)] = result
+                        out_pos += len(result)
+                        if progress:
+                            print_progress(pos + min(chunk_size, length - pos), length, start)
+
+                    result = mode.finalize()
+                    out_map[out_pos : out_pos + len(result)] = result
+                    out_map.flush()
+                finally:
+                    out_map.close()
+                    in_map.close()
+        else:
+            mode.finalize()
+    except BaseException:
+        os.remove(out_path)
+        raise
+
+    if progress:
+        print_progress(length, length, start, "\n")
+
+
+#-------------------------------------------------------------------
+# gen_parser()
+#-------------------------------------------------------------------
+def gen_parser():
+    parser = argparse.ArgumentParser(prog="python -m aes",
+                                     description="Encipher or decipher a file with AES.")
+    parser.add_argument("operation", choices=("encrypt", "decrypt"))
+    parser.add_argument("--mode", choices=sorted(aes_modes.MODES), default="ctr")
+    parser.add_argument("--key", required=True,
+                        help="128, 192 or 256 bit key as hex.")
+    parser.add_argument("--iv", help="16 byte IV or initial counter block as hex.")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="Bytes processed per chunk.")
+    parser.add_argument("--quiet", action="store_true",
+                        help="Do not print progress to stderr.")
+    parser.add_argument("infile")
+    parser.add_argument("outfile")
+    return parser
+
+
+#-------------------------------------------------------------------
+# run_cli()
+#
+# Parse the arguments and process the file. Returns the exit
+# status.
+#-------------------------------------------------------------------
+def run_cli(argv):
+    parser = gen_parser()
+    args = parser.parse_args(argv)
+
+    if args.chunk_size <= 0 or args.chunk_size % aes_modes.BLOCK_SIZE:
+        parser.error("--chunk-size must be a positive multiple of %d." %
+                     aes_modes.BLOCK_SIZE)
+
+    try:
+        key = parse_hex("Key", args.key, (16, 24, 32))
+        iv = parse_hex("IV", args.iv, (16,)) if args.iv is not None else None
+        mode = aes_modes.new_mode(args.mode, key, iv, args.operation == "encrypt")
+        crypt_file(mode, args.infile, args.outfile, args.chunk_size, not args.quiet)
+    except (ValueError, OSError) as error:
+        sys.stderr.write("%s: error: %s\n" % (parser.prog, error))
+        return 1
+
+    return 0
+
+
+#-------------------------------------------------------------------
+# test_cli()
+#
+# Process temporary files with all modes through the command
+# line and compare with the one shot functions. Returns the
+# number of failing test cases.
+#-------------------------------------------------------------------
+def test_cli():
+    key = os.urandom(32)
+    iv = os.urandom(16)
+    data = os.urandom(100000 - 100000 % 16)
+    tc_errors = 0
+    tc = 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [os.path.join(tmp, name) for name in ("in", "enc", "dec")]
+        with open(paths[0], "wb") as f:
+            f.write(data)
+
+        for name in sorted(aes_modes.MODES):
+            args = ["--mode", name, "--key", key.hex(), "--iv", iv.hex(),
+                    "--chunk-size", "4096", "--quiet"]
+            if name == "ecb":
+                args = args[0 : 4] + args[6:]
+
+            run_cli(["encrypt"] + args + paths[0 : 2])
+            run_cli(["decrypt"] + args + [paths[1], paths[2]])
+
+            expected = aes_modes.run_mode(aes_modes.new_mode(name, key, iv, True), data)
+            with open(paths[1], "rb") as f:
+                if f.read() != expected:
+                    print("ERROR: %s encipher of file failed." % name)
+                    tc_errors += 1
+            with open(paths[2], "rb") as f:
+                if f.read() != data:
+                    print("ERROR: %s decipher of file failed." % name)
+                    tc_errors += 1
+            tc += 1
+
+        # Empty file and a CBC file that is not whole blocks.
+        with open(paths[0], "wb") as f:
+            pass
+        if run_cli(["encrypt", "--key", key.hex(), "--iv", iv.hex(), "--quiet"] +
+                   paths[0 : 2]) != 0 or os.path.getsize(paths[1]) != 0:
+            print("ERROR: Empty file failed.")
+            tc_errors += 1
+        with open(paths[0], "wb") as f:
+            f.write(data[0 : 20])
+        if run_cli(["encrypt", "--mode", "cbc", "--key", key.hex(), "--iv", iv.hex(),
+                    "--quiet"] + paths[0 : 2]) != 1:
+            print("ERROR: Partial block with CBC not rejected.")
+            tc_errors += 1
+        if os.path.exists(paths[1]):
+            print("ERROR: Output of rejected CBC file not removed.")
+            tc_errors += 1
+
+        # Output to the input file, also through a hard link.
+        os.remove(paths[2])
+        os.link(paths[0], paths[2])
+        for out_path in (paths[0], paths[2]):
+            if run_cli(["encrypt", "--key", key.hex(), "--iv", iv.hex(), "--quiet",
+                        paths[0], out_path]) != 1:
+                print("ERROR: Output to the input file not rejected.")
+                tc_errors += 1
+        with open(paths[0], "rb") as f:
+            if f.read() != data[0 : 20]:
+                print("ERROR: Input file changed by rejected run.")
+                tc_errors += 1
+        tc += 3
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+    return tc_errors
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# With arguments runs the command line, without runs the tests.
+#-------------------------------------------------------------------
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if argv:
+        return run_cli(argv)
+
+    print("Testing the AES command line")
+    print("============================")
+    return test_cli()
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_cli.py
+#=======================================================================
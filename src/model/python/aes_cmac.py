@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_cmac.py
+# -----------
+# CMAC (RFC 4493, NIST SP 800-38B) and raw CBC-MAC with streaming
+# update(). Complete blocks are processed as they arrive and only
+# a tail of at most one block is buffered.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2014, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import time
+
+import aes_ttable
+from aes_bulk import BLOCK_SIZE, block_struct
+from aes_key_cache import expand_key
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+MASK128 = (1 << 128) - 1
+CMAC_RB = 0x87
+
+
+#-------------------------------------------------------------------
+# dbl()
+#
+# Multiply the given 128 bit value by x in GF(2^128) as used
+# for the CMAC subkeys.
+#-------------------------------------------------------------------
+def dbl(v):
+    if v >> 127:
+        return ((v << 1) & MASK128) ^ CMAC_RB
+    return v << 1
+
+
+#-------------------------------------------------------------------
+# get_subkeys()
+#
+# Return the CMAC subkeys K1 and K2 as 128 bit integers for the
+# given expanded key, generating and caching them with the key
+# the first time.
+#-------------------------------------------------------------------
+def get_subkeys(ek):
+    subkeys = ek.derived.get("cmac")
+    if subkeys is None:
+        (l0, l1, l2, l3) = aes_ttable.encipher_block(ek.enc_keys, (0, 0, 0, 0))
+        k1 = dbl((l0 << 96) | (l1 << 64) | (l2 << 32) | l3)
+        k2 = dbl(k1)
+        subkeys = (k1, k2)
+        ek.derived["cmac"] = subkeys
+    return subkeys
+
+
+#-------------------------------------------------------------------
+# int2words()
+#
+# Split a 128 bit integer into a four word block.
+#-------------------------------------------------------------------
+def int2words(v):
+    return (v >> 96, (v >> 64) & 0xffffffff, (v >> 32) & 0xffffffff, v & 0xffffffff)
+
+
+#-------------------------------------------------------------------
+# CBCMAC
+#
+# Raw CBC-MAC with a zero IV. Input is processed as it arrives.
+# The last block, complete or not, is always held back in the
+# tail buffer since its handling depends on whether more data
+# follows. The message must be a non zero whole number of blocks.
+#-------------------------------------------------------------------
+class CBCMAC(object):
+    def __init__(self, key):
+        self.ek = expand_key(key)
+        self.chain = (0, 0, 0, 0)
+        self.tail = b""
+        self.length = 0
+
+
+    #---------------------------------------------------------------
+    # update()
+    #
+    # Add the given chunk to the MAC.
+    #---------------------------------------------------------------
+    def update(self, chunk):
+        mv = memoryview(chunk).cast("B")
+        n = len(mv)
+        if n == 0:
+            return
+        self.length += n
+
+        rk = self.ek.enc_keys
+        encipher_block = aes_ttable.encipher_block
+        unpack_from = block_struct.unpack_from
+        (c0, c1, c2, c3) = self.chain
+        pos = 0
+
+        # Complete the tail. It is only processed when more data
+        # follows it.
+        if self.tail:
+            pos = min(n, BLOCK_SIZE - len(self.tail))
+            self.tail += bytes(mv[0 : pos])
+            if pos < n:
+                (p0, p1, p2, p3) = block_struct.unpack(self.tail)
+                (c0, c1, c2, c3) = encipher_block(rk, (c0 ^ p0, c1 ^ p1,
+                                                       c2 ^ p2, c3 ^ p3))
+                self.tail = b""
+
+        if not self.tail:
+            end = pos + ((n - pos - 1) // BLOCK_SIZE) * BLOCK_SIZE
+            for offset in range(pos, end, BLOCK_SIZE):
+                (p0, p1, p2, p3) = unpack_from(mv, offset)
+                (c0, c1, c2, c3) = encipher_block(rk, (c0 ^ p0, c1 ^ p1,
+                                                       c2 ^ p2, c3 ^ p3))
+            self.tail = bytes(mv[end:])
+
+        self.chain = (c0, c1, c2, c3)
+
+
+    #---------------------------------------------------------------
+    # last_block()
+    #
+    # Return the final block to be XORed into the chain as a
+    # 128 bit integer.
+    #---------------------------------------------------------------
+    def last_block(self):
+        if self.length == 0 or len(self.tail) != BLOCK_SIZE:
+            raise ValueError("CBC-MAC input must be a non zero multiple of %d bytes."
+                             % BLOCK_SIZE)
+        return int.from_bytes(self.tail, "big")
+
+
+    #---------------------------------------------------------------
+    # finalize()
+    #
+    # Process the last block and return the tag truncated to
+    # the given length.
+    #---------------------------------------------------------------
+    def finalize(self, tag_len=BLOCK_SIZE):
+        if not 1 <= tag_len <= BLOCK_SIZE:
+            raise ValueError("Tag length must be 1 to %d bytes, got %d." %
+                             (BLOCK_SIZE, tag_len))
+
+        (c0, c1, c2, c3) = self.chain
+        (p0, p1, p2, p3) = int2words(self.last_block())
+        tag = aes_ttable.encipher_block(self.ek.enc_keys, (c0 ^ p0, c1 ^ p1,
+                                                           c2 ^ p2, c3 ^ p3))
+        return block_struct.pack(*tag)[0 : tag_len]
+
+
+#-------------------------------------------------------------------
+# CMAC
+#
+# CMAC as specified in RFC 4493 and NIST SP 800-38B. Only
+# differs from CBC-MAC in how the last block is handled.
+#-------------------------------------------------------------------
+class CMAC(CBCMAC):
+    def last_block(self):
+        (k1, k2) = get_subkeys(self.ek)
+        if len(self.tail) == BLOCK_SIZE:
+            return int.from_bytes(self.tail, "big") ^ k1
+
+        padded = self.tail + b"\x80" + b"\x00" * (BLOCK_SIZE - 1 - len(self.tail))
+        return int.from_bytes(padded, "big") ^ k2
+
+
+#-------------------------------------------------------------------
+# cbc_mac()
+#
+# One shot CBC-MAC of the given data.
+#-------------------------------------------------------------------
+def cbc_mac(key, data, tag_len=BLOCK_SIZE):
+    mac = CBCMAC(key)
+    mac.update(data)
+    return mac.finalize(tag_len)
+
+
+#-------------------------------------------------------------------
+# cmac()
+#
+# One shot CMAC of the given data.
+#-------------------------------------------------------------------
+def cmac(key, data, tag_len=BLOCK_SIZE):
+    mac = CMAC(key)
+    mac.update(data)
+    return mac.finalize(tag_len)
+
+
+#-------------------------------------------------------------------
+# test_cmac()
+#
+# Test CMAC with the RFC 4493 and SP 800-38B examples, one shot
+# and in uneven chunks. Returns the number of failing test cases.
+#-------------------------------------------------------------------
+def test_cmac():
+    aes128_key = bytes.fromhex("2b7e151628aed2a6abf7158809cf4f3c")
+    aes256_key = bytes.fromhex("603deb1015ca71be2b73aef0857d7781"
+                               "1f352c073b6108d72d9810a30914dff4")
+    message = bytes.fromhex("6bc1bee22e409f96e93d7e117393172a"
+                            "ae2d8a571e03ac9c9eb76fac45af8e51"
+                            "30c81c46a35ce411e5fbc1191a0a52ef"
+                            "f69f2445df4f9b17ad2b417be66c3710")
+
+    tests = ((aes128_key, 0, "bb1d6929e95937287fa37d129b756746"),
+             (aes128_key, 16, "070a16b46b4d4144f79bdd9dd04a287c"),
+             (aes128_key, 40, "dfa66747de9ae63030ca32611497c827"),
+             (aes128_key, 64, "51f0bebf7e3b9d92fc49741779363cfe"),
+             (aes256_key, 0, "028962f61b7bf89efc6b551f4667d983"),
+             (aes256_key, 16, "28a7023f452e8f82bd4bf28d8c37c35c"),
+             (aes256_key, 40, "aaf3d8f1de5640c232f5b169b9c911e6"),
+             (aes256_key, 64, "e1992190549f6ed5696a2c056c315410"))
+
+    tc_errors = 0
+    tc = 0
+
+    (k1, k2) = get_subkeys(expand_key(aes128_key))
+    if (k1, k2) != (0xfbeed618357133667c85e08f7236a8de,
+                    0xf7ddac306ae266ccf90bc11ee46d513b):
+        print("ERROR: Wrong CMAC subkeys.")
+        tc_errors += 1
+    tc += 1
+
+    for (key, length, expected) in tests:
+        expected = bytes.fromhex(expected)
+        if cmac(key, message[0 : length]) != expected:
+            print("ERROR: CMAC of %d bytes with AES-%d failed." % (length, len(key) * 8))
+            tc_errors += 1
+
+        mac = CMAC(key)
+        pos = 0
+        for size in (1, 15, 16, 2, 30):
+            mac.update(message[pos : min(pos + size, length)])
+            pos = min(pos + size, length)
+        mac.update(message[pos : length])
+        if mac.finalize() != expected:
+            print("ERROR: Incremental CMAC of %d bytes with AES-%d failed." %
+                  (length, len(key) * 8))
+            tc_errors += 1
+        tc += 2
+
+    # CBC-MAC of whole blocks is the last block of CBC encipher.
+    cbc_last = bytes.fromhex("3ff1caa1681fac09120eca307586e1a7")
+    iv = bytes.fromhex("000102030405060708090a0b0c0d0e0f")
+    first = bytes(a ^ b for (a, b) in zip(message[0 : 16], iv))
+    if cbc_mac(aes128_key, first + message[16:]) != cbc_last:
+        print("ERROR: CBC-MAC failed.")
+        tc_errors += 1
+    tc += 1
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+    return tc_errors
+
+
+#-------------------------------------------------------------------
+# bench_cmac()
+#
+# Measure and print the CMAC throughput for the given input
+# sizes, fed in 64 KiB chunks.
+#-------------------------------------------------------------------
+def bench_cmac(sizes=(16, 1024, 65536, 1048576, 4194304)):
+    key = os.urandom(16)
+    chunk = os.urandom(65536)
+
+    for size in sizes:
+        start = time.perf_counter()
+        mac = CMAC(key)
+        remaining = size
+        while remaining:
+            n = min(remaining, len(chunk))
+            mac.update(chunk[0 : n])
+            remaining -= n
+        mac.finalize()
+        elapsed = time.perf_counter() - start
+        print("CMAC %8d bytes: %10.3f ms, %8.3f MB/s" %
+              (size, elapsed * 1000, size / elapsed / 1e6))
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests CMAC using known test vectors and measures
+# the MAC throughput.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the AES-CMAC")
+    print("====================")
+    errors = test_cmac()
+    print("")
+    bench_cmac()
+    return errors
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_cmac.py
+#=======================================================================
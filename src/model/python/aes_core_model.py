@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_core_model.py
+# -----------------
+# Cycle level model of the aes_core, aes_key_mem, aes_encipher_block
+# and aes_decipher_block FSMs. Reports cycles per init and next and
+# the throughput for 1, 4, 8 or 16 S-boxes.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2014, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+
+import aes_ttable
+from aes_key_cache import expand_key
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+AES_128_BIT_KEY = 0
+AES_256_BIT_KEY = 1
+
+AES128_ROUNDS = 10
+AES256_ROUNDS = 14
+
+# Supported number of S-boxes in the datapath. The RTL has 4.
+SBOX_CONFIGS = (1, 4, 8, 16)
+
+# Control states. Same encoding as in the RTL.
+CTRL_IDLE     = 0
+CTRL_INIT     = 1
+CTRL_SBOX     = 2
+CTRL_GENERATE = 2
+CTRL_MAIN     = 3
+CTRL_DONE     = 3
+CTRL_NEXT     = 2
+
+
+#-------------------------------------------------------------------
+# get_num_rounds()
+#-------------------------------------------------------------------
+def get_num_rounds(keylen):
+    if keylen == AES_256_BIT_KEY:
+        return AES256_ROUNDS
+    return AES128_ROUNDS
+
+
+#-------------------------------------------------------------------
+# check_num_sboxes()
+#-------------------------------------------------------------------
+def check_num_sboxes(num_sboxes):
+    if num_sboxes not in SBOX_CONFIGS:
+        raise ValueError("Number of S-boxes must be one of %s, got %d." %
+                         (", ".join(str(n) for n in SBOX_CONFIGS), num_sboxes))
+
+
+#-------------------------------------------------------------------
+# KeyMem
+#
+# Model of the aes_key_mem FSM. One round key is generated per
+# cycle in the GENERATE state. Round keys that need SubWord take
+# 4 / num_sboxes cycles when there are fewer than four S-boxes.
+#-------------------------------------------------------------------
+class KeyMem(object):
+    def __init__(self, num_sboxes=4):
+        check_num_sboxes(num_sboxes)
+        self.num_sboxes = num_sboxes
+        self.ready = 1
+        self.round_ctr = 0
+        self.sub_ctr = 0
+        self.ctrl = CTRL_IDLE
+        self.ek = None
+
+
+    #---------------------------------------------------------------
+    # clock()
+    #
+    # Advance one cycle with the given inputs.
+    #---------------------------------------------------------------
+    def clock(self, init, key, keylen):
+        num_rounds = get_num_rounds(keylen)
+
+        if self.ctrl == CTRL_IDLE:
+            if init:
+                self.ready = 0
+                self.ctrl = CTRL_INIT
+
+        elif self.ctrl == CTRL_INIT:
+            self.round_ctr = 0
+            self.sub_ctr = 0
+            self.ctrl = CTRL_GENERATE
+
+        elif self.ctrl == CTRL_GENERATE:
+            # The first one or two round keys are copied from the key.
+            if self.round_ctr > keylen:
+                cycles = max(1, 4 // self.num_sboxes)
+            else:
+                cycles = 1
+
+            if self.sub_ctr < cycles - 1:
+                self.sub_ctr += 1
+            else:
+                self.sub_ctr = 0
+                if self.round_ctr == num_rounds:
+                    self.ctrl = CTRL_DONE
+                self.round_ctr = (self.round_ctr + 1) & 0xf
+
+        elif self.ctrl == CTRL_DONE:
+            if keylen == AES_256_BIT_KEY:
+                self.ek = expand_key(tuple(key))
+            else:
+                self.ek = expand_key(tuple(key[0 : 4]))
+            self.ready = 1
+            self.ctrl = CTRL_IDLE
+
+
+#-------------------------------------------------------------------
+# BlockCipher
+#
+# Model of the aes_encipher_block and aes_decipher_block FSMs.
+# After INIT each round is 16 / num_sboxes SBOX cycles followed
+# by one MAIN cycle. The encipher counts rounds up from one and
+# the decipher counts down from the number of rounds. The
+# result is computed with the T-table engine when the final
+# round is done.
+#-------------------------------------------------------------------
+class BlockCipher(object):
+    def __init__(self, encipher, num_sboxes=4):
+        check_num_sboxes(num_sboxes)
+        self.encipher = encipher
+        self.sbox_cycles = 16 // num_sboxes
+        self.ready = 1
+        self.round_ctr = 0
+        self.sword_ctr = 0
+        self.ctrl = CTRL_IDLE
+        self.result = (0, 0, 0, 0)
+
+
+    #---------------------------------------------------------------
+    # clock()
+    #
+    # Advance one cycle with the given inputs.
+    #---------------------------------------------------------------
+    def clock(self, next, keylen, ek, block):
+        num_rounds = get_num_rounds(keylen)
+
+        if self.ctrl == CTRL_IDLE:
+            if next:
+                self.round_ctr = 0 if self.encipher else num_rounds
+                self.ready = 0
+                self.ctrl = CTRL_INIT
+
+        elif self.ctrl == CTRL_INIT:
+            if self.encipher:
+                self.round_ctr += 1
+            self.sword_ctr = 0
+            self.ctrl = CTRL_SBOX
+
+        elif self.ctrl == CTRL_SBOX:
+            if self.sword_ctr == self.sbox_cycles - 1:
+                if not self.encipher:
+                    self.round_ctr -= 1
+                self.ctrl = CTRL_MAIN
+            self.sword_ctr = (self.sword_ctr + 1) % self.sbox_cycles
+
+        elif self.ctrl == CTRL_MAIN:
+            self.sword_ctr = 0
+            if self.encipher:
+                more = self.round_ctr < num_rounds
+                self.round_ctr += 1
+            else:
+                more = self.round_ctr > 0
+
+            if more:
+                self.ctrl = CTRL_SBOX
+            else:
+                if self.encipher:
+                    self.result = aes_ttable.encipher_block(ek.enc_keys, block)
+                else:
+                    self.result = aes_ttable.decipher_block(ek.dec_keys, block)
+                self.ready = 1
+                self.ctrl = CTRL_IDLE
+
+
+#-------------------------------------------------------------------
+# AESCoreModel
+#
+# Cycle level model of aes_core. The inputs are set as
+# attributes and clock() advances one cycle. The outputs ready,
+# result_valid and result are registers, so a change caused by
+# the inputs in one cycle is seen after the next call to clock()
+# just as in the RTL.
+#-------------------------------------------------------------------
+class AESCoreModel(object):
+    def __init__(self, num_sboxes=4):
+        self.num_sboxes = num_sboxes
+        self.key_mem = KeyMem(num_sboxes)
+        self.enc_block = BlockCipher(True, num_sboxes)
+        self.dec_block = BlockCipher(False, num_sboxes)
+
+        self.encdec = 1
+        self.keylen = AES_128_BIT_KEY
+        self.key = (0,) * 8
+        self.block = (0, 0, 0, 0)
+
+        self.ready = 1
+        self.result_valid = 0
+        self.ctrl = CTRL_IDLE
+        self.cycles = 0
+
+
+    @property
+    def result(self):
+        if self.encdec:
+            return self.enc_block.result
+        return self.dec_block.result
+
+
+    #---------------------------------------------------------------
+    # clock()
+    #
+    # Advance one cycle with the given init and next inputs.
+    # The core FSM looks at the ready outputs of the sub blocks
+    # before they are clocked.
+    #---------------------------------------------------------------
+    def clock(self, init=0, next=0):
+        key_ready = self.key_mem.ready
+        if self.encdec:
+            muxed_ready = self.enc_block.ready
+        else:
+            muxed_ready = self.dec_block.ready
+
+        if self.ctrl == CTRL_IDLE:
+            if init:
+                self.ready = 0
+                self.result_valid = 0
+                self.ctrl = CTRL_INIT
+            elif next:
+                self.ready = 0
+                self.result_valid = 0
+                self.ctrl = CTRL_NEXT
+
+        elif self.ctrl == CTRL_INIT:
+            if key_ready:
+                self.ready = 1
+                self.ctrl = CTRL_IDLE
+
+        elif self.ctrl == CTRL_NEXT:
+            if muxed_ready:
+                self.ready = 1
+                self.result_valid = 1
+                self.ctrl = CTRL_IDLE
+
+        ek = self.key_mem.ek
+        self.key_mem.clock(init, self.key, self.keylen)
+        self.enc_block.clock(next and self.encdec, self.keylen, ek, self.block)
+        self.dec_block.clock(next and not self.encdec, self.keylen, ek, self.block)
+        self.cycles += 1
+
+
+    #---------------------------------------------------------------
+    # run_init()
+    #
+    # Pulse init for one cycle and clock until ready. Returns the
+    # number of cycles from init to ready.
+    #---------------------------------------------------------------
+    def run_init(self, key, keylen):
+        self.key = tuple(key) + (0,) * (8 - len(key))
+        self.keylen = keylen
+        start = self.cycles
+        self.clock(init=1)
+        while not self.ready:
+            self.clock()
+        return self.cycles - start
+
+
+    #---------------------------------------------------------------
+    # run_next()
+    #
+    # Pulse next for one cycle and clock until result_valid.
+    # Returns the result and the number of cycles.
+    #---------------------------------------------------------------
+    def run_next(self, encdec, block):
+        self.encdec = encdec
+        self.block = tuple(block)
+        start = self.cycles
+        self.clock(next=1)
+        while not self.result_valid:
+            self.clock()
+        return (self.result, self.cycles - start)
+
+
+#-------------------------------------------------------------------
+# get_cycle_counts()
+#
+# Return the cycles per init and per next for encipher and
+# decipher with the given number of S-boxes and key length.
+#-------------------------------------------------------------------
+def get_cycle_counts(num_sboxes, keylen):
+    core = AESCoreModel(num_sboxes)
+    key = tuple(range(8 if keylen == AES_256_BIT_KEY else 4))
+    init_cycles = core.run_init(key, keylen)
+    (result, enc_cycles) = core.run_next(1, (0, 0, 0, 0))
+    (result, dec_cycles) = core.run_next(0, (0, 0, 0, 0))
+    return (init_cycles, enc_cycles, dec_cycles)
+
+
+#-------------------------------------------------------------------
+# print_throughput()
+#
+# Print the cycle counts and the throughput at the given clock
+# frequency in MHz for all S-box configurations.
+#-------------------------------------------------------------------
+def print_throughput(clock_mhz=100.0):
+    print("Cycles and throughput at %.1f MHz" % clock_mhz)
+    print("S-boxes  key  init  next(enc)  next(dec)  Mblocks/s    Mbps")
+    for num_sboxes in SBOX_CONFIGS:
+        for keylen in (AES_128_BIT_KEY, AES_256_BIT_KEY):
+            (init_cycles, enc_cycles, dec_cycles) = get_cycle_counts(num_sboxes, keylen)
+            mblocks = clock_mhz / enc_cycles
+            print("%7d  %3d  %4d  %9d  %9d  %9.3f  %6.1f" %
+                  (num_sboxes, 256 if keylen else 128, init_cycles, enc_cycles,
+                   dec_cycles, mblocks, mblocks * 128))
+
+
+#-------------------------------------------------------------------
+# test_core_model()
+#
+# Check the results of the model against the NIST vectors and
+# the cycle counts against the counts derived from the FSMs:
+# init takes rounds + 5 cycles for 4 or more S-boxes, and next
+# takes 3 + rounds * (16 / S-boxes + 1) cycles.
+# Returns the number of failing test cases.
+#-------------------------------------------------------------------
+def test_core_model():
+    nist_aes128_key = (0x2b7e1516, 0x28aed2a6, 0xabf71588, 0x09cf4f3c)
+    nist_aes256_key = (0x603deb10, 0x15ca71be, 0x2b73aef0, 0x857d7781,
+                       0x1f352c07, 0x3b6108d7, 0x2d9810a3, 0x0914dff4)
+    nist_plaintext = (0x6bc1bee2, 0x2e409f96, 0xe93d7e11, 0x7393172a)
+    nist_exp128 = (0x3ad77bb4, 0x0d7a3660, 0xa89ecaf3, 0x2466ef97)
+    nist_exp256 = (0xf3eed1bd, 0xb5d2a03c, 0x064b5a7e, 0x3db181f8)
+
+    tc_errors = 0
+    tc = 0
+
+    for num_sboxes in SBOX_CONFIGS:
+        core = AESCoreModel(num_sboxes)
+        for (keylen, key, expected) in ((AES_128_BIT_KEY, nist_aes128_key, nist_exp128),
+                                        (AES_256_BIT_KEY, nist_aes256_key, nist_exp256)):
+            num_rounds = get_num_rounds(keylen)
+            init_cycles = core.run_init(key, keylen)
+            (result, enc_cycles) = core.run_next(1, nist_plaintext)
+            if result != expected:
+                print("ERROR: Encipher with %d S-boxes and %d rounds failed." %
+                      (num_sboxes, num_rounds))
+                tc_errors += 1
+
+            (result, dec_cycles) = core.run_next(0, expected)
+            if result != nist_plaintext:
+                print("ERROR: Decipher with %d S-boxes and %d rounds failed." %
+                      (num_sboxes, num_rounds))
+                tc_errors += 1
+
+            if num_sboxes >= 4 and init_cycles != num_rounds + 5:
+                print("ERROR: Init took %d cycles with %d S-boxes, expected %d." %
+                      (init_cycles, num_sboxes, num_rounds + 5))
+                tc_errors += 1
+
+            expected_cycles = 3 + num_rounds * (16 // num_sboxes + 1)
+            if (enc_cycles, dec_cycles) != (expected_cycles, expected_cycles):
+                print("ERROR: Next took %d/%d cycles with %d S-boxes, expected %d." %
+                      (enc_cycles, dec_cycles, num_sboxes, expected_cycles))
+                tc_errors += 1
+            tc += 4
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+    return tc_errors
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests the cycle model and prints the cycle counts
+# and throughput, at the clock frequency in MHz given as
+# argument or 100 MHz.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the AES core cycle model")
+    print("================================")
+    errors = test_core_model()
+    print("")
+
+    clock_mhz = float(sys.argv[1]) if len(sys.argv) > 1 else 100.0
+    print_throughput(clock_mhz)
+    return errors
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_core_model.py
+#=======================================================================
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_ctr_parallel.py
+# -------------------
+# Parallel AES-CTR. The counter range is split into chunks that
+# are processed by a pool of worker processes, each with its own
+# expanded key, writing into a shared memory buffer.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2014, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import aes_modes
+from aes_bulk import BLOCK_SIZE
+from aes_key_cache import expand_key
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+# Number of blocks in each job handed to a worker. 64k blocks
+# is 1 MiB of data.
+CHUNK_BLOCKS = 65536
+
+
+#-------------------------------------------------------------------
+# Worker state. Set once per worker process by init_worker().
+#-------------------------------------------------------------------
+worker_key = None
+
+
+#-------------------------------------------------------------------
+# init_worker()
+#
+# Expand the key once in each worker process.
+#-------------------------------------------------------------------
+def init_worker(key):
+    global worker_key
+    worker_key = expand_key(key)
+
+
+#-------------------------------------------------------------------
+# ctr_job()
+#
+# Worker job. XOR the keystream for blocks first_block up to
+# last_block into the shared buffer in place. The counter for
+# first_block is counter + first_block.
+#-------------------------------------------------------------------
+def ctr_job(shm_name, length, counter, first_block, last_block):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        start = first_block * BLOCK_SIZE
+        end = min(last_block * BLOCK_SIZE, length)
+
+        ctr_iv = ((counter + first_block) % (1 << 128)).to_bytes(16, "big")
+        keystream = aes_modes.CTR(worker_key, ctr_iv).gen_keystream(last_block - first_block)
+        shm.buf[start : end] = aes_modes.xor_bytes(shm.buf[start : end],
+                                                   keystream[0 : end - start])
+    finally:
+        shm.close()
+
+    return end - start
+
+
+#-------------------------------------------------------------------
+# CTRPool
+#
+# A pool of worker processes generating CTR keystream for one
+# key. The data is copied into a shared memory buffer that the
+# workers transform in place, so only the job descriptions are
+# pickled between processes.
+#-------------------------------------------------------------------
+class CTRPool(object):
+    def __init__(self, key, workers=None, chunk_blocks=CHUNK_BLOCKS):
+        self.ek = expand_key(key)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_blocks = chunk_blocks
+        self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                            initializer=init_worker,
+                                            initargs=(self.ek.key,))
+
+
+    #---------------------------------------------------------------
+    # encrypt()
+    #
+    # CTR encipher (or decipher) the given data starting with the
+    # given 16 byte counter block.
+    #---------------------------------------------------------------
+    def encrypt(self, iv, data):
+        aes_modes.check_iv(iv)
+        length = len(data)
+        nblocks = (length + BLOCK_SIZE - 1) // BLOCK_SIZE
+
+        # Not worth the process round trip for small inputs.
+        if nblocks <= self.chunk_blocks:
+            return aes_modes.ctr_encrypt(self.ek, iv, data)
+
+        counter = int.from_bytes(iv, "big")
+        shm = shared_memory.SharedMemory(create=True, size=length)
+        try:
+            shm.buf[0 : length] = data
+            jobs = []
+            for first in range(0, nblocks, self.chunk_blocks):
+                last = min(first + self.chunk_blocks, nblocks)
+                jobs.append(self.executor.submit(ctr_job, shm.name, length,
+                                                 counter, first, last))
+            for job in jobs:
+                job.result()
+
+            return bytes(shm.buf[0 : length])
+
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+    decrypt = encrypt
+
+
+    def close(self):
+        self.executor.shutdown()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+#-------------------------------------------------------------------
+# ctr_encrypt_parallel()
+#
+# One shot parallel CTR. Starts and stops a pool for the call,
+# use a CTRPool directly to amortize the start up cost.
+#-------------------------------------------------------------------
+def ctr_encrypt_parallel(key, iv, data, workers=None):
+    with CTRPool(key, workers) as pool:
+        return pool.encrypt(iv, data)
+
+
+ctr_decrypt_parallel = ctr_encrypt_parallel
+
+
+#-------------------------------------------------------------------
+# test_ctr_parallel()
+#
+# Check that the parallel CTR gives the same result as the
+# serial CTR mode, including a counter that wraps.
+# Returns the number of failing test cases.
+#-------------------------------------------------------------------
+def test_ctr_parallel():
+    key = os.urandom(16)
+    data = os.urandom(16 * 1000 + 5)
+    tc_errors = 0
+
+    with CTRPool(key, workers=4, chunk_blocks=128) as pool:
+        for iv in (bytes(16), b"\xff" * 15 + b"\xf0"):
+            start = time.time()
+            result = pool.encrypt(iv, data)
+            print("Parallel CTR of %d bytes in %.3f s." % (len(data), time.time() - start))
+
+            if result != aes_modes.ctr_encrypt(key, iv, data):
+                print("ERROR: Parallel CTR does not match serial CTR.")
+                tc_errors += 1
+            if pool.decrypt(iv, result) != data:
+                print("ERROR: Parallel CTR round trip failed.")
+                tc_errors += 1
+
+    if tc_errors == 0:
+        print("All parallel CTR tests OK.")
+    else:
+        print("Number of failing parallel CTR tests: %d" % tc_errors)
+
+    return tc_errors
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests the parallel CTR mode.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the parallel AES-CTR mode")
+    print("=================================")
+    return test_ctr_parallel()
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_ctr_parallel.py
+#=======================================================================
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_device.py
+# -------------
+# Emulator of the memory mapped aes top level with the register map
+# and ready/valid timing of aes.v, backed by the T-table engine.
+# Counts the bus transactions per block.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2014, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import time
+
+import aes_ttable
+import aes_core_model
+from aes_key_cache import expand_key
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+ADDR_NAME0       = 0x00
+ADDR_NAME1       = 0x01
+ADDR_VERSION     = 0x02
+
+ADDR_CTRL        = 0x08
+CTRL_INIT_BIT    = 0
+CTRL_NEXT_BIT    = 1
+
+ADDR_STATUS      = 0x09
+STATUS_READY_BIT = 0
+STATUS_VALID_BIT = 1
+
+ADDR_CONFIG      = 0x0a
+CTRL_ENCDEC_BIT  = 0
+CTRL_KEYLEN_BIT  = 1
+
+ADDR_KEY0        = 0x10
+ADDR_KEY7        = 0x17
+
+ADDR_BLOCK0      = 0x20
+ADDR_BLOCK3      = 0x23
+
+ADDR_RESULT0     = 0x30
+ADDR_RESULT3     = 0x33
+
+CORE_NAME0       = 0x61657320 # "aes "
+CORE_NAME1       = 0x20202020 # "    "
+CORE_VERSION     = 0x302e3630 # "0.60"
+
+AES_DECIPHER = 0
+AES_ENCIPHER = 1
+
+AES_128_BIT_KEY = 0
+AES_256_BIT_KEY = 1
+
+# Cycles from a write to ADDR_CTRL until the status register
+# shows the core as busy. The write sets init_reg or next_reg,
+# the core reacts one cycle later and ready_reg follows the
+# core one cycle after that. Status reads before then see the
+# status of the previous operation.
+STATUS_LATENCY = 2
+
+
+#-------------------------------------------------------------------
+# Signal
+#
+# A register value with the cycles at which it changes. Changes
+# can be scheduled ahead of time, which lets the device compute
+# the result at once while reads still see the values the RTL
+# would have in each cycle.
+#-------------------------------------------------------------------
+class Signal(object):
+    __slots__ = ("events",)
+
+    def __init__(self, value):
+        self.events = [(0, value)]
+
+
+    #---------------------------------------------------------------
+    # set()
+    #
+    # Set the value from the given cycle on. Changes scheduled
+    # at or after the cycle are replaced.
+    #---------------------------------------------------------------
+    def set(self, cycle, value):
+        events = self.events
+        while len(events) > 1 and events[-1][0] >= cycle:
+            events.pop()
+        events.append((cycle, value))
+
+
+    #---------------------------------------------------------------
+    # get()
+    #
+    # Return the value in the given cycle and drop the changes
+    # that are too old to be seen again.
+    #---------------------------------------------------------------
+    def get(self, cycle):
+        events = self.events
+        for i in range(len(events) - 1, -1, -1):
+            if events[i][0] <= cycle:
+                value = events[i][1]
+                if i > 1:
+                    del events[0 : i - 1]
+                return value
+        return events[0][1]
+
+
+#-------------------------------------------------------------------
+# AESDevice
+#
+# Emulator of the memory mapped aes top level with the same
+# register map and ready/valid timing as the RTL. Each read and
+# write is one bus cycle and idle() lets cycles pass without bus
+# traffic. The cycles an operation takes come from the cycle
+# model of the core, the result is computed with the T-table
+# engine as soon as the operation starts.
+#-------------------------------------------------------------------
+class AESDevice(object):
+    def __init__(self, num_sboxes=4):
+        self.init_cycles = {}
+        self.next_cycles = {}
+        for keylen in (AES_128_BIT_KEY, AES_256_BIT_KEY):
+            (init_cycles, enc_cycles, dec_cycles) =\
+                aes_core_model.get_cycle_counts(num_sboxes, keylen)
+            self.init_cycles[keylen] = init_cycles
+            self.next_cycles[keylen] = (dec_cycles, enc_cycles)
+        self.reset()
+
+
+    #---------------------------------------------------------------
+    # reset()
+    #
+    # Reset all registers and the counters as reset_n does.
+    #---------------------------------------------------------------
+    def reset(self):
+        self.cycle = 0
+        self.key_reg = [0] * 8
+        self.block_reg = [0] * 4
+        self.init_reg = Signal(0)
+        self.next_reg = Signal(0)
+        self.encdec_reg = Signal(0)
+        self.keylen_reg = Signal(0)
+
+        self.core_ready = Signal(1)
+        self.core_valid = Signal(0)
+        self.core_results = (Signal((0, 0, 0, 0)), Signal((0, 0, 0, 0)))
+        self.core_idle_cycle = 0
+        self.ek = None
+        self.reset_stats()
+
+
+    #---------------------------------------------------------------
+    # reset_stats()
+    #---------------------------------------------------------------
+    def reset_stats(self):
+        self.reads = 0
+        self.writes = 0
+        self.status_reads = 0
+        self.inits = 0
+        self.blocks = 0
+        self.start_cycle = self.cycle
+
+
+    #---------------------------------------------------------------
+    # get_stats()
+    #
+    # Return the bus transaction counters since the last reset
+    # of the counters as a dict.
+    #---------------------------------------------------------------
+    def get_stats(self):
+        transactions = self.reads + self.writes
+        per_block = float(transactions) / self.blocks if self.blocks else 0.0
+        return {"reads" : self.reads,
+                "writes" : self.writes,
+                "status_reads" : self.status_reads,
+                "inits" : self.inits,
+                "blocks" : self.blocks,
+                "cycles" : self.cycle - self.start_cycle,
+                "transactions_per_block" : per_block}
+
+
+    #---------------------------------------------------------------
+    # idle()
+    #
+    # Let the given number of cycles pass without bus access.
+    #---------------------------------------------------------------
+    def idle(self, cycles=1):
+        self.cycle += cycles
+
+
+    #---------------------------------------------------------------
+    # start()
+    #
+    # The core sees init or next in the given cycle. Schedule the
+    # ready, valid and result changes the RTL would make. The
+    # core ignores init and next when it is not idle.
+    #---------------------------------------------------------------
+    def start(self, cycle, init, next):
+        if cycle < self.core_idle_cycle:
+            return
+
+        keylen = self.keylen_reg.get(cycle)
+        if init:
+            if keylen == AES_256_BIT_KEY:
+                self.ek = expand_key(tuple(self.key_reg))
+            else:
+                self.ek = expand_key(tuple(self.key_reg[0 : 4]))
+            done = cycle + self.init_cycles[keylen]
+            self.core_valid.set(cycle + 1, 0)
+            self.inits += 1
+
+        else:
+            encdec = self.encdec_reg.get(cycle)
+            block = tuple(self.block_reg)
+            if encdec:
+                result = aes_ttable.encipher_block(self.ek.enc_keys, block)
+            else:
+                result = aes_ttable.decipher_block(self.ek.dec_keys, block)
+            done = cycle + self.next_cycles[keylen][encdec]
+            self.core_results[encdec].set(done - 1, result)
+            self.core_valid.set(cycle + 1, 0)
+            self.core_valid.set(done, 1)
+            self.blocks += 1
+
+        self.core_ready.set(cycle + 1, 0)
+        self.core_ready.set(done, 1)
+        self.core_idle_cycle = done
+
+
+    #---------------------------------------------------------------
+    # write()
+    #
+    # One bus write cycle. The registers get the new value in
+    # the next cycle.
+    #---------------------------------------------------------------
+    def write(self, address, data):
+        cycle = self.cycle
+        self.cycle += 1
+        self.writes += 1
+
+        if address == ADDR_CTRL:
+            init = (data >> CTRL_INIT_BIT) & 1
+            next = (data >> CTRL_NEXT_BIT) & 1
+            self.init_reg.set(cycle + 1, init)
+            self.init_reg.set(cycle + 2, 0)
+            self.next_reg.set(cycle + 1, next)
+            self.next_reg.set(cycle + 2, 0)
+            if init or next:
+                self.start(cycle + 1, init, next)
+
+        elif address == ADDR_CONFIG:
+            self.encdec_reg.set(cycle + 1, (data >> CTRL_ENCDEC_BIT) & 1)
+            self.keylen_reg.set(cycle + 1, (data >> CTRL_KEYLEN_BIT) & 1)
+
+        elif ADDR_KEY0 <= address <= ADDR_KEY7:
+            self.key_reg[address & 0x7] = data & 0xffffffff
+
+        elif ADDR_BLOCK0 <= address <= ADDR_BLOCK3:
+            self.block_reg[address & 0x3] = data & 0xffffffff
+
+
+    #---------------------------------------------------------------
+    # read()
+    #
+    # One bus read cycle. The status and result registers are
+    # copies of the core outputs from the cycle before.
+    #---------------------------------------------------------------
+    def read(self, address):
+        cycle = self.cycle
+        self.cycle += 1
+        self.reads += 1
+
+        if address == ADDR_NAME0:
+            return CORE_NAME0
+        if address == ADDR_NAME1:
+            return CORE_NAME1
+        if address == ADDR_VERSION:
+            return CORE_VERSION
+
+        if address == ADDR_CTRL:
+            return (self.keylen_reg.get(cycle) << 3) | (self.encdec_reg.get(cycle) << 2) |\
+                   (self.next_reg.get(cycle) << 1) | self.init_reg.get(cycle)
+
+        if address == ADDR_STATUS:
+            self.status_reads += 1
+            return (self.core_valid.get(cycle - 1) << STATUS_VALID_BIT) |\
+                   (self.core_ready.get(cycle - 1) << STATUS_READY_BIT)
+
+        if ADDR_RESULT0 <= address <= ADDR_RESULT3:
+            encdec = self.encdec_reg.get(cycle - 1)
+            return self.core_results[encdec].get(cycle - 1)[address - ADDR_RESULT0]
+
+        return 0
+
+
+#-------------------------------------------------------------------
+# wait_status()
+#
+# Poll the status register until the given bit is set.
+#-------------------------------------------------------------------
+def wait_status(dev, bit):
+    while not (dev.read(ADDR_STATUS) >> bit) & 1:
+        pass
+
+
+#-------------------------------------------------------------------
+# init_key()
+#
+# Driver sequence for loading a key of four or eight words and
+# waiting for the key expansion.
+#-------------------------------------------------------------------
+def init_key(dev, key, encdec=AES_ENCIPHER):
+    keylen = AES_256_BIT_KEY if len(key) == 8 else AES_128_BIT_KEY
+    for i in range(len(key)):
+        dev.write(ADDR_KEY0 + i, key[i])
+    dev.write(ADDR_CONFIG, (keylen << CTRL_KEYLEN_BIT) | (encdec << CTRL_ENCDEC_BIT))
+    dev.write(ADDR_CTRL, 1 << CTRL_INIT_BIT)
+    dev.idle(STATUS_LATENCY)
+    wait_status(dev, STATUS_READY_BIT)
+
+
+#-------------------------------------------------------------------
+# process_block()
+#
+# Driver sequence for one block with the key and direction set
+# by init_key(). Returns the result.
+#-------------------------------------------------------------------
+def process_block(dev, block):
+    for i in range(4):
+        dev.write(ADDR_BLOCK0 + i, block[i])
+    dev.write(ADDR_CTRL, 1 << CTRL_NEXT_BIT)
+    dev.idle(STATUS_LATENCY)
+    wait_status(dev, STATUS_VALID_BIT)
+    return tuple(dev.read(ADDR_RESULT0 + i) for i in range(4))
+
+
+#-------------------------------------------------------------------
+# test_device()
+#
+# Run the NIST vectors through the driver sequences and check
+# the status timing against the cycle model. Returns the number
+# of failing test cases.
+#-------------------------------------------------------------------
+def test_device():
+    nist_aes128_key = (0x2b7e1516, 0x28aed2a6, 0xabf71588, 0x09cf4f3c)
+    nist_aes256_key = (0x603deb10, 0x15ca71be, 0x2b73aef0, 0x857d7781,
+                       0x1f352c07, 0x3b6108d7, 0x2d9810a3, 0x0914dff4)
+    nist_plaintext = (0x6bc1bee2, 0x2e409f96, 0xe93d7e11, 0x7393172a)
+    nist_exp128 = (0x3ad77bb4, 0x0d7a3660, 0xa89ecaf3, 0x2466ef97)
+    nist_exp256 = (0xf3eed1bd, 0xb5d2a03c, 0x064b5a7e, 0x3db181f8)
+
+    tc_errors = 0
+    tc = 0
+    dev = AESDevice()
+
+    if (dev.read(ADDR_NAME0), dev.read(ADDR_NAME1)) != (CORE_NAME0, CORE_NAME1):
+        print("ERROR: Core name not correct.")
+        tc_errors += 1
+    tc += 1
+
+    for (key, expected) in ((nist_aes128_key, nist_exp128), (nist_aes256_key, nist_exp256)):
+        init_key(dev, key, AES_ENCIPHER)
+        if process_block(dev, nist_plaintext) != expected:
+            print("ERROR: Encipher with %d bit key failed." % (len(key) * 32))
+            tc_errors += 1
+
+        dev.write(ADDR_CONFIG, ((len(key) // 8) << CTRL_KEYLEN_BIT) | AES_DECIPHER)
+        if process_block(dev, expected) != nist_plaintext:
+            print("ERROR: Decipher with %d bit key failed." % (len(key) * 32))
+            tc_errors += 1
+        tc += 2
+
+    # Check the status in every cycle after next against the
+    # cycle model: two cycles with the ready but not valid status
+    # left by init, busy until the core is done and valid one
+    # cycle after that.
+    core = aes_core_model.AESCoreModel()
+    core.run_init(nist_aes128_key, AES_128_BIT_KEY)
+    (result, next_cycles) = core.run_next(AES_ENCIPHER, nist_plaintext)
+
+    init_key(dev, nist_aes128_key, AES_ENCIPHER)
+    dev.write(ADDR_CTRL, 1 << CTRL_NEXT_BIT)
+    status = [dev.read(ADDR_STATUS) for i in range(next_cycles + 4)]
+    expected = [1] * STATUS_LATENCY + [0] * (next_cycles - 1) + [3] * 3
+    if status != expected:
+        print("ERROR: Status timing not correct: %s" % status)
+        tc_errors += 1
+
+    # Init while the core is busy is ignored.
+    dev.write(ADDR_CTRL, 1 << CTRL_NEXT_BIT)
+    dev.write(ADDR_CTRL, 1 << CTRL_INIT_BIT)
+    dev.idle(next_cycles + 4)
+    if dev.get_stats()["inits"] != 3 or dev.get_stats()["blocks"] != 6:
+        print("ERROR: Operation started while the core was busy.")
+        tc_errors += 1
+    tc += 2
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+    return tc_errors
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests the device emulator and prints the bus
+# traffic and speed for a number of random blocks.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the AES device emulator")
+    print("===============================")
+    errors = test_device()
+    print("")
+
+    dev = AESDevice()
+    num_blocks = 10000
+    key = tuple(int.from_bytes(os.urandom(4), "big") for i in range(4))
+    init_key(dev, key)
+    dev.reset_stats()
+
+    start = time.perf_counter()
+    for i in range(num_blocks):
+        process_block(dev, (i, i, i, i))
+    elapsed = time.perf_counter() - start
+
+    stats = dev.get_stats()
+    print("Blocks: %d, %.0f blocks/s" % (num_blocks, num_blocks / elapsed))
+    print("Bus writes: %d, reads: %d, status reads: %d" %
+          (stats["writes"], stats["reads"], stats["status_reads"]))
+    print("Transactions per block: %.1f, cycles per block: %.1f" %
+          (stats["transactions_per_block"], float(stats["cycles"]) / num_blocks))
+    return errors
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_device.py
+#=======================================================================
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_fast.py
+# -----------
+# Silent, pure Python, word based AES engine with support for
+# 128, 192 and 256 bit keys. Functionally identical to the tracing
+# model in aes.py but with no prints or verbosity checks in the
+# hot path. Use this one for bulk processing.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2014, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+
+from aes import sbox, inv_sbox, mixw, inv_mixw
+from aes_key_cache import expand_key
+
+
+#-------------------------------------------------------------------
+# encipher_block()
+#
+# Encipher the given block using the given flat round keys. The
+# SubBytes and ShiftRows operations are merged into one pass.
+#-------------------------------------------------------------------
+def encipher_block(round_keys, block):
+    rk = round_keys
+    num_rounds = len(rk) // 4 - 1
+
+    (w0, w1, w2, w3) = block
+    s0 = w0 ^ rk[0]
+    s1 = w1 ^ rk[1]
+    s2 = w2 ^ rk[2]
+    s3 = w3 ^ rk[3]
+
+    for i in range(1, num_rounds + 1):
+        t0 = (sbox[s0 >> 24] << 24) | (sbox[(s1 >> 16) & 0xff] << 16) |\
+             (sbox[(s2 >> 8) & 0xff] << 8) | sbox[s3 & 0xff]
+        t1 = (sbox[s1 >> 24] << 24) | (sbox[(s2 >> 16) & 0xff] << 16) |\
+             (sbox[(s3 >> 8) & 0xff] << 8) | sbox[s0 & 0xff]
+        t2 = (sbox[s2 >> 24] << 24) | (sbox[(s3 >> 16) & 0xff] << 16) |\
+             (sbox[(s0 >> 8) & 0xff] << 8) | sbox[s1 & 0xff]
+        t3 = (sbox[s3 >> 24] << 24) | (sbox[(s0 >> 16) & 0xff] << 16) |\
+             (sbox[(s1 >> 8) & 0xff] << 8) | sbox[s2 & 0xff]
+
+        if i < num_rounds:
+            t0 = mixw(t0)
+            t1 = mixw(t1)
+            t2 = mixw(t2)
+            t3 = mixw(t3)
+
+        k = 4 * i
+        s0 = t0 ^ rk[k]
+        s1 = t1 ^ rk[k + 1]
+        s2 = t2 ^ rk[k + 2]
+        s3 = t3 ^ rk[k + 3]
+
+    return (s0, s1, s2, s3)
+
+
+#-------------------------------------------------------------------
+# decipher_block()
+#
+# Decipher the given block using the given flat round keys.
+# The InvShiftRows and InvSubBytes operations are merged into
+# one pass.
+#-------------------------------------------------------------------
+def decipher_block(round_keys, block):
+    rk = round_keys
+    num_rounds = len(rk) // 4 - 1
+
+    (w0, w1, w2, w3) = block
+    s0 = w0
+    s1 = w1
+    s2 = w2
+    s3 = w3
+
+    for i in range(num_rounds, 0, -1):
+        k = 4 * i
+        s0 ^= rk[k]
+        s1 ^= rk[k + 1]
+        s2 ^= rk[k + 2]
+        s3 ^= rk[k + 3]
+
+        if i < num_rounds:
+            s0 = inv_mixw(s0)
+            s1 = inv_mixw(s1)
+            s2 = inv_mixw(s2)
+            s3 = inv_mixw(s3)
+
+        t0 = (inv_sbox[s0 >> 24] << 24) | (inv_sbox[(s3 >> 16) & 0xff] << 16) |\
+             (inv_sbox[(s2 >> 8) & 0xff] << 8) | inv_sbox[s1 & 0xff]
+        t1 = (inv_sbox[s1 >> 24] << 24) | (inv_sbox[(s0 >> 16) & 0xff] << 16) |\
+             (inv_sbox[(s3 >> 8) & 0xff] << 8) | inv_sbox[s2 & 0xff]
+        t2 = (inv_sbox[s2 >> 24] << 24) | (inv_sbox[(s1 >> 16) & 0xff] << 16) |\
+             (inv_sbox[(s0 >> 8) & 0xff] << 8) | inv_sbox[s3 & 0xff]
+        t3 = (inv_sbox[s3 >> 24] << 24) | (inv_sbox[(s2 >> 16) & 0xff] << 16) |\
+             (inv_sbox[(s1 >> 8) & 0xff] << 8) | inv_sbox[s0 & 0xff]
+        s0 = t0
+        s1 = t1
+        s2 = t2
+        s3 = t3
+
+    return (s0 ^ rk[0], s1 ^ rk[1], s2 ^ rk[2], s3 ^ rk[3])
+
+
+#-------------------------------------------------------------------
+# aes_encipher_block()
+#
+# Perform AES encipher operation for the given block using the
+# given key. Drop in replacement for the tracing model. The
+# round keys are taken from the key cache.
+#-------------------------------------------------------------------
+def aes_encipher_block(key, block):
+    return encipher_block(expand_key(key).enc_keys, block)
+
+
+#-------------------------------------------------------------------
+# aes_decipher_block()
+#
+# Perform AES decipher operation for the given block using the
+# given key. Drop in replacement for the tracing model. The
+# round keys are taken from the key cache.
+#-------------------------------------------------------------------
+def aes_decipher_block(key, block):
+    return decipher_block(expand_key(key).enc_keys, block)
+
+
+#-------------------------------------------------------------------
+# test_aes()
+#
+# Test the silent engine with the NIST 128, 192 and 256 bit vectors.
+# Returns the number of failing test cases.
+#-------------------------------------------------------------------
+def test_aes():
+    nist_aes128_key = (0x2b7e1516, 0x28aed2a6, 0xabf71588, 0x09cf4f3c)
+    nist_aes192_key = (0x8e73b0f7, 0xda0e6452, 0xc810f32b, 0x809079e5,
+                       0x62f8ead2, 0x522c6b7b)
+    nist_aes256_key = (0x603deb10, 0x15ca71be, 0x2b73aef0, 0x857d7781,
+                       0x1f352c07, 0x3b6108d7, 0x2d9810a3, 0x0914dff4)
+
+    nist_plaintext = ((0x6bc1bee2, 0x2e409f96, 0xe93d7e11, 0x7393172a),
+                      (0xae2d8a57, 0x1e03ac9c, 0x9eb76fac, 0x45af8e51),
+                      (0x30c81c46, 0xa35ce411, 0xe5fbc119, 0x1a0a52ef),
+                      (0xf69f2445, 0xdf4f9b17, 0xad2b417b, 0xe66c3710))
+
+    nist_exp128 = ((0x3ad77bb4, 0x0d7a3660, 0xa89ecaf3, 0x2466ef97),
+                   (0xf5d3d585, 0x03b9699d, 0xe785895a, 0x96fdbaaf),
+                   (0x43b1cd7f, 0x598ece23, 0x881b00e3, 0xed030688),
+                   (0x7b0c785e, 0x27e8ad3f, 0x82232071, 0x04725dd4))
+
+    nist_exp192 = ((0xbd334f1d, 0x6e45f25f, 0xf712a214, 0x571fa5cc),
+                   (0x97410484, 0x6d0ad3ad, 0x7734ecb3, 0xecee4eef),
+                   (0xef7afd22, 0x70e2e60a, 0xdce0ba2f, 0xace6444e),
+                   (0x9a4b41ba, 0x738d6c72, 0xfb166916, 0x03c18e0e))
+
+    nist_exp256 = ((0xf3eed1bd, 0xb5d2a03c, 0x064b5a7e, 0x3db181f8),
+                   (0x591ccb10, 0xd410ed26, 0xdc5ba74a, 0x31362870),
+                   (0xb6ed21b9, 0x9ca6f4f9, 0xf153e7b1, 0xbeafed1d),
+                   (0x23304b7a, 0x39f9f3ff, 0x067d8d8f, 0x9e24ecc7))
+
+    tc_errors = 0
+    tc = 0
+
+    for (title, key, expected) in (("AES-128", nist_aes128_key, nist_exp128),
+                                   ("AES-192", nist_aes192_key, nist_exp192),
+                                   ("AES-256", nist_aes256_key, nist_exp256)):
+        for i in range(4):
+            result = aes_encipher_block(key, nist_plaintext[i])
+            if result != expected[i]:
+                print("ERROR: Encipher test %d for %s failed." % (i, title))
+                tc_errors += 1
+            tc += 1
+
+            result = aes_decipher_block(key, expected[i])
+            if result != nist_plaintext[i]:
+                print("ERROR: Decipher test %d for %s failed." % (i, title))
+                tc_errors += 1
+            tc += 1
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+    return tc_errors
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests the silent engine using known test vectors.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the silent AES engine")
+    print("=============================")
+    return test_aes()
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_fast.py
+#=======================================================================
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_galois.py
+# -------------
+# Galois field GF(2^8) support for the AES model. Provides
+# log/antilog tables, a general gmul() and precomputed 256 entry
+# tables for the MixColumns and inverse MixColumns constants.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2014, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+
+
+#-------------------------------------------------------------------
+# xtime()
+#
+# Galois Multiplication by two for a given byte.
+#-------------------------------------------------------------------
+def xtime(b):
+    return ((b << 1) ^ (0x1b & ((b >> 7) * 0xff))) & 0xff
+
+
+#-------------------------------------------------------------------
+# gen_log_tables()
+#
+# Generate the antilog and log tables using 0x03 as generator.
+# The antilog table is doubled in length so that the sum of two
+# logs can be used as index without any modulo.
+#-------------------------------------------------------------------
+def gen_log_tables():
+    alog = [0] * 510
+    log = [0] * 256
+
+    a = 1
+    for i in range(255):
+        alog[i] = a
+        alog[i + 255] = a
+        log[a] = i
+        a ^= xtime(a)
+
+    return (alog, log)
+
+
+#-------------------------------------------------------------------
+# Log and antilog tables. Built once when the module is imported.
+#-------------------------------------------------------------------
+(alog, log) = gen_log_tables()
+
+
+#-------------------------------------------------------------------
+# gmul()
+#
+# General Galois Multiplication of the two given bytes.
+#-------------------------------------------------------------------
+def gmul(a, b):
+    if a == 0 or b == 0:
+        return 0
+    return alog[log[a] + log[b]]
+
+
+#-------------------------------------------------------------------
+# gen_mul_table()
+#
+# Generate a 256 entry table with the Galois Multiplication
+# of every byte by the given constant.
+#-------------------------------------------------------------------
+def gen_mul_table(c):
+    return [gmul(c, b) for b in range(256)]
+
+
+#-------------------------------------------------------------------
+# Multiplication tables for the constants used by MixColumns
+# and inverse MixColumns.
+#-------------------------------------------------------------------
+mul2  = gen_mul_table(0x02)
+mul3  = gen_mul_table(0x03)
+mul9  = gen_mul_table(0x09)
+mul11 = gen_mul_table(0x0b)
+mul13 = gen_mul_table(0x0d)
+mul14 = gen_mul_table(0x0e)
+
+
+#-------------------------------------------------------------------
+# test_galois()
+#
+# Check gmul() and the tables against a shift and add reference
+# multiplication for all pairs of bytes.
+# Returns the number of errors found.
+#-------------------------------------------------------------------
+def test_galois():
+    def ref_gmul(a, b):
+        res = 0
+        while b:
+            if b & 1:
+                res ^= a
+            a = xtime(a)
+            b >>= 1
+        return res
+
+    errors = 0
+    for a in range(256):
+        for b in range(256):
+            if gmul(a, b) != ref_gmul(a, b):
+                errors += 1
+
+    for (c, table) in ((0x02, mul2), (0x03, mul3), (0x09, mul9),
+                       (0x0b, mul11), (0x0d, mul13), (0x0e, mul14)):
+        for b in range(256):
+            if table[b] != ref_gmul(c, b):
+                print("ERROR: mul table for 0x%02x wrong at 0x%02x." % (c, b))
+                errors += 1
+
+    if errors == 0:
+        print("All Galois multiplications OK.")
+    else:
+        print("Number of incorrect multiplications: %d" % errors)
+
+    return errors
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests the Galois tables.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the GF(2^8) tables")
+    print("==========================")
+    return test_galois()
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_galois.py
+#=======================================================================
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_gcm.py
+# ----------
+# AES-GCM as specified in NIST SP 800-38D. GHASH uses an 8-bit
+# Shoup table per hash key H, cached with the expanded key.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2014, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import time
+import hmac
+import struct
+
+import aes_ttable
+from aes_bulk import BLOCK_SIZE, block_struct
+from aes_modes import xor_bytes
+from aes_key_cache import expand_key
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+# The GCM reduction polynomial in the reflected bit order.
+GCM_R = 0xe1 << 120
+
+
+#-------------------------------------------------------------------
+# gf128_mul()
+#
+# Bitwise multiplication of two elements in GF(2^128) using the
+# GCM bit order. Only used to build the tables.
+#-------------------------------------------------------------------
+def gf128_mul(x, y):
+    z = 0
+    v = y
+    for i in range(127, -1, -1):
+        if (x >> i) & 1:
+            z ^= v
+        if v & 1:
+            v = (v >> 1) ^ GCM_R
+        else:
+            v >>= 1
+    return z
+
+
+#-------------------------------------------------------------------
+# gen_reduction_table()
+#
+# Generate the Shoup reduction table. Entry b is the value
+# that must be XORed in when the byte b is shifted out at the
+# low end of an element multiplied by x^8.
+#-------------------------------------------------------------------
+def gen_reduction_table():
+    table = []
+    for b in range(256):
+        v = b
+        for i in range(8):
+            if v & 1:
+                v = (v >> 1) ^ GCM_R
+            else:
+                v >>= 1
+        table.append(v)
+    return table
+
+
+#-------------------------------------------------------------------
+# Reduction table. Does not depend on H so it is built once.
+#-------------------------------------------------------------------
+ghash_r = gen_reduction_table()
+
+
+#-------------------------------------------------------------------
+# gen_ghash_table()
+#
+# Generate the 8-bit Shoup table for the hash key h. Entry b is
+# the product of h and the element with b as its first byte.
+#-------------------------------------------------------------------
+def gen_ghash_table(h):
+    table = [0] * 256
+    table[0x80] = h
+    i = 0x40
+    while i:
+        table[i] = gf128_mul(i << 120, h)
+        i >>= 1
+
+    for b in range(1, 256):
+        if b & (b - 1):
+            high = 1 << (b.bit_length() - 1)
+            table[b] = table[high] ^ table[b ^ high]
+
+    return table
+
+
+#-------------------------------------------------------------------
+# get_ghash_table()
+#
+# Return the GHASH table for the given expanded key, generating
+# and caching it with the key the first time.
+#-------------------------------------------------------------------
+def get_ghash_table(ek):
+    table = ek.derived.get("ghash")
+    if table is None:
+        h = block_struct.pack(*aes_ttable.encipher_block(ek.enc_keys, (0, 0, 0, 0)))
+        table = gen_ghash_table(int.from_bytes(h, "big"))
+        ek.derived["ghash"] = table
+    return table
+
+
+#-------------------------------------------------------------------
+# ghash()
+#
+# GHASH of the given data using the given table. The data is
+# zero padded to a whole number of blocks. y is the initial
+# hash value, which allows hashing in several calls.
+#-------------------------------------------------------------------
+def ghash(table, data, y=0):
+    m = table
+    r = ghash_r
+    mv = memoryview(data).cast("B")
+    n = len(mv)
+    full = n - (n % BLOCK_SIZE)
+
+    for offset in range(0, n, BLOCK_SIZE):
+        if offset < full:
+            x = y ^ int.from_bytes(mv[offset : offset + BLOCK_SIZE], "big")
+        else:
+            x = y ^ int.from_bytes(bytes(mv[offset:]).ljust(BLOCK_SIZE, b"\x00"), "big")
+
+        z = m[x & 0xff]
+        for shift in range(8, 128, 8):
+            z = (z >> 8) ^ r[z & 0xff] ^ m[(x >> shift) & 0xff]
+        y = z
+
+    return y
+
+
+#-------------------------------------------------------------------
+# gctr()
+#
+# GCM counter mode. Only the last 32 bits of the counter block
+# are incremented, modulo 2^32.
+#-------------------------------------------------------------------
+def gctr(ek, counter_block, data):
+    n = len(data)
+    if n == 0:
+        return b""
+
+    nblocks = (n + BLOCK_SIZE - 1) // BLOCK_SIZE
+    keystream = bytearray(nblocks * BLOCK_SIZE)
+    rk = ek.enc_keys
+    encipher_block = aes_ttable.encipher_block
+    pack_into = block_struct.pack_into
+    (c0, c1, c2, c3) = counter_block
+
+    for offset in range(0, nblocks * BLOCK_SIZE, BLOCK_SIZE):
+        pack_into(keystream, offset, *encipher_block(rk, (c0, c1, c2, c3)))
+        c3 = (c3 + 1) & 0xffffffff
+
+    return xor_bytes(data, keystream[0 : n])
+
+
+#-------------------------------------------------------------------
+# gen_j0()
+#
+# Generate the pre-counter block J0 from the given IV.
+#-------------------------------------------------------------------
+def gen_j0(table, iv):
+    if len(iv) == 0:
+        raise ValueError("IV must not be empty.")
+
+    if len(iv) == 12:
+        return block_struct.unpack(bytes(iv) + b"\x00\x00\x00\x01")
+
+    y = ghash(table, iv)
+    y = ghash(table, struct.pack(">QQ", 0, len(iv) * 8), y)
+    return block_struct.unpack(y.to_bytes(16, "big"))
+
+
+#-------------------------------------------------------------------
+# gcm_tag()
+#
+# Compute the full 16 byte tag for the given AAD and ciphertext.
+#-------------------------------------------------------------------
+def gcm_tag(ek, table, j0, aad, ciphertext):
+    s = ghash(table, aad)
+    s = ghash(table, ciphertext, s)
+    s = ghash(table, struct.pack(">QQ", len(aad) * 8, len(ciphertext) * 8), s)
+
+    e = block_struct.pack(*aes_ttable.encipher_block(ek.enc_keys, j0))
+    return xor_bytes(e, s.to_bytes(16, "big"))
+
+
+#-------------------------------------------------------------------
+# check_tag_len()
+#-------------------------------------------------------------------
+def check_tag_len(tag_len):
+    if tag_len not in (4, 8, 12, 13, 14, 15, 16):
+        raise ValueError("Unsupported tag length %d." % tag_len)
+
+
+#-------------------------------------------------------------------
+# gcm_seal()
+#
+# Authenticated encipher of the plaintext. Returns the
+# ciphertext and the tag.
+#-------------------------------------------------------------------
+def gcm_seal(key, iv, plaintext, aad=b"", tag_len=16):
+    check_tag_len(tag_len)
+    ek = expand_key(key)
+    table = get_ghash_table(ek)
+    j0 = gen_j0(table, iv)
+
+    ciphertext = gctr(ek, j0[0 : 3] + ((j0[3] + 1) & 0xffffffff,), plaintext)
+    tag = gcm_tag(ek, table, j0, aad, ciphertext)
+    return (ciphertext, tag[0 : tag_len])
+
+
+#-------------------------------------------------------------------
+# gcm_open()
+#
+# Authenticated decipher of the ciphertext. Raises ValueError
+# if the tag does not match, in which case no plaintext is
+# returned.
+#-------------------------------------------------------------------
+def gcm_open(key, iv, ciphertext, tag, aad=b""):
+    check_tag_len(len(tag))
+    ek = expand_key(key)
+    table = get_ghash_table(ek)
+    j0 = gen_j0(table, iv)
+
+    expected = gcm_tag(ek, table, j0, aad, ciphertext)[0 : len(tag)]
+    if not hmac.compare_digest(expected, bytes(tag)):
+        raise ValueError("GCM tag mismatch.")
+
+    return gctr(ek, j0[0 : 3] + ((j0[3] + 1) & 0xffffffff,), ciphertext)
+
+
+#-------------------------------------------------------------------
+# test_gcm()
+#
+# Test GCM with test cases from the GCM specification by
+# McGrew and Viega. Returns the number of failing test cases.
+#-------------------------------------------------------------------
+def test_gcm():
+    p = ("d9313225f88406e5a55909c5aff5269a86a7a9531534f7da2e4c303d8a318a72"
+         "1c3c0c95956809532fcf0e2449a6b525b16aedf5aa0de657ba637b391aafd255")
+    c3 = ("42831ec2217774244b7221b784d0d49ce3aa212f2c02a4e035c17e2329aca12e"
+          "21d514b25466931c7d8f6a5aac84aa051ba30b396a0aac973d58e091473f5985")
+    c5 = ("61353b4c2806934a777ff51fa22a4755699b2a714fcdc6f83766e5f97b6c7423"
+          "73806900e49f24b22b097544d4896b424989b5e1ebac0f07c23f4598")
+    k = "feffe9928665731c6d6a8f9467308308"
+    a = "feedfacedeadbeeffeedfacedeadbeefabaddad2"
+
+    # (name, key, iv, plaintext, aad, ciphertext, tag)
+    tests = (
+        ("Test Case 1", "00" * 16, "00" * 12, "", "", "",
+         "58e2fccefa7e3061367f1d57a4e7455a"),
+        ("Test Case 2", "00" * 16, "00" * 12, "00" * 16, "",
+         "0388dace60b6a392f328c2b971b2fe78",
+         "ab6e47d42cec13bdf53a67b21257bddf"),
+        ("Test Case 3", k, "cafebabefacedbaddecaf888", p, "", c3,
+         "4d5c2af327cd64a62cf35abd2ba6fab4"),
+        ("Test Case 4", k, "cafebabefacedbaddecaf888", p[0 : 120], a, c3[0 : 120],
+         "5bc94fbc3221a5db94fae95ae7121a47"),
+        ("Test Case 5", k, "cafebabefacedbad", p[0 : 120], a, c5,
+         "3612d2e79e3b0785561be14aaca2fccb"),
+        ("Test Case 13", "00" * 32, "00" * 12, "", "", "",
+         "530f8afbc74536b9a963b4f1c4cb738b"),
+        ("Test Case 14", "00" * 32, "00" * 12, "00" * 16, "",
+         "cea7403d4d606b6e074ec5d3baf39d18",
+         "d0d1c8a799996bf0265b98b5d48ab919"),
+    )
+
+    tc_errors = 0
+    tc = 0
+
+    for (name, key, iv, pt, aad, ct, tag) in tests:
+        (key, iv, pt, aad, ct, tag) = [bytes.fromhex(x) for x in
+                                       (key, iv, pt, aad, ct, tag)]
+
+        (result, result_tag) = gcm_seal(key, iv, pt, aad)
+        if result != ct or result_tag != tag:
+            print("ERROR: %s seal failed." % name)
+            tc_errors += 1
+
+        try:
+            if gcm_open(key, iv, ct, tag, aad) != pt:
+                print("ERROR: %s open returned wrong plaintext." % name)
+                tc_errors += 1
+        except ValueError:
+            print("ERROR: %s open rejected a valid tag." % name)
+            tc_errors += 1
+
+        bad_tag = bytes([tag[0] ^ 1]) + tag[1:]
+        try:
+            gcm_open(key, iv, ct, bad_tag, aad)
+            print("ERROR: %s open accepted a bad tag." % name)
+            tc_errors += 1
+        except ValueError:
+            pass
+
+        tc += 1
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+    return tc_errors
+
+
+#-------------------------------------------------------------------
+# bench_ghash()
+#
+# Measure and print the GHASH throughput for the given sizes.
+# The table generation is timed separately.
+#-------------------------------------------------------------------
+def bench_ghash(sizes=(1024, 65536, 1048576)):
+    start = time.perf_counter()
+    table = gen_ghash_table(int.from_bytes(os.urandom(16), "big"))
+    print("GHASH table generation: %.3f ms" % ((time.perf_counter() - start) * 1000))
+
+    for size in sizes:
+        data = os.urandom(size)
+        start = time.perf_counter()
+        ghash(table, data)
+        elapsed = time.perf_counter() - start
+        print("GHASH %8d bytes: %8.3f ms, %8.3f MB/s" %
+              (size, elapsed * 1000, size / elapsed / 1e6))
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests GCM using known test vectors and measures
+# the GHASH throughput.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the AES-GCM mode")
+    print("========================")
+    errors = test_gcm()
+    print("")
+    bench_ghash()
+    return errors
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_gcm.py
+#=======================================================================
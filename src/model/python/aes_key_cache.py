@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_key_cache.py
+# ----------------
+# Expanded key object and a bounded LRU cache of key schedules
+# indexed by the cipher key. Lets bulk processing under one key
+# pay for the key expansion once per process.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2014, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import random
+import struct
+from collections import OrderedDict
+
+from aes_key_schedule import key_expand, dec_key_expand
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+DEFAULT_CACHE_SIZE = 1024
+
+
+#-------------------------------------------------------------------
+# ExpandedKey
+#
+# The round keys for a given cipher key, generated once by
+# key_expand() and held as a flat array of words. The round keys
+# for the equivalent inverse cipher are generated at the same
+# time and held in dec_keys. Modes that derive further per key
+# data, for example hash tables, keep it in the derived dict so
+# that it is cached along with the key.
+#-------------------------------------------------------------------
+class ExpandedKey(object):
+    __slots__ = ("key", "num_rounds", "enc_keys", "dec_keys", "derived")
+
+    def __init__(self, key):
+        self.key = tuple(key)
+        self.enc_keys = key_expand(self.key)
+        self.dec_keys = dec_key_expand(self.enc_keys)
+        self.num_rounds = len(self.enc_keys) // 4 - 1
+        self.derived = {}
+
+
+#-------------------------------------------------------------------
+# KeyScheduleCache
+#
+# Bounded LRU cache of expanded keys indexed by the key tuple.
+# When the cache is full the least recently used schedule is
+# evicted.
+#-------------------------------------------------------------------
+class KeyScheduleCache(object):
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        if max_size < 1:
+            raise ValueError("Cache size must be at least one, got %d." % max_size)
+
+        self.max_size = max_size
+        self.schedules = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    #---------------------------------------------------------------
+    # get()
+    #
+    # Return the expanded key for the given key. The key is
+    # expanded and inserted if not already in the cache.
+    #---------------------------------------------------------------
+    def get(self, key):
+        key = tuple(key)
+        schedule = self.schedules.get(key)
+
+        if schedule is not None:
+            self.hits += 1
+            self.schedules.move_to_end(key)
+            return schedule
+
+        self.misses += 1
+        schedule = ExpandedKey(key)
+        self.schedules[key] = schedule
+
+        if len(self.schedules) > self.max_size:
+            self.schedules.popitem(last=False)
+            self.evictions += 1
+
+        return schedule
+
+
+    #---------------------------------------------------------------
+    # clear()
+    #
+    # Drop all cached schedules and reset the counters.
+    #---------------------------------------------------------------
+    def clear(self):
+        self.schedules.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    #---------------------------------------------------------------
+    # stats()
+    #
+    # Return the cache counters as a dict.
+    #---------------------------------------------------------------
+    def stats(self):
+        return {"size": len(self.schedules), "max_size": self.max_size,
+                "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions}
+
+
+    def __len__(self):
+        return len(self.schedules)
+
+
+#-------------------------------------------------------------------
+# The process wide default cache.
+#-------------------------------------------------------------------
+key_cache = KeyScheduleCache()
+
+
+#-------------------------------------------------------------------
+# expand_key()
+#
+# Return the expanded key for the given key using the default
+# cache. The key can be given as a tuple of 32 bit words or as
+# 16, 24 or 32 bytes. If given an already expanded key it is
+# returned as is. Raises ValueError for other byte key lengths.
+#-------------------------------------------------------------------
+def expand_key(key):
+    if isinstance(key, ExpandedKey):
+        return key
+    if isinstance(key, (bytes, bytearray, memoryview)):
+        key = bytes(key)
+        if len(key) not in (16, 24, 32):
+            raise ValueError("Key must be 16, 24 or 32 bytes, got %d." % len(key))
+        key = struct.unpack(">%dI" % (len(key) // 4), key)
+    return key_cache.get(key)
+
+
+#-------------------------------------------------------------------
+# test_key_cache()
+#
+# Test hit, miss and eviction behaviour of the cache.
+# Returns the number of errors found.
+#-------------------------------------------------------------------
+def test_key_cache():
+    errors = 0
+    rng = random.Random(0)
+    keys = [tuple(rng.getrandbits(32) for j in range(4)) for i in range(5)]
+
+    cache = KeyScheduleCache(max_size=3)
+    for k in keys[0 : 3]:
+        cache.get(k)
+
+    # Touch the first key so that the second becomes the oldest.
+    first = cache.get(keys[0])
+    if first.enc_keys != key_expand(keys[0]):
+        print("ERROR: Cached schedule does not match key_expand().")
+        errors += 1
+
+    cache.get(keys[3])
+    if keys[1] in cache.schedules or keys[0] not in cache.schedules:
+        print("ERROR: Wrong schedule evicted.")
+        errors += 1
+
+    cache.get(keys[4])
+    expected = {"size": 3, "max_size": 3, "hits": 1, "misses": 5,
+                "evictions": 2}
+    if cache.stats() != expected:
+        print("ERROR: Unexpected cache counters: %s" % cache.stats())
+        errors += 1
+
+    for length in (0, 15, 20, 33):
+        try:
+            expand_key(bytes(length))
+            print("ERROR: Key of %d bytes not rejected." % length)
+            errors += 1
+        except ValueError:
+            pass
+
+    if errors == 0:
+        print("All key cache tests OK.")
+    else:
+        print("Number of failing key cache tests: %d" % errors)
+
+    return errors
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests the key schedule cache.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the AES key schedule cache")
+    print("==================================")
+    return test_key_cache()
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_key_cache.py
+#=======================================================================
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_key_schedule.py
+# -------------------
+# Silent key expansion shared by the cipher models, the key
+# generation test harnesses and the modes. Supports 128, 192
+# and 256 bit keys and uses a precomputed rcon table.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2014, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+from array import array
+
+from aes_sbox import sbox
+from aes_galois import mul9, mul11, mul13, mul14
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+AES_128_ROUNDS = 10
+AES_192_ROUNDS = 12
+AES_256_ROUNDS = 14
+
+
+# rcon[i] is the round constant for round i. rcon[0] is the
+# value preceding rcon[1] = 0x01 in the sequence.
+rcon = [0x8d, 0x01, 0x02, 0x04, 0x08, 0x10, 0x20, 0x40,
+        0x80, 0x1b, 0x36, 0x6c, 0xd8, 0xab, 0x4d, 0x9a,
+        0x2f, 0x5e, 0xbc, 0x63, 0xc6, 0x97, 0x35, 0x6a,
+        0xd4, 0xb3, 0x7d, 0xfa, 0xef, 0xc5, 0x91, 0x39,
+        0x72, 0xe4, 0xd3, 0xbd, 0x61, 0xc2, 0x9f, 0x25,
+        0x4a, 0x94, 0x33, 0x66, 0xcc, 0x83, 0x1d, 0x3a,
+        0x74, 0xe8, 0xcb, 0x8d, 0x01, 0x02, 0x04, 0x08,
+        0x10, 0x20, 0x40, 0x80, 0x1b, 0x36, 0x6c, 0xd8,
+        0xab, 0x4d, 0x9a, 0x2f, 0x5e, 0xbc, 0x63, 0xc6,
+        0x97, 0x35, 0x6a, 0xd4, 0xb3, 0x7d, 0xfa, 0xef,
+        0xc5, 0x91, 0x39, 0x72, 0xe4, 0xd3, 0xbd, 0x61,
+        0xc2, 0x9f, 0x25, 0x4a, 0x94, 0x33, 0x66, 0xcc,
+        0x83, 0x1d, 0x3a, 0x74, 0xe8, 0xcb, 0x8d, 0x01,
+        0x02, 0x04, 0x08, 0x10, 0x20, 0x40, 0x80, 0x1b,
+        0x36, 0x6c, 0xd8, 0xab, 0x4d, 0x9a, 0x2f, 0x5e,
+        0xbc, 0x63, 0xc6, 0x97, 0x35, 0x6a, 0xd4, 0xb3,
+        0x7d, 0xfa, 0xef, 0xc5, 0x91, 0x39, 0x72, 0xe4,
+        0xd3, 0xbd, 0x61, 0xc2, 0x9f, 0x25, 0x4a, 0x94,
+        0x33, 0x66, 0xcc, 0x83, 0x1d, 0x3a, 0x74, 0xe8,
+        0xcb, 0x8d, 0x01, 0x02, 0x04, 0x08, 0x10, 0x20,
+        0x40, 0x80, 0x1b, 0x36, 0x6c, 0xd8, 0xab, 0x4d,
+        0x9a, 0x2f, 0x5e, 0xbc, 0x63, 0xc6, 0x97, 0x35,
+        0x6a, 0xd4, 0xb3, 0x7d, 0xfa, 0xef, 0xc5, 0x91,
+        0x39, 0x72, 0xe4, 0xd3, 0xbd, 0x61, 0xc2, 0x9f,
+        0x25, 0x4a, 0x94, 0x33, 0x66, 0xcc, 0x83, 0x1d,
+        0x3a, 0x74, 0xe8, 0xcb, 0x8d, 0x01, 0x02, 0x04,
+        0x08, 0x10, 0x20, 0x40, 0x80, 0x1b, 0x36, 0x6c,
+        0xd8, 0xab, 0x4d, 0x9a, 0x2f, 0x5e, 0xbc, 0x63,
+        0xc6, 0x97, 0x35, 0x6a, 0xd4, 0xb3, 0x7d, 0xfa,
+        0xef, 0xc5, 0x91, 0x39, 0x72, 0xe4, 0xd3, 0xbd,
+        0x61, 0xc2, 0x9f, 0x25, 0x4a, 0x94, 0x33, 0x66,
+        0xcc, 0x83, 0x1d, 0x3a, 0x74, 0xe8, 0xcb, 0x8d]
+
+
+#-------------------------------------------------------------------
+# get_num_rounds()
+#
+# Return the number of rounds for a key of the given number of
+# 32 bit words.
+#-------------------------------------------------------------------
+def get_num_rounds(key_words):
+    if key_words == 4:
+        return AES_128_ROUNDS
+    elif key_words == 6:
+        return AES_192_ROUNDS
+    elif key_words == 8:
+        return AES_256_ROUNDS
+    raise ValueError("Key is %d bits, not 128, 192 or 256 bits." % (key_words * 32))
+
+
+#-------------------------------------------------------------------
+# key_expand()
+#
+# Expand the given key of four, six or eight 32 bit words into
+# a flat array of 4 * (rounds + 1) round key words.
+#-------------------------------------------------------------------
+def key_expand(key):
+    nk = len(key)
+    num_words = 4 * (get_num_rounds(nk) + 1)
+    s = sbox
+
+    w = array("I", key)
+    prev = w[nk - 1]
+    for i in range(nk, num_words):
+        if i % nk == 0:
+            prev = ((s[(prev >> 16) & 0xff] << 24) | (s[(prev >> 8) & 0xff] << 16) |
+                    (s[prev & 0xff] << 8) | s[prev >> 24]) ^ (rcon[i // nk] << 24)
+        elif nk == 8 and i % nk == 4:
+            prev = (s[prev >> 24] << 24) | (s[(prev >> 16) & 0xff] << 16) |\
+                   (s[(prev >> 8) & 0xff] << 8) | s[prev & 0xff]
+        prev ^= w[i - nk]
+        w.append(prev)
+
+    return w
+
+
+#-------------------------------------------------------------------
+# inv_mix_word()
+#
+# InvMixColumns on one column held as a 32 bit word.
+#-------------------------------------------------------------------
+def inv_mix_word(w):
+    b0 = w >> 24
+    b1 = (w >> 16) & 0xff
+    b2 = (w >> 8) & 0xff
+    b3 = w & 0xff
+
+    return ((mul14[b0] ^ mul11[b1] ^ mul13[b2] ^ mul9[b3]) << 24) |\
+           ((mul9[b0] ^ mul14[b1] ^ mul11[b2] ^ mul13[b3]) << 16) |\
+           ((mul13[b0] ^ mul9[b1] ^ mul14[b2] ^ mul11[b3]) << 8) |\
+           (mul11[b0] ^ mul13[b1] ^ mul9[b2] ^ mul14[b3])
+
+
+#-------------------------------------------------------------------
+# dec_key_expand()
+#
+# Generate the round keys for the equivalent inverse cipher in
+# FIPS-197 section 5.3.5 from the flat encipher round keys. The
+# keys are stored in the order they are used by the decipher and
+# the inner round keys have been through InvMixColumns, so the
+# decipher rounds have the same structure as the encipher rounds.
+#-------------------------------------------------------------------
+def dec_key_expand(round_keys):
+    num_rounds = len(round_keys) // 4 - 1
+
+    dec_keys = array("I", round_keys[4 * num_rounds : 4 * num_rounds + 4])
+    for i in range(num_rounds - 1, 0, -1):
+        for w in round_keys[4 * i : 4 * i + 4]:
+            dec_keys.append(inv_mix_word(w))
+    dec_keys.extend(round_keys[0 : 4])
+    return dec_keys
+
+
+#-------------------------------------------------------------------
+# key_gen()
+#
+# Expand the given key and return the round keys as a list of
+# four word tuples, the format used by the test harnesses.
+#-------------------------------------------------------------------
+def key_gen(key):
+    w = key_expand(key)
+    return [tuple(w[i : i + 4]) for i in range(0, len(w), 4)]
+
+
+#-------------------------------------------------------------------
+# test_key_schedule()
+#
+# Test the key expansion with the FIPS-197 Appendix A keys by
+# checking the last round key for each key length.
+# Returns the number of failing test cases.
+#-------------------------------------------------------------------
+def test_key_schedule():
+    fips_key128 = (0x2b7e1516, 0x28aed2a6, 0xabf71588, 0x09cf4f3c)
+    fips_exp128 = (0xd014f9a8, 0xc9ee2589, 0xe13f0cc8, 0xb6630ca6)
+
+    fips_key192 = (0x8e73b0f7, 0xda0e6452, 0xc810f32b, 0x809079e5,
+                   0x62f8ead2, 0x522c6b7b)
+    fips_exp192 = (0xe98ba06f, 0x448c773c, 0x8ecc7204, 0x01002202)
+
+    fips_key256 = (0x603deb10, 0x15ca71be, 0x2b73aef0, 0x857d7781,
+                   0x1f352c07, 0x3b6108d7, 0x2d9810a3, 0x0914dff4)
+    fips_exp256 = (0xfe4890d1, 0xe6188d0b, 0x046df344, 0x706c631e)
+
+    tc_errors = 0
+
+    # FIPS-197 MixColumns example column db 13 53 45 -> 8e 4d a1 bc.
+    if inv_mix_word(0x8e4da1bc) != 0xdb135345:
+        print("ERROR: Wrong InvMixColumns of round key word.")
+        tc_errors += 1
+
+    for (key, expected) in ((fips_key128, fips_exp128),
+                            (fips_key192, fips_exp192),
+                            (fips_key256, fips_exp256)):
+        round_keys = key_gen(key)
+        if len(round_keys) != get_num_rounds(len(key)) + 1:
+            print("ERROR: Wrong number of round keys for AES-%d." % (len(key) * 32))
+            tc_errors += 1
+        if round_keys[-1] != expected:
+            print("ERROR: Wrong last round key for AES-%d." % (len(key) * 32))
+            tc_errors += 1
+
+        dec_keys = dec_key_expand(key_expand(key))
+        if tuple(dec_keys[0 : 4]) != expected or tuple(dec_keys[-4:]) != tuple(key[0 : 4]):
+            print("ERROR: Wrong decipher round key order for AES-%d." % (len(key) * 32))
+            tc_errors += 1
+
+    if tc_errors == 0:
+        print("All key schedule tests OK.")
+    else:
+        print("Number of failing key schedule tests: %d" % tc_errors)
+
+    return tc_errors
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests the key schedule using known test vectors.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the shared AES key schedule")
+    print("===================================")
+    return test_key_schedule()
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_key_schedule.py
+#=======================================================================
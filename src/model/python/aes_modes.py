@@ -0,0 +1,641 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_modes.py
+# ------------
+# Block cipher modes ECB, CBC, CFB, OFB and CTR as specified in
+# NIST SP 800-38A on top of the T-table engine. Each mode has an
+# incremental update()/finalize() API and one shot functions.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2014, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+
+import aes_ttable
+import aes_bulk
+from aes_bulk import BLOCK_SIZE, block_struct
+from aes_key_cache import expand_key
+
+
+#-------------------------------------------------------------------
+# xor_bytes()
+#
+# XOR two byte strings of equal length. Done as one big integer
+# operation which is much faster than a loop over the bytes.
+#-------------------------------------------------------------------
+def xor_bytes(a, b):
+    n = len(a)
+    return (int.from_bytes(a, "big") ^ int.from_bytes(b, "big")).to_bytes(n, "big")
+
+
+#-------------------------------------------------------------------
+# check_iv()
+#
+# Check that the given IV or counter block is 16 bytes and
+# return it as a tuple of four words.
+#-------------------------------------------------------------------
+def check_iv(iv):
+    if len(iv) != BLOCK_SIZE:
+        raise ValueError("IV must be %d bytes, got %d." % (BLOCK_SIZE, len(iv)))
+    return block_struct.unpack(bytes(iv))
+
+
+#-------------------------------------------------------------------
+# Mode
+#
+# Base class for the modes. Holds the expanded key, the
+# direction and any buffered input that did not fill a block.
+#-------------------------------------------------------------------
+class Mode(object):
+    def __init__(self, key, encrypt=True):
+        self.ek = expand_key(key)
+        self.encrypt = encrypt
+        self.buffer = b""
+        self.finalized = False
+
+
+    #---------------------------------------------------------------
+    # split_blocks()
+    #
+    # Join buffered input with the given data and return the
+    # part that is a whole number of blocks. The rest is kept
+    # in the buffer.
+    #---------------------------------------------------------------
+    def split_blocks(self, data):
+        if self.finalized:
+            raise ValueError("update() called after finalize().")
+
+        if self.buffer:
+            data = self.buffer + bytes(data)
+        n = len(data) - (len(data) % BLOCK_SIZE)
+        self.buffer = bytes(data[n:])
+        return memoryview(data)[:n]
+
+
+    #---------------------------------------------------------------
+    # finalize()
+    #
+    # End the operation. Block modes do not pad, so any
+    # buffered partial block is an error.
+    #---------------------------------------------------------------
+    def finalize(self):
+        self.finalized = True
+        if self.buffer:
+            raise ValueError("Data is not a multiple of %d bytes." % BLOCK_SIZE)
+        return b""
+
+
+#-------------------------------------------------------------------
+# ECB
+#
+# Electronic Codebook mode.
+#-------------------------------------------------------------------
+class ECB(Mode):
+    def update(self, data):
+        blocks = self.split_blocks(data)
+        out = bytearray(len(blocks))
+        if self.encrypt:
+            aes_bulk.encrypt_blocks_into(self.ek, blocks, out)
+        else:
+            aes_bulk.decrypt_blocks_into(self.ek, blocks, out)
+        return bytes(out)
+
+
+#-------------------------------------------------------------------
+# CBC
+#
+# Cipher Block Chaining mode.
+#-------------------------------------------------------------------
+class CBC(Mode):
+    def __init__(self, key, iv, encrypt=True):
+        Mode.__init__(self, key, encrypt)
+        self.chain = check_iv(iv)
+
+
+    def update(self, data):
+        blocks = self.split_blocks(data)
+        out = bytearray(len(blocks))
+        unpack_from = block_struct.unpack_from
+        pack_into = block_struct.pack_into
+        (c0, c1, c2, c3) = self.chain
+
+        if self.encrypt:
+            rk = self.ek.enc_keys
+            encipher_block = aes_ttable.encipher_block
+            for offset in range(0, len(blocks), BLOCK_SIZE):
+                (p0, p1, p2, p3) = unpack_from(blocks, offset)
+                (c0, c1, c2, c3) = encipher_block(rk, (p0 ^ c0, p1 ^ c1,
+                                                       p2 ^ c2, p3 ^ c3))
+                pack_into(out, offset, c0, c1, c2, c3)
+
+        else:
+            rk = self.ek.dec_keys
+            decipher_block = aes_ttable.decipher_block
+            for offset in range(0, len(blocks), BLOCK_SIZE):
+                block = unpack_from(blocks, offset)
+                (d0, d1, d2, d3) = decipher_block(rk, block)
+                pack_into(out, offset, d0 ^ c0, d1 ^ c1, d2 ^ c2, d3 ^ c3)
+                (c0, c1, c2, c3) = block
+
+        self.chain = (c0, c1, c2, c3)
+        return bytes(out)
+
+
+#-------------------------------------------------------------------
+# KeystreamMode
+#
+# Base class for OFB and CTR where the keystream does not
+# depend on the data. Unused keystream from a partial block
+# is kept for the next update() call.
+#-------------------------------------------------------------------
+class KeystreamMode(Mode):
+    def __init__(self, key, encrypt=True):
+        Mode.__init__(self, key, encrypt)
+        self.keystream = b""
+
+
+    def update(self, data):
+        if self.finalized:
+            raise ValueError("update() called after finalize().")
+
+        n = len(data)
+        used = min(n, len(self.keystream))
+        nblocks = (n - used + BLOCK_SIZE - 1) // BLOCK_SIZE
+
+        keystream = self.keystream[:used] + self.gen_keystream(nblocks)
+        self.keystream = self.keystream[used:] + keystream[n:]
+        return xor_bytes(data, keystream[:n])
+
+
+    def finalize(self):
+        self.finalized = True
+        self.keystream = b""
+        return b""
+
+
+#-------------------------------------------------------------------
+# OFB
+#
+# Output Feedback mode. Encipher and decipher are the same
+# operation.
+#-------------------------------------------------------------------
+class OFB(KeystreamMode):
+    def __init__(self, key, iv, encrypt=True):
+        KeystreamMode.__init__(self, key, encrypt)
+        self.register = check_iv(iv)
+
+
+    def gen_keystream(self, nblocks):
+        out = bytearray(nblocks * BLOCK_SIZE)
+        rk = self.ek.enc_keys
+        encipher_block = aes_ttable.encipher_block
+        pack_into = block_struct.pack_into
+        register = self.register
+
+        for offset in range(0, nblocks * BLOCK_SIZE, BLOCK_SIZE):
+            register = encipher_block(rk, register)
+            pack_into(out, offset, *register)
+
+        self.register = register
+        return bytes(out)
+
+
+#-------------------------------------------------------------------
+# CTR
+#
+# Counter mode. The whole 128 bit counter block is incremented
+# for each block, wrapping modulo 2^128. Encipher and decipher
+# are the same operation.
+#-------------------------------------------------------------------
+class CTR(KeystreamMode):
+    def __init__(self, key, iv, encrypt=True):
+        KeystreamMode.__init__(self, key, encrypt)
+        check_iv(iv)
+        self.counter = int.from_bytes(iv, "big")
+
+
+    def gen_keystream(self, nblocks):
+        out = bytearray(nblocks * BLOCK_SIZE)
+        rk = self.ek.enc_keys
+        encipher_block = aes_ttable.encipher_block
+        pack_into = block_struct.pack_into
+        ctr = self.counter
+
+        for offset in range(0, nblocks * BLOCK_SIZE, BLOCK_SIZE):
+            pack_into(out, offset, *encipher_block(rk, (ctr >> 96,
+                                                        (ctr >> 64) & 0xffffffff,
+                                                        (ctr >> 32) & 0xffffffff,
+                                                        ctr & 0xffffffff)))
+            ctr = (ctr + 1) & ((1 << 128) - 1)
+
+        self.counter = ctr
+        return bytes(out)
+
+
+#-------------------------------------------------------------------
+# CFB
+#
+# 128 bit Cipher Feedback mode. The keystream for a block is
+# the encipher of the previous ciphertext block, so partial
+# blocks are tracked byte by byte until the block is full.
+#-------------------------------------------------------------------
+class CFB(Mode):
+    def __init__(self, key, iv, encrypt=True):
+        Mode.__init__(self, key, encrypt)
+        self.register = check_iv(iv)
+        self.keystream = b""
+        self.feedback = bytearray()
+
+
+    def update(self, data):
+        if self.finalized:
+            raise ValueError("update() called after finalize().")
+
+        mv = memoryview(data).cast("B")
+        out = bytearray(len(mv))
+        pos = 0
+
+        # Finish any partial block from the previous call.
+        if self.keystream:
+            n = min(len(mv), len(self.keystream))
+            out[0 : n] = xor_bytes(mv[0 : n], self.keystream[0 : n])
+            self.feedback += out[0 : n] if self.encrypt else mv[0 : n]
+            self.keystream = self.keystream[n:]
+            pos = n
+            if not self.keystream:
+                self.register = block_struct.unpack(bytes(self.feedback))
+                self.feedback = bytearray()
+
+        # Whole blocks.
+        rk = self.ek.enc_keys
+        encipher_block = aes_ttable.encipher_block
+        unpack_from = block_struct.unpack_from
+        pack_into = block_struct.pack_into
+        (r0, r1, r2, r3) = self.register
+        end = pos + ((len(mv) - pos) // BLOCK_SIZE) * BLOCK_SIZE
+
+        for offset in range(pos, end, BLOCK_SIZE):
+            (k0, k1, k2, k3) = encipher_block(rk, (r0, r1, r2, r3))
+            (d0, d1, d2, d3) = unpack_from(mv, offset)
+            (o0, o1, o2, o3) = (d0 ^ k0, d1 ^ k1, d2 ^ k2, d3 ^ k3)
+            pack_into(out, offset, o0, o1, o2, o3)
+            if self.encrypt:
+                (r0, r1, r2, r3) = (o0, o1, o2, o3)
+            else:
+                (r0, r1, r2, r3) = (d0, d1, d2, d3)
+
+        self.register = (r0, r1, r2, r3)
+
+        # Start of a new partial block.
+        if end < len(mv):
+            n = len(mv) - end
+            keystream = block_struct.pack(*encipher_block(rk, self.register))
+            out[end:] = xor_bytes(mv[end:], keystream[0 : n])
+            self.feedback = bytearray(out[end:] if self.encrypt else mv[end:])
+            self.keystream = keystream[n:]
+
+        return bytes(out)
+
+
+    def finalize(self):
+        self.finalized = True
+        return b""
+
+
+#-------------------------------------------------------------------
+# One shot functions for all modes.
+#-------------------------------------------------------------------
+def run_mode(mode, data):
+    return mode.update(data) + mode.finalize()
+
+
+def ecb_encrypt(key, data):
+    return run_mode(ECB(key, True), data)
+
+
+def ecb_decrypt(key, data):
+    return run_mode(ECB(key, False), data)
+
+
+def cbc_encrypt(key, iv, data):
+    return run_mode(CBC(key, iv, True), data)
+
+
+def cbc_decrypt(key, iv, data):
+    return run_mode(CBC(key, iv, False), data)
+
+
+def cfb_encrypt(key, iv, data):
+    return run_mode(CFB(key, iv, True), data)
+
+
+def cfb_decrypt(key, iv, data):
+    return run_mode(CFB(key, iv, False), data)
+
+
+def ofb_encrypt(key, iv, data):
+    return run_mode(OFB(key, iv, True), data)
+
+
+def ofb_decrypt(key, iv, data):
+    return run_mode(OFB(key, iv, False), data)
+
+
+def ctr_encrypt(key, iv, data):
+    return run_mode(CTR(key, iv, True), data)
+
+
+def ctr_decrypt(key, iv, data):
+    return run_mode(CTR(key, iv, False), data)
+
+
+#-------------------------------------------------------------------
+# Mode classes by name.
+#-------------------------------------------------------------------
+MODES = {"ecb" : ECB,
+         "cbc" : CBC,
+         "cfb" : CFB,
+         "ofb" : OFB,
+         "ctr" : CTR}
+
+
+#-------------------------------------------------------------------
+# new_mode()
+#
+# Create the mode object for the given mode name. ECB takes
+# no IV.
+#-------------------------------------------------------------------
+def new_mode(name, key, iv, encrypt):
+    if name not in MODES:
+        raise ValueError("Unknown mode %s." % name)
+
+    if name == "ecb":
+        return ECB(key, encrypt)
+
+    if iv is None:
+        raise ValueError("Mode %s requires an IV." % name)
+    return MODES[name](key, iv, encrypt)
+
+
+#-------------------------------------------------------------------
+# stream_crypt()
+#
+# Generator running the chunks through the given mode object
+# and yielding the output as it is produced. Partial blocks
+# are carried between chunks by the mode object. A chunk is
+# only pulled from the input when the previous output has been
+# consumed, so at most one chunk plus one block is held.
+#-------------------------------------------------------------------
+def stream_crypt(mode, chunks):
+    for chunk in chunks:
+        result = mode.update(chunk)
+        if result:
+            yield result
+
+    result = mode.finalize()
+    if result:
+        yield result
+
+
+#-------------------------------------------------------------------
+# stream_encrypt()
+#
+# Encipher an iterable of arbitrarily sized chunks, yielding
+# the ciphertext chunks.
+#-------------------------------------------------------------------
+def stream_encrypt(key, iv, chunks, mode="ctr"):
+    return stream_crypt(new_mode(mode, key, iv, True), chunks)
+
+
+#-------------------------------------------------------------------
+# stream_decrypt()
+#
+# Decipher an iterable of arbitrarily sized chunks, yielding
+# the plaintext chunks.
+#-------------------------------------------------------------------
+def stream_decrypt(key, iv, chunks, mode="ctr"):
+    return stream_crypt(new_mode(mode, key, iv, False), chunks)
+
+
+#-------------------------------------------------------------------
+# test_modes()
+#
+# Test all modes with the NIST SP 800-38A vectors, both one shot
+# and with the data split into uneven chunks.
+# Returns the number of failing test cases.
+#-------------------------------------------------------------------
+def test_modes():
+    nist_aes128_key = bytes.fromhex("2b7e151628aed2a6abf7158809cf4f3c")
+    nist_aes256_key = bytes.fromhex("603deb1015ca71be2b73aef0857d7781"
+                                    "1f352c073b6108d72d9810a30914dff4")
+    nist_iv = bytes.fromhex("000102030405060708090a0b0c0d0e0f")
+    nist_ctr = bytes.fromhex("f0f1f2f3f4f5f6f7f8f9fafbfcfdfeff")
+
+    nist_plaintext = bytes.fromhex("6bc1bee22e409f96e93d7e117393172a"
+                                   "ae2d8a571e03ac9c9eb76fac45af8e51"
+                                   "30c81c46a35ce411e5fbc1191a0a52ef"
+                                   "f69f2445df4f9b17ad2b417be66c3710")
+
+    tests = (
+        ("ECB-AES128", ECB, nist_aes128_key, None,
+         "3ad77bb40d7a3660a89ecaf32466ef97f5d3d58503b9699de785895a96fdbaaf"
+         "43b1cd7f598ece23881b00e3ed0306887b0c785e27e8ad3f8223207104725dd4"),
+        ("CBC-AES128", CBC, nist_aes128_key, nist_iv,
+         "7649abac8119b246cee98e9b12e9197d5086cb9b507219ee95db113a917678b2"
+         "73bed6b8e3c1743b7116e69e222295163ff1caa1681fac09120eca307586e1a7"),
+        ("CBC-AES256", CBC, nist_aes256_key, nist_iv,
+         "f58c4c04d6e5f1ba779eabfb5f7bfbd69cfc4e967edb808d679f777bc6702c7d"
+         "39f23369a9d9bacfa530e26304231461b2eb05e2c39be9fcda6c19078c6a9d1b"),
+        ("CFB128-AES128", CFB, nist_aes128_key, nist_iv,
+         "3b3fd92eb72dad20333449f8e83cfb4ac8a64537a0b3a93fcde3cdad9f1ce58b"
+         "26751f67a3cbb140b1808cf187a4f4dfc04b05357c5d1c0eeac4c66f9ff7f2e6"),
+        ("OFB-AES128", OFB, nist_aes128_key, nist_iv,
+         "3b3fd92eb72dad20333449f8e83cfb4a7789508d16918f03f53c52dac54ed825"
+         "9740051e9c5fecf64344f7a82260edcc304c6528f659c77866a510d9c1d6ae5e"),
+        ("CTR-AES128", CTR, nist_aes128_key, nist_ctr,
+         "874d6191b620e3261bef6864990db6ce9806f66b7970fdff8617187bb9fffdff"
+         "5ae4df3edbd5d35e5b4f09020db03eab1e031dda2fbe03d1792170a0f3009cee"),
+        ("CTR-AES256", CTR, nist_aes256_key, nist_ctr,
+         "601ec313775789a5b7a7f504bbf3d228f443e3ca4d62b59aca84e990cacaf5c5"
+         "2b0930daa23de94ce87017ba2d84988ddfc9c58db67aada613c2dd08457941a6"),
+    )
+
+    tc_errors = 0
+    tc = 0
+
+    for (title, mode, key, iv, expected) in tests:
+        expected = bytes.fromhex(expected)
+        if iv is None:
+            enc = mode(key, True)
+            dec = mode(key, False)
+        else:
+            enc = mode(key, iv, True)
+            dec = mode(key, iv, False)
+
+        if run_mode(enc, nist_plaintext) != expected:
+            print("ERROR: %s encipher failed." % title)
+            tc_errors += 1
+        if run_mode(dec, expected) != nist_plaintext:
+            print("ERROR: %s decipher failed." % title)
+            tc_errors += 1
+        tc += 2
+
+        # Incremental updates with chunks that do not align to blocks.
+        if iv is None:
+            enc = mode(key, True)
+        else:
+            enc = mode(key, iv, True)
+        result = b""
+        pos = 0
+        for size in (1, 15, 17, 3, 28):
+            result += enc.update(nist_plaintext[pos : pos + size])
+            pos += size
+        result += enc.finalize()
+        if result != expected:
+            print("ERROR: %s incremental encipher failed." % title)
+            tc_errors += 1
+        tc += 1
+
+    # Partial final block for the stream modes.
+    data = os.urandom(100)
+    for (title, enc, dec) in (("CFB", cfb_encrypt, cfb_decrypt),
+                              ("OFB", ofb_encrypt, ofb_decrypt),
+                              ("CTR", ctr_encrypt, ctr_decrypt)):
+        if dec(nist_aes128_key, nist_iv, enc(nist_aes128_key, nist_iv, data)) != data:
+            print("ERROR: %s round trip with partial block failed." % title)
+            tc_errors += 1
+        tc += 1
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+    return tc_errors
+
+
+#-------------------------------------------------------------------
+# test_stream()
+#
+# Test the streaming API for all modes with random chunk sizes
+# and check that input is only pulled as output is consumed.
+# Returns the number of failing test cases.
+#-------------------------------------------------------------------
+def test_stream():
+    key = os.urandom(16)
+    iv = os.urandom(16)
+    data = os.urandom(10000)
+    sizes = [0, 1, 15, 16, 17, 33, 100, 1000, 4096]
+
+    tc_errors = 0
+    tc = 0
+
+    for name in sorted(MODES):
+        chunks = []
+        pos = 0
+        i = 0
+        while pos < len(data):
+            chunks.append(data[pos : pos + sizes[i % len(sizes)]])
+            pos += sizes[i % len(sizes)]
+            i += 1
+
+        expected = run_mode(new_mode(name, key, iv, True), data)
+        result = b"".join(stream_encrypt(key, iv, iter(chunks), mode=name))
+        if result != expected:
+            print("ERROR: %s stream encipher failed." % name)
+            tc_errors += 1
+
+        pieces = [expected[i : i + 700] for i in range(0, len(expected), 700)]
+        if b"".join(stream_decrypt(key, iv, pieces, mode=name)) != data:
+            print("ERROR: %s stream decipher failed." % name)
+            tc_errors += 1
+        tc += 2
+
+    # The generator must not read ahead of its consumer.
+    pulled = []
+    def source():
+        for i in range(100):
+            pulled.append(i)
+            yield data[0 : 100]
+
+    stream = stream_encrypt(key, iv, source())
+    next(stream)
+    next(stream)
+    if len(pulled) != 2:
+        print("ERROR: Stream pulled %d chunks for two outputs." % len(pulled))
+        tc_errors += 1
+    tc += 1
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+    return tc_errors
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests the modes using known test vectors and
+# tests the streaming API.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the AES cipher modes")
+    print("============================")
+    errors = test_modes()
+    print("")
+    print("Testing the streaming API")
+    print("=========================")
+    return errors + test_stream()
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_modes.py
+#=======================================================================
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_numpy.py
+# ------------
+# Batched AES engine using NumPy. Holds N blocks as an (N, 16)
+# uint8 array and performs each round step on the whole batch.
+# SubBytes is a table lookup by fancy indexing, ShiftRows a fixed
+# column permutation and MixColumns uses a vectorized xtime.
+# Requires NumPy.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2014, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import io
+import time
+import contextlib
+
+import numpy as np
+
+import aes
+import aes_ttable
+from aes_sbox import sbox, inv_sbox
+from aes_key_cache import expand_key
+from aes_key_schedule import rcon
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+BLOCK_SIZE = 16
+
+# Max number of blocks processed per batch by the bytes API.
+# Limits the size of the temporary arrays.
+BATCH_BLOCKS = 65536
+
+SBOX = np.array(sbox, dtype=np.uint8)
+INV_SBOX = np.array(inv_sbox, dtype=np.uint8)
+
+# Byte i of a block is row i % 4 of column i // 4. ShiftRows
+# rotates row r left by r columns.
+SHIFT_ROWS = np.array([4 * ((c + r) % 4) + r for c in range(4) for r in range(4)])
+INV_SHIFT_ROWS = np.array([4 * ((c - r) % 4) + r for c in range(4) for r in range(4)])
+
+
+#-------------------------------------------------------------------
+# xtime()
+#
+# Galois Multiplication by two of all bytes in the given array.
+#-------------------------------------------------------------------
+def xtime(a):
+    return (a << 1) ^ ((a >> 7) * np.uint8(0x1b))
+
+
+#-------------------------------------------------------------------
+# mixcolumns()
+#
+# MixColumns on all blocks in the (N, 16) state.
+#-------------------------------------------------------------------
+def mixcolumns(state):
+    s = state.reshape(-1, 4, 4)
+    a0 = s[:, :, 0]
+    a1 = s[:, :, 1]
+    a2 = s[:, :, 2]
+    a3 = s[:, :, 3]
+    t = a0 ^ a1 ^ a2 ^ a3
+
+    res = np.empty_like(s)
+    res[:, :, 0] = a0 ^ t ^ xtime(a0 ^ a1)
+    res[:, :, 1] = a1 ^ t ^ xtime(a1 ^ a2)
+    res[:, :, 2] = a2 ^ t ^ xtime(a2 ^ a3)
+    res[:, :, 3] = a3 ^ t ^ xtime(a3 ^ a0)
+    return res.reshape(-1, 16)
+
+
+#-------------------------------------------------------------------
+# inv_mixcolumns()
+#
+# Inverse MixColumns on all blocks in the (N, 16) state. Done
+# as a preprocessing step followed by MixColumns.
+#-------------------------------------------------------------------
+def inv_mixcolumns(state):
+    s = state.reshape(-1, 4, 4).copy()
+    u = xtime(xtime(s[:, :, 0] ^ s[:, :, 2]))
+    v = xtime(xtime(s[:, :, 1] ^ s[:, :, 3]))
+    s[:, :, 0] ^= u
+    s[:, :, 1] ^= v
+    s[:, :, 2] ^= u
+    s[:, :, 3] ^= v
+    return mixcolumns(s.reshape(-1, 16))
+
+
+#-------------------------------------------------------------------
+# get_round_keys()
+#
+# Return the round keys for the given key as an (Nr + 1, 16)
+# byte array, cached with the expanded key.
+#-------------------------------------------------------------------
+def get_round_keys(key):
+    ek = expand_key(key)
+    round_keys = ek.derived.get("numpy")
+    if round_keys is None:
+        words = np.array(ek.enc_keys, dtype=">u4")
+        round_keys = words.view(np.uint8).reshape(ek.num_rounds + 1, 16)
+        ek.derived["numpy"] = round_keys
+    return round_keys
+
+
+#-------------------------------------------------------------------
+# key_expand_array()
+#
+# Expand all keys in the given (N, 16) or (N, 32) uint8 array.
+# Returns the round keys as an (Nr + 1, N, 16) array, which can
+# be used with the array functions in place of the round keys
+# of a single key.
+#-------------------------------------------------------------------
+def key_expand_array(keys):
+    num_keys = len(keys)
+    nk = keys.shape[1] // 4
+    num_rounds = nk + 6
+
+    w = np.empty((4 * (num_rounds + 1), num_keys, 4), dtype=np.uint8)
+    w[0 : nk] = keys.reshape(num_keys, nk, 4).transpose(1, 0, 2)
+    for i in range(nk, 4 * (num_rounds + 1)):
+        t = w[i - 1]
+        if i % nk == 0:
+            t = SBOX[t[:, [1, 2, 3, 0]]]
+            t[:, 0] ^= rcon[i // nk]
+        elif nk > 6 and i % nk == 4:
+            t = SBOX[t]
+        w[i] = w[i - nk] ^ t
+
+    return w.reshape(num_rounds + 1, 4, num_keys, 4).transpose(0, 2, 1, 3).reshape(
+        num_rounds + 1, num_keys, 16)
+
+
+#-------------------------------------------------------------------
+# encipher_array()
+#
+# Encipher all blocks in the given (N, 16) uint8 array with the
+# given round keys.
+#-------------------------------------------------------------------
+def encipher_array(rk, blocks):
+    num_rounds = len(rk) - 1
+
+    state = blocks ^ rk[0]
+    for i in range(1, num_rounds):
+        state = mixcolumns(SBOX[state][:, SHIFT_ROWS]) ^ rk[i]
+    return SBOX[state][:, SHIFT_ROWS] ^ rk[num_rounds]
+
+
+#-------------------------------------------------------------------
+# decipher_array()
+#
+# Decipher all blocks in the given (N, 16) uint8 array with the
+# given round keys.
+#-------------------------------------------------------------------
+def decipher_array(rk, blocks):
+    num_rounds = len(rk) - 1
+
+    state = INV_SBOX[(blocks ^ rk[num_rounds])[:, INV_SHIFT_ROWS]]
+    for i in range(num_rounds - 1, 0, -1):
+        state = INV_SBOX[inv_mixcolumns(state ^ rk[i])[:, INV_SHIFT_ROWS]]
+    return state ^ rk[0]
+
+
+#-------------------------------------------------------------------
+# encrypt_array()
+#
+# Encipher all blocks in the given (N, 16) uint8 array.
+#-------------------------------------------------------------------
+def encrypt_array(key, blocks):
+    return encipher_array(get_round_keys(key), blocks)
+
+
+#-------------------------------------------------------------------
+# decrypt_array()
+#
+# Decipher all blocks in the given (N, 16) uint8 array.
+#-------------------------------------------------------------------
+def decrypt_array(key, blocks):
+    return decipher_array(get_round_keys(key), blocks)
+
+
+#-------------------------------------------------------------------
+# process_bytes()
+#
+# Run the given array function over the data in batches and
+# return the result as bytes. The data can be any buffer, its
+# length is taken in bytes.
+#-------------------------------------------------------------------
+def process_bytes(function, key, data):
+    data = memoryview(data).cast("B")
+    if len(data) % BLOCK_SIZE:
+        raise ValueError("Data length %d is not a multiple of %d bytes." %
+                         (len(data), BLOCK_SIZE))
+
+    blocks = np.frombuffer(data, dtype=np.uint8).reshape(-1, BLOCK_SIZE)
+    out = np.empty_like(blocks)
+    for i in range(0, len(blocks), BATCH_BLOCKS):
+        out[i : i + BATCH_BLOCKS] = function(key, blocks[i : i + BATCH_BLOCKS])
+    return out.tobytes()
+
+
+#-------------------------------------------------------------------
+# encrypt_blocks()
+#
+# Encipher the given data, a whole number of 16 byte blocks.
+# Same interface as aes_bulk.encrypt_blocks().
+#-------------------------------------------------------------------
+def encrypt_blocks(key, data):
+    return process_bytes(encrypt_array, key, data)
+
+
+#-------------------------------------------------------------------
+# decrypt_blocks()
+#
+# Decipher the given data, a whole number of 16 byte blocks.
+# Same interface as aes_bulk.decrypt_blocks().
+#-------------------------------------------------------------------
+def decrypt_blocks(key, data):
+    return process_bytes(decrypt_array, key, data)
+
+
+#-------------------------------------------------------------------
+# words_to_array()
+#
+# Convert a sequence of four word blocks to an (N, 16) array.
+#-------------------------------------------------------------------
+def words_to_array(blocks):
+    return np.array(blocks, dtype=">u4").reshape(-1, 4).view(np.uint8)
+
+
+#-------------------------------------------------------------------
+# array_to_words()
+#
+# Convert an (N, 16) array to a list of four word tuples.
+#-------------------------------------------------------------------
+def array_to_words(blocks):
+    return [tuple(int(w) for w in b) for b in
+            np.ascontiguousarray(blocks).view(">u4").reshape(-1, 4)]
+
+
+#-------------------------------------------------------------------
+# test_numpy()
+#
+# Test the NumPy engine against the tracing model on the NIST
+# vectors and against the T-table engine on random keys and
+# blocks of all key lengths. Returns the number of failing
+# test cases.
+#-------------------------------------------------------------------
+def test_numpy():
+    nist_keys = ((0x2b7e1516, 0x28aed2a6, 0xabf71588, 0x09cf4f3c),
+                 (0x8e73b0f7, 0xda0e6452, 0xc810f32b, 0x809079e5,
+                  0x62f8ead2, 0x522c6b7b),
+                 (0x603deb10, 0x15ca71be, 0x2b73aef0, 0x857d7781,
+                  0x1f352c07, 0x3b6108d7, 0x2d9810a3, 0x0914dff4))
+
+    nist_plaintext = ((0x6bc1bee2, 0x2e409f96, 0xe93d7e11, 0x7393172a),
+                      (0xae2d8a57, 0x1e03ac9c, 0x9eb76fac, 0x45af8e51),
+                      (0x30c81c46, 0xa35ce411, 0xe5fbc119, 0x1a0a52ef),
+                      (0xf69f2445, 0xdf4f9b17, 0xad2b417b, 0xe66c3710))
+
+    tc_errors = 0
+    tc = 0
+
+    for key in nist_keys:
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = [aes.aes_encipher_block(key, b) for b in nist_plaintext]
+
+        result = encrypt_array(key, words_to_array(nist_plaintext))
+        if array_to_words(result) != expected:
+            print("ERROR: AES-%d encipher of NIST vectors failed." % (len(key) * 32))
+            tc_errors += 1
+        if array_to_words(decrypt_array(key, result)) != list(nist_plaintext):
+            print("ERROR: AES-%d decipher of NIST vectors failed." % (len(key) * 32))
+            tc_errors += 1
+        tc += 2
+
+    for key_len in (16, 24, 32):
+        keys = os.urandom(100 * key_len)
+        rk = key_expand_array(np.frombuffer(keys, dtype=np.uint8).reshape(-1, key_len))
+        for i in range(100):
+            if not np.array_equal(rk[:, i], get_round_keys(keys[i * key_len : (i + 1) * key_len])):
+                print("ERROR: AES-%d key expansion of key %d failed." % (key_len * 8, i))
+                tc_errors += 1
+                break
+        tc += 1
+
+        key = os.urandom(key_len)
+        data = os.urandom(1000 * BLOCK_SIZE)
+        ek = expand_key(key)
+        blocks = array_to_words(np.frombuffer(data, dtype=np.uint8).reshape(-1, 16))
+
+        expected = [aes_ttable.encipher_block(ek.enc_keys, b) for b in blocks]
+        ciphertext = encrypt_blocks(key, data)
+        result = array_to_words(np.frombuffer(ciphertext, dtype=np.uint8).reshape(-1, 16))
+        if result != expected:
+            print("ERROR: AES-%d encipher of random blocks failed." % (key_len * 8))
+            tc_errors += 1
+
+        expected = [aes_ttable.decipher_block(ek.dec_keys, b) for b in blocks]
+        result = array_to_words(np.frombuffer(decrypt_blocks(key, data),
+                                              dtype=np.uint8).reshape(-1, 16))
+        if result != expected:
+            print("ERROR: AES-%d decipher of random blocks failed." % (key_len * 8))
+            tc_errors += 1
+        tc += 2
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+    return tc_errors
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests the NumPy engine and prints its throughput.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the NumPy AES engine")
+    print("============================")
+    errors = test_numpy()
+
+    key = os.urandom(16)
+    data = os.urandom(1 << 22)
+    start = time.perf_counter()
+    encrypt_blocks(key, data)
+    elapsed = time.perf_counter() - start
+    print("Encipher of %d bytes: %.3f s, %.3f MB/s" %
+          (len(data), elapsed, len(data) / elapsed / 1e6))
+    return errors
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_numpy.py
+#=======================================================================
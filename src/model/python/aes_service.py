@@ -0,0 +1,806 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_service.py
+# --------------
+# Local asyncio AES service on a Unix socket. Requests sharing a key
+# are batched into one job for a process pool and per request
+# latency histograms are kept.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2014, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import json
+import time
+import struct
+import asyncio
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import aes_modes
+from aes_key_cache import expand_key
+
+# The NumPy engine is used for batched ECB if available,
+# otherwise the T-table bulk engine.
+try:
+    import aes_numpy as block_engine
+except ImportError:
+    import aes_bulk as block_engine
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+# Time in seconds the batcher waits for more requests after
+# the first one arrives, and max number of requests per batch.
+BATCH_WINDOW = 0.002
+MAX_BATCH = 256
+
+# Upper bounds in microseconds of the latency histogram buckets.
+LATENCY_BUCKETS = [1 << i for i in range(4, 25)]
+
+frame_len = struct.Struct(">I")
+
+
+#-------------------------------------------------------------------
+# LatencyHistogram
+#
+# Histogram of request latencies using power of two buckets.
+#-------------------------------------------------------------------
+class LatencyHistogram(object):
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+    #---------------------------------------------------------------
+    # add()
+    #
+    # Add a latency given in seconds.
+    #---------------------------------------------------------------
+    def add(self, seconds):
+        us = seconds * 1e6
+        i = 0
+        while i < len(LATENCY_BUCKETS) and us > LATENCY_BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += us
+        self.max = max(self.max, us)
+
+
+    #---------------------------------------------------------------
+    # snapshot()
+    #
+    # Return the histogram as a dict that can be sent as JSON.
+    # Empty buckets are left out.
+    #---------------------------------------------------------------
+    def snapshot(self):
+        buckets = {}
+        for (i, n) in enumerate(self.counts):
+            if n:
+                if i < len(LATENCY_BUCKETS):
+                    buckets["<=%dus" % LATENCY_BUCKETS[i]] = n
+                else:
+                    buckets[">%dus" % LATENCY_BUCKETS[-1]] = n
+
+        return {"count" : self.count,
+                "mean_us" : self.total / self.count if self.count else 0.0,
+                "max_us" : self.max,
+                "buckets" : buckets}
+
+
+#-------------------------------------------------------------------
+# read_frame()
+#
+# Read one frame from the stream. A frame is a length prefixed
+# JSON header followed by header["length"] bytes of data.
+# Returns None at end of stream. Raises ValueError if the header
+# is not a JSON object with a valid length, after which the
+# stream can not be read further.
+#-------------------------------------------------------------------
+async def read_frame(reader):
+    try:
+        (n,) = frame_len.unpack(await reader.readexactly(frame_len.size))
+        encoded = await reader.readexactly(n)
+    except asyncio.IncompleteReadError:
+        return None
+
+    try:
+        header = json.loads(encoded)
+    except ValueError as error:
+        raise ValueError("Header is not valid JSON: %s" % error)
+    if not isinstance(header, dict):
+        raise ValueError("Header is not a JSON object.")
+
+    length = header.get("length", 0)
+    if not isinstance(length, int) or isinstance(length, bool) or length < 0:
+        raise ValueError("Header length must be a non negative integer.")
+
+    try:
+        data = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return None
+    return (header, data)
+
+
+#-------------------------------------------------------------------
+# write_frame()
+#-------------------------------------------------------------------
+def write_frame(writer, header, data=b""):
+    header = dict(header, length=len(data))
+    encoded = json.dumps(header).encode("ascii")
+    writer.write(frame_len.pack(len(encoded)) + encoded + data)
+
+
+#-------------------------------------------------------------------
+# split_results()
+#
+# Split the output of a joined engine call into the results of
+# the given requests.
+#-------------------------------------------------------------------
+def split_results(results, items, indices, data):
+    pos = 0
+    for i in indices:
+        n = len(items[i][3])
+        results[i] = (True, data[pos : pos + n])
+        pos += n
+
+
+#-------------------------------------------------------------------
+# gen_counters()
+#
+# Return the counter blocks for nblocks blocks starting at the
+# given 16 byte counter block, as in aes_modes.CTR.
+#-------------------------------------------------------------------
+def gen_counters(iv, nblocks):
+    ctr = int.from_bytes(iv, "big")
+    mask = (1 << 128) - 1
+    return b"".join([((ctr + i) & mask).to_bytes(16, "big") for i in range(nblocks)])
+
+
+#-------------------------------------------------------------------
+# run_batch()
+#
+# Worker job. Process a batch of requests sharing one key. The
+# key is expanded once for the batch and the block engine is
+# called on the joined blocks of many requests:
+#
+# - ECB requests in the same direction and CBC decrypt requests
+#   are each done with one call.
+# - The keystreams of all CTR requests are done with one call
+#   over all their counter blocks.
+# - OFB keystreams depend on the previous block, so the OFB
+#   requests are run in lockstep with one call per block
+#   position over all requests.
+#
+# CBC encrypt and CFB have the same chain as OFB but through
+# the data, and are still done one request at a time, as are
+# requests with a bad IV or length so that they get the error
+# from aes_modes. Returns a list of (True, result) or (False,
+# error message).
+#-------------------------------------------------------------------
+def run_batch(key, items):
+    results = [None] * len(items)
+    try:
+        ek = expand_key(key)
+    except (TypeError, ValueError) as error:
+        return [(False, str(error))] * len(items)
+
+    def select(ops, mode, whole_blocks=False, iv=True):
+        return [i for (i, (op, m, v, data)) in enumerate(items)
+                if op in ops and m == mode and
+                (not iv or (isinstance(v, bytes) and len(v) == 16)) and
+                (not whole_blocks or len(data) % 16 == 0)]
+
+    both = ("encrypt", "decrypt")
+    for op in both:
+        ecb = select((op,), "ecb", whole_blocks=True, iv=False)
+        if ecb:
+            data = b"".join([items[i][3] for i in ecb])
+            if op == "encrypt":
+                data = block_engine.encrypt_blocks(ek, data)
+            else:
+                data = block_engine.decrypt_blocks(ek, data)
+            split_results(results, items, ecb, data)
+
+    cbc = select(("decrypt",), "cbc", whole_blocks=True)
+    if cbc:
+        data = block_engine.decrypt_blocks(ek, b"".join([items[i][3] for i in cbc]))
+        chain = b"".join([(items[i][2] + items[i][3])[0 : len(items[i][3])] for i in cbc])
+        split_results(results, items, cbc, aes_modes.xor_bytes(data, chain))
+
+    ctr = select(both, "ctr")
+    if ctr:
+        counters = b"".join([gen_counters(items[i][2], -(-len(items[i][3]) // 16))
+                             for i in ctr])
+        keystream = block_engine.encrypt_blocks(ek, counters)
+        pos = 0
+        for i in ctr:
+            data = items[i][3]
+            results[i] = (True, aes_modes.xor_bytes(data, keystream[pos : pos + len(data)]))
+            pos += -(-len(data) // 16) * 16
+
+    ofb = select(both, "ofb")
+    if ofb:
+        registers = [items[i][2] for i in ofb]
+        keystreams = [[] for i in ofb]
+        active = list(range(len(ofb)))
+        block = 0
+        while active:
+            active = [j for j in active if len(items[ofb[j]][3]) > 16 * block]
+            if not active:
+                break
+            out = block_engine.encrypt_blocks(ek, b"".join([registers[j] for j in active]))
+            for (n, j) in enumerate(active):
+                registers[j] = out[16 * n : 16 * n + 16]
+                keystreams[j].append(registers[j])
+            block += 1
+        for (j, i) in enumerate(ofb):
+            data = items[i][3]
+            results[i] = (True, aes_modes.xor_bytes(data, b"".join(keystreams[j])[0 : len(data)]))
+
+    for (i, (op, mode, iv, data)) in enumerate(items):
+        if results[i] is None:
+            try:
+                if op not in both:
+                    raise ValueError("Unknown operation %s." % op)
+                mode = aes_modes.new_mode(mode, ek, iv, op == "encrypt")
+                results[i] = (True, aes_modes.run_mode(mode, data))
+            except (TypeError, ValueError) as error:
+                results[i] = (False, str(error))
+
+    return results
+
+
+#-------------------------------------------------------------------
+# parse_request()
+#
+# Check the fields of a crypt request header and return the
+# (op, mode, iv, data) item for the batcher. Raises KeyError,
+# TypeError or ValueError for a bad request.
+#-------------------------------------------------------------------
+def parse_request(header, data):
+    op = header.get("op")
+    mode = header.get("mode", "ctr")
+    key = header["key"]
+    iv = header.get("iv")
+
+    if op not in ("encrypt", "decrypt"):
+        raise ValueError("Unknown operation %r." % (op,))
+    if not isinstance(mode, str):
+        raise TypeError("mode must be a string.")
+    if not isinstance(key, str):
+        raise TypeError("key must be a hex string.")
+    if iv is not None and not isinstance(iv, str):
+        raise TypeError("iv must be a hex string.")
+
+    bytes.fromhex(key)
+    return (op, mode, bytes.fromhex(iv) if iv else None, data)
+
+
+#-------------------------------------------------------------------
+# AESService
+#
+# Local AES service on a Unix socket. Requests from all clients
+# go into one queue. The batcher groups queued requests by key
+# and runs each group as one job in a process pool, so the
+# event loop only does the I/O.
+#-------------------------------------------------------------------
+class AESService(object):
+    def __init__(self, path, workers=None, batch_window=BATCH_WINDOW,
+                 max_batch=MAX_BATCH):
+        self.path = path
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.executor = None
+        self.server = None
+        self.queue = None
+        self.batcher_task = None
+        self.clients = set()
+        self.histograms = {}
+        self.batches = 0
+        self.requests = 0
+
+
+    #---------------------------------------------------------------
+    # start()
+    #
+    # The workers are started from a fork server so they do not
+    # inherit the sockets of the service.
+    #---------------------------------------------------------------
+    async def start(self):
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+        else:
+            context = multiprocessing.get_context("spawn")
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        self.queue = asyncio.Queue()
+        self.batcher_task = asyncio.get_running_loop().create_task(self.batcher())
+        self.server = await asyncio.start_unix_server(self.handle_client, path=self.path)
+
+
+    #---------------------------------------------------------------
+    # close()
+    #
+    # Stop accepting connections and give connected clients a
+    # second to finish before they are cancelled.
+    #---------------------------------------------------------------
+    async def close(self):
+        self.server.close()
+        if self.clients:
+            (done, pending) = await asyncio.wait(self.clients, timeout=1.0)
+            for task in pending:
+                task.cancel()
+        await self.server.wait_closed()
+        self.batcher_task.cancel()
+        try:
+            await self.batcher_task
+        except asyncio.CancelledError:
+            pass
+        self.executor.shutdown()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+    #---------------------------------------------------------------
+    # serve_forever()
+    #---------------------------------------------------------------
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.close()
+
+
+    #---------------------------------------------------------------
+    # stats()
+    #
+    # Return the request counters and the latency histogram per
+    # operation and mode.
+    #---------------------------------------------------------------
+    def stats(self):
+        return {"requests" : self.requests,
+                "batches" : self.batches,
+                "latency" : dict((name, h.snapshot()) for (name, h)
+                                 in sorted(self.histograms.items()))}
+
+
+    #---------------------------------------------------------------
+    # submit()
+    #
+    # Queue a request for the batcher and wait for its result.
+    #---------------------------------------------------------------
+    async def submit(self, key, item):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((key, item, future))
+        return await future
+
+
+    #---------------------------------------------------------------
+    # batcher()
+    #
+    # Collect requests for up to batch_window seconds after the
+    # first one, group them by key and start one pool job per
+    # group.
+    #---------------------------------------------------------------
+    async def batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(pending) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            groups = {}
+            for (key, item, future) in pending:
+                groups.setdefault(key, []).append((item, future))
+
+            for (key, group) in groups.items():
+                self.batches += 1
+                loop.create_task(self.run_group(key, group))
+
+
+    #---------------------------------------------------------------
+    # run_group()
+    #
+    # Run a group of requests sharing a key in the process pool
+    # and hand the results to the waiting requests.
+    #---------------------------------------------------------------
+    async def run_group(self, key, group):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, run_batch, key,
+                                                 [item for (item, future) in group])
+        except Exception as error:
+            results = [(False, "Worker failed: %s" % error)] * len(group)
+
+        for ((item, future), result) in zip(group, results):
+            if not future.done():
+                future.set_result(result)
+
+
+    #---------------------------------------------------------------
+    # handle_request()
+    #
+    # Process one request and write the response. Responses
+    # carry the request id since they can be sent out of order.
+    #---------------------------------------------------------------
+    async def handle_request(self, header, data, writer):
+        start = time.perf_counter()
+        response = {"id" : header.get("id")}
+        result = b""
+
+        op = header.get("op")
+        if op == "stats":
+            response["status"] = "ok"
+            response["stats"] = self.stats()
+        else:
+            try:
+                item = parse_request(header, data)
+                name = "%s-%s" % item[0 : 2]
+            except (KeyError, TypeError, ValueError) as error:
+                (ok, result) = (False, "Bad request: %s" % error)
+                name = "bad-request"
+            else:
+                (ok, result) = await self.submit(bytes.fromhex(header["key"]), item)
+
+            if ok:
+                response["status"] = "ok"
+            else:
+                response["status"] = "error"
+                response["error"] = result
+                result = b""
+
+            self.requests += 1
+            self.histograms.setdefault(name, LatencyHistogram()).add(
+                time.perf_counter() - start)
+
+        write_frame(writer, response, result)
+        await writer.drain()
+
+
+    #---------------------------------------------------------------
+    # handle_client()
+    #
+    # Read requests from one connection. Each request runs as
+    # its own task so a client can pipeline requests.
+    #---------------------------------------------------------------
+    async def handle_client(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        client = asyncio.current_task()
+        self.clients.add(client)
+        tasks = set()
+        try:
+            while True:
+                try:
+                    frame = await read_frame(reader)
+                except ValueError as error:
+                    write_frame(writer, {"id" : None, "status" : "error",
+                                         "error" : "Bad frame: %s" % error})
+                    await writer.drain()
+                    break
+                if frame is None:
+                    break
+                task = loop.create_task(self.handle_request(frame[0], frame[1], writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            self.clients.discard(client)
+            writer.close()
+
+
+#-------------------------------------------------------------------
+# AESClient
+#
+# Client for the service. Requests can be issued concurrently
+# on one connection, responses are matched on the request id.
+#-------------------------------------------------------------------
+class AESClient(object):
+    def __init__(self, path):
+        self.path = path
+        self.reader = None
+        self.writer = None
+        self.reader_task = None
+        self.waiting = {}
+        self.next_id = 0
+
+
+    async def connect(self):
+        (self.reader, self.writer) = await asyncio.open_unix_connection(self.path)
+        self.reader_task = asyncio.get_running_loop().create_task(self.read_responses())
+
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.reader_task.cancel()
+        try:
+            await self.reader_task
+        except asyncio.CancelledError:
+            pass
+
+
+    async def read_responses(self):
+        while True:
+            try:
+                frame = await read_frame(self.reader)
+            except ValueError:
+                frame = None
+            if frame is None:
+                break
+            future = self.waiting.pop(frame[0].get("id"), None)
+            if future is not None and not future.done():
+                future.set_result(frame)
+
+        for future in self.waiting.values():
+            future.set_exception(ConnectionError("Connection closed."))
+
+
+    #---------------------------------------------------------------
+    # request()
+    #
+    # Send a request and return the response header and data.
+    #---------------------------------------------------------------
+    async def request(self, header, data=b""):
+        self.next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[self.next_id] = future
+        write_frame(self.writer, dict(header, id=self.next_id), data)
+        await self.writer.drain()
+        return await future
+
+
+    #---------------------------------------------------------------
+    # crypt()
+    #
+    # Encipher or decipher the data. Raises ValueError if the
+    # service reports an error.
+    #---------------------------------------------------------------
+    async def crypt(self, op, mode, key, iv, data):
+        header = {"op" : op, "mode" : mode, "key" : bytes(key).hex()}
+        if iv is not None:
+            header["iv"] = bytes(iv).hex()
+        (response, result) = await self.request(header, data)
+        if response["status"] != "ok":
+            raise ValueError(response["error"])
+        return result
+
+
+    async def stats(self):
+        (response, result) = await self.request({"op" : "stats"})
+        return response["stats"]
+
+
+#-------------------------------------------------------------------
+# run_test_clients()
+#
+# Issue concurrent requests with a few keys and all modes and
+# check the results against the local modes. Returns the
+# number of errors and the service statistics.
+#-------------------------------------------------------------------
+async def run_test_clients(path):
+    keys = [os.urandom(16), os.urandom(24), os.urandom(32)]
+    iv = os.urandom(16)
+    tc_errors = 0
+
+    clients = [AESClient(path) for i in range(4)]
+    for client in clients:
+        await client.connect()
+
+    jobs = []
+    expected = []
+    for i in range(120):
+        key = keys[i % len(keys)]
+        mode = sorted(aes_modes.MODES)[i % len(aes_modes.MODES)]
+        data = os.urandom(16 * (1 + i % 20) - (i % 7 if mode in ("cfb", "ctr", "ofb") else 0))
+        op = "encrypt" if i % 2 else "decrypt"
+        jobs.append(clients[i % len(clients)].crypt(op, mode, key, iv, data))
+        expected.append(aes_modes.run_mode(aes_modes.new_mode(mode, key, iv, op == "encrypt"),
+                                           data))
+
+    results = await asyncio.gather(*jobs)
+    for (i, (result, expect)) in enumerate(zip(results, expected)):
+        if result != expect:
+            print("ERROR: Request %d returned wrong result." % i)
+            tc_errors += 1
+
+    try:
+        await clients[0].crypt("encrypt", "cbc", keys[0], iv, b"short")
+        print("ERROR: Partial block with CBC not rejected.")
+        tc_errors += 1
+    except ValueError:
+        pass
+
+    tc_errors += await run_bad_requests(path)
+
+    stats = await clients[0].stats()
+    for client in clients:
+        await client.close()
+
+    return (tc_errors, stats)
+
+
+#-------------------------------------------------------------------
+# run_bad_requests()
+#
+# Send malformed requests and frames on raw connections and
+# check that each gets an error response. Returns the number
+# of errors.
+#-------------------------------------------------------------------
+async def run_bad_requests(path):
+    tc_errors = 0
+    key = os.urandom(16).hex()
+
+    bad_headers = [{"op" : "encrypt", "mode" : "ctr", "key" : 1234},
+                   {"op" : "encrypt", "mode" : "ctr", "key" : key, "iv" : ["00"]},
+                   {"op" : "encrypt", "mode" : 7, "key" : key},
+                   {"op" : ["encrypt"], "key" : key},
+                   {"op" : "encrypt", "mode" : "ctr"}]
+    (reader, writer) = await asyncio.open_unix_connection(path)
+    for (i, header) in enumerate(bad_headers):
+        write_frame(writer, dict(header, id=i))
+        await writer.drain()
+        (response, data) = await asyncio.wait_for(read_frame(reader), 5.0)
+        if response.get("id") != i or response.get("status") != "error":
+            print("ERROR: Bad request %d not answered with an error." % i)
+            tc_errors += 1
+    writer.close()
+
+    bad_frames = [frame_len.pack(5) + b"{abc}",
+                  frame_len.pack(2) + b"[]",
+                  frame_len.pack(17) + b'{"length": "ab"}\n',
+                  frame_len.pack(15) + b'{"length": -16}']
+    for (i, frame) in enumerate(bad_frames):
+        (reader, writer) = await asyncio.open_unix_connection(path)
+        writer.write(frame)
+        await writer.drain()
+        frame = await asyncio.wait_for(read_frame(reader), 5.0)
+        if frame is None or frame[0].get("status") != "error":
+            print("ERROR: Bad frame %d not answered with an error." % i)
+            tc_errors += 1
+        writer.close()
+
+    return tc_errors
+
+
+#-------------------------------------------------------------------
+# test_run_batch()
+#
+# Run a batch with an empty request of each mode and direction
+# before a non-empty one directly in this process and compare
+# with the local modes. Returns the number of errors.
+#-------------------------------------------------------------------
+def test_run_batch():
+    key = os.urandom(16)
+    items = []
+    for mode in sorted(aes_modes.MODES):
+        for op in ("decrypt", "encrypt"):
+            items.append((op, mode, os.urandom(16), b""))
+            items.append((op, mode, os.urandom(16), os.urandom(64)))
+
+    tc_errors = 0
+    for ((op, mode, iv, data), result) in zip(items, run_batch(key, items)):
+        expected = aes_modes.run_mode(aes_modes.new_mode(mode, key, iv, op == "encrypt"), data)
+        if result != (True, expected):
+            print("ERROR: Batch %s %s of %d bytes failed." % (mode, op, len(data)))
+            tc_errors += 1
+    return tc_errors
+
+
+#-------------------------------------------------------------------
+# test_service()
+#
+# Start the service on a temporary socket and run the test
+# clients against it. Returns the number of failing test cases.
+#-------------------------------------------------------------------
+def test_service():
+    async def run(path):
+        service = AESService(path, workers=2)
+        await service.start()
+        try:
+            return await run_test_clients(path)
+        finally:
+            await service.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        (tc_errors, stats) = asyncio.run(run(os.path.join(tmp, "aes.sock")))
+
+    tc_errors += test_run_batch()
+
+    print("Requests: %d in %d batches" % (stats["requests"], stats["batches"]))
+    for (name, histogram) in stats["latency"].items():
+        print("%-12s count %4d, mean %8.1f us, max %8.1f us" %
+              (name, histogram["count"], histogram["mean_us"], histogram["max_us"]))
+
+    if stats["batches"] >= stats["requests"]:
+        print("ERROR: Requests were not batched.")
+        tc_errors += 1
+
+    if (tc_errors == 0):
+        print("All service tests OK.")
+    else:
+        print("Number of failing service tests: %d" % tc_errors)
+
+    return tc_errors
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# With a socket path as argument runs the service, without
+# runs the tests.
+#-------------------------------------------------------------------
+def main():
+    if len(sys.argv) > 1:
+        try:
+            asyncio.run(AESService(sys.argv[1]).serve_forever())
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    print("Testing the AES service")
+    print("=======================")
+    return test_service()
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_service.py
+#=======================================================================
@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_state.py
+# ------------
+# In place cipher state backed by a preallocated array. The round
+# operations update the state instead of allocating a new block
+# for each step.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2014, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import time
+from array import array
+
+import aes_fast
+import aes_bulk
+import aes_ttable
+from aes import mixw, inv_mixw
+from aes_sbox import sbox, inv_sbox
+from aes_ttable import Te0, Te1, Te2, Te3, Td0, Td1, Td2, Td3
+from aes_bulk import BLOCK_SIZE, block_struct, check_length
+from aes_key_cache import expand_key
+
+
+#-------------------------------------------------------------------
+# AESState
+#
+# The cipher state as four 32 bit words in a preallocated
+# array. The round operations update the array in place instead
+# of returning a new block. encipher() and decipher() do each
+# round in one method using the T-tables. The single round steps
+# are kept for reference.
+#-------------------------------------------------------------------
+class AESState(object):
+    __slots__ = ("w",)
+
+    def __init__(self, block=(0, 0, 0, 0)):
+        self.w = array("I", block)
+
+
+    #---------------------------------------------------------------
+    # load() and store()
+    #
+    # Set or get the state as a tuple of four words.
+    #---------------------------------------------------------------
+    def load(self, block):
+        w = self.w
+        (w[0], w[1], w[2], w[3]) = block
+
+
+    def store(self):
+        return tuple(self.w)
+
+
+    #---------------------------------------------------------------
+    # load_from() and store_into()
+    #
+    # Set the state from or write the state into a buffer at
+    # the given byte offset.
+    #---------------------------------------------------------------
+    def load_from(self, buf, offset):
+        w = self.w
+        (w[0], w[1], w[2], w[3]) = block_struct.unpack_from(buf, offset)
+
+
+    def store_into(self, buf, offset):
+        w = self.w
+        block_struct.pack_into(buf, offset, w[0], w[1], w[2], w[3])
+
+
+    #---------------------------------------------------------------
+    # add_round_key()
+    #
+    # XOR in the round key for the given round from the flat
+    # round keys.
+    #---------------------------------------------------------------
+    def add_round_key(self, round_keys, round):
+        w = self.w
+        k = 4 * round
+        w[0] ^= round_keys[k]
+        w[1] ^= round_keys[k + 1]
+        w[2] ^= round_keys[k + 2]
+        w[3] ^= round_keys[k + 3]
+
+
+    #---------------------------------------------------------------
+    # sub_bytes()
+    #---------------------------------------------------------------
+    def sub_bytes(self):
+        w = self.w
+        for i in range(4):
+            x = w[i]
+            w[i] = (sbox[x >> 24] << 24) | (sbox[(x >> 16) & 0xff] << 16) |\
+                   (sbox[(x >> 8) & 0xff] << 8) | sbox[x & 0xff]
+
+
+    #---------------------------------------------------------------
+    # inv_sub_bytes()
+    #---------------------------------------------------------------
+    def inv_sub_bytes(self):
+        w = self.w
+        for i in range(4):
+            x = w[i]
+            w[i] = (inv_sbox[x >> 24] << 24) | (inv_sbox[(x >> 16) & 0xff] << 16) |\
+                   (inv_sbox[(x >> 8) & 0xff] << 8) | inv_sbox[x & 0xff]
+
+
+    #---------------------------------------------------------------
+    # shift_rows()
+    #
+    # Row r of the state is rotated left by r columns. Row 0 is
+    # the most significant byte of each word.
+    #---------------------------------------------------------------
+    def shift_rows(self):
+        w = self.w
+        (w0, w1, w2, w3) = w
+        w[0] = (w0 & 0xff000000) | (w1 & 0x00ff0000) | (w2 & 0x0000ff00) | (w3 & 0xff)
+        w[1] = (w1 & 0xff000000) | (w2 & 0x00ff0000) | (w3 & 0x0000ff00) | (w0 & 0xff)
+        w[2] = (w2 & 0xff000000) | (w3 & 0x00ff0000) | (w0 & 0x0000ff00) | (w1 & 0xff)
+        w[3] = (w3 & 0xff000000) | (w0 & 0x00ff0000) | (w1 & 0x0000ff00) | (w2 & 0xff)
+
+
+    #---------------------------------------------------------------
+    # inv_shift_rows()
+    #---------------------------------------------------------------
+    def inv_shift_rows(self):
+        w = self.w
+        (w0, w1, w2, w3) = w
+        w[0] = (w0 & 0xff000000) | (w3 & 0x00ff0000) | (w2 & 0x0000ff00) | (w1 & 0xff)
+        w[1] = (w1 & 0xff000000) | (w0 & 0x00ff0000) | (w3 & 0x0000ff00) | (w2 & 0xff)
+        w[2] = (w2 & 0xff000000) | (w1 & 0x00ff0000) | (w0 & 0x0000ff00) | (w3 & 0xff)
+        w[3] = (w3 & 0xff000000) | (w2 & 0x00ff0000) | (w1 & 0x0000ff00) | (w0 & 0xff)
+
+
+    #---------------------------------------------------------------
+    # mix_columns()
+    #---------------------------------------------------------------
+    def mix_columns(self):
+        w = self.w
+        w[0] = mixw(w[0])
+        w[1] = mixw(w[1])
+        w[2] = mixw(w[2])
+        w[3] = mixw(w[3])
+
+
+    #---------------------------------------------------------------
+    # inv_mix_columns()
+    #---------------------------------------------------------------
+    def inv_mix_columns(self):
+        w = self.w
+        w[0] = inv_mixw(w[0])
+        w[1] = inv_mixw(w[1])
+        w[2] = inv_mixw(w[2])
+        w[3] = inv_mixw(w[3])
+
+
+    #---------------------------------------------------------------
+    # enc_round()
+    #
+    # One full encipher round with the round key at index k.
+    # SubBytes, ShiftRows and MixColumns are done with the
+    # T-tables on local copies of the words, and the state is
+    # written back once.
+    #---------------------------------------------------------------
+    def enc_round(self, round_keys, k):
+        w = self.w
+        (s0, s1, s2, s3) = w
+        w[0] = Te0[s0 >> 24] ^ Te1[(s1 >> 16) & 0xff] ^\
+               Te2[(s2 >> 8) & 0xff] ^ Te3[s3 & 0xff] ^ round_keys[k]
+        w[1] = Te0[s1 >> 24] ^ Te1[(s2 >> 16) & 0xff] ^\
+               Te2[(s3 >> 8) & 0xff] ^ Te3[s0 & 0xff] ^ round_keys[k + 1]
+        w[2] = Te0[s2 >> 24] ^ Te1[(s3 >> 16) & 0xff] ^\
+               Te2[(s0 >> 8) & 0xff] ^ Te3[s1 & 0xff] ^ round_keys[k + 2]
+        w[3] = Te0[s3 >> 24] ^ Te1[(s0 >> 16) & 0xff] ^\
+               Te2[(s1 >> 8) & 0xff] ^ Te3[s2 & 0xff] ^ round_keys[k + 3]
+
+
+    #---------------------------------------------------------------
+    # enc_final_round()
+    #
+    # The last encipher round, without MixColumns.
+    #---------------------------------------------------------------
+    def enc_final_round(self, round_keys, k):
+        w = self.w
+        (s0, s1, s2, s3) = w
+        w[0] = ((sbox[s0 >> 24] << 24) | (sbox[(s1 >> 16) & 0xff] << 16) |
+                (sbox[(s2 >> 8) & 0xff] << 8) | sbox[s3 & 0xff]) ^ round_keys[k]
+        w[1] = ((sbox[s1 >> 24] << 24) | (sbox[(s2 >> 16) & 0xff] << 16) |
+                (sbox[(s3 >> 8) & 0xff] << 8) | sbox[s0 & 0xff]) ^ round_keys[k + 1]
+        w[2] = ((sbox[s2 >> 24] << 24) | (sbox[(s3 >> 16) & 0xff] << 16) |
+                (sbox[(s0 >> 8) & 0xff] << 8) | sbox[s1 & 0xff]) ^ round_keys[k + 2]
+        w[3] = ((sbox[s3 >> 24] << 24) | (sbox[(s0 >> 16) & 0xff] << 16) |
+                (sbox[(s1 >> 8) & 0xff] << 8) | sbox[s2 & 0xff]) ^ round_keys[k + 3]
+
+
+    #---------------------------------------------------------------
+    # dec_round()
+    #
+    # One full decipher round with the equivalent inverse cipher
+    # round key at index k of the dec_keys.
+    #---------------------------------------------------------------
+    def dec_round(self, dec_keys, k):
+        w = self.w
+        (s0, s1, s2, s3) = w
+        w[0] = Td0[s0 >> 24] ^ Td1[(s3 >> 16) & 0xff] ^\
+               Td2[(s2 >> 8) & 0xff] ^ Td3[s1 & 0xff] ^ dec_keys[k]
+        w[1] = Td0[s1 >> 24] ^ Td1[(s0 >> 16) & 0xff] ^\
+               Td2[(s3 >> 8) & 0xff] ^ Td3[s2 & 0xff] ^ dec_keys[k + 1]
+        w[2] = Td0[s2 >> 24] ^ Td1[(s1 >> 16) & 0xff] ^\
+               Td2[(s0 >> 8) & 0xff] ^ Td3[s3 & 0xff] ^ dec_keys[k + 2]
+        w[3] = Td0[s3 >> 24] ^ Td1[(s2 >> 16) & 0xff] ^\
+               Td2[(s1 >> 8) & 0xff] ^ Td3[s0 & 0xff] ^ dec_keys[k + 3]
+
+
+    #---------------------------------------------------------------
+    # dec_final_round()
+    #
+    # The last decipher round, without InvMixColumns.
+    #---------------------------------------------------------------
+    def dec_final_round(self, dec_keys, k):
+        w = self.w
+        (s0, s1, s2, s3) = w
+        w[0] = ((inv_sbox[s0 >> 24] << 24) | (inv_sbox[(s3 >> 16) & 0xff] << 16) |
+                (inv_sbox[(s2 >> 8) & 0xff] << 8) | inv_sbox[s1 & 0xff]) ^ dec_keys[k]
+        w[1] = ((inv_sbox[s1 >> 24] << 24) | (inv_sbox[(s0 >> 16) & 0xff] << 16) |
+                (inv_sbox[(s3 >> 8) & 0xff] << 8) | inv_sbox[s2 & 0xff]) ^ dec_keys[k + 1]
+        w[2] = ((inv_sbox[s2 >> 24] << 24) | (inv_sbox[(s1 >> 16) & 0xff] << 16) |
+                (inv_sbox[(s0 >> 8) & 0xff] << 8) | inv_sbox[s3 & 0xff]) ^ dec_keys[k + 2]
+        w[3] = ((inv_sbox[s3 >> 24] << 24) | (inv_sbox[(s2 >> 16) & 0xff] << 16) |
+                (inv_sbox[(s1 >> 8) & 0xff] << 8) | inv_sbox[s0 & 0xff]) ^ dec_keys[k + 3]
+
+
+    #---------------------------------------------------------------
+    # encipher_steps()
+    #
+    # Encipher the state one round step at a time. Much slower
+    # than encipher(), used as a reference in the test and the
+    # benchmark.
+    #---------------------------------------------------------------
+    def encipher_steps(self, round_keys):
+        num_rounds = len(round_keys) // 4 - 1
+
+        self.add_round_key(round_keys, 0)
+        for i in range(1, num_rounds):
+            self.sub_bytes()
+            self.shift_rows()
+            self.mix_columns()
+            self.add_round_key(round_keys, i)
+
+        self.sub_bytes()
+        self.shift_rows()
+        self.add_round_key(round_keys, num_rounds)
+
+
+    #---------------------------------------------------------------
+    # decipher_steps()
+    #
+    # Decipher the state one round step at a time using the
+    # flat encipher round keys.
+    #---------------------------------------------------------------
+    def decipher_steps(self, round_keys):
+        num_rounds = len(round_keys) // 4 - 1
+
+        self.add_round_key(round_keys, num_rounds)
+        self.inv_shift_rows()
+        self.inv_sub_bytes()
+        for i in range(num_rounds - 1, 0, -1):
+            self.add_round_key(round_keys, i)
+            self.inv_mix_columns()
+            self.inv_shift_rows()
+            self.inv_sub_bytes()
+
+        self.add_round_key(round_keys, 0)
+
+
+    #---------------------------------------------------------------
+    # encipher()
+    #
+    # Encipher the state in place using the flat round keys,
+    # one fused round method call per round.
+    #---------------------------------------------------------------
+    def encipher(self, round_keys):
+        num_rounds = len(round_keys) // 4 - 1
+        enc_round = self.enc_round
+
+        self.add_round_key(round_keys, 0)
+        for k in range(4, 4 * num_rounds, 4):
+            enc_round(round_keys, k)
+        self.enc_final_round(round_keys, 4 * num_rounds)
+
+
+    #---------------------------------------------------------------
+    # decipher()
+    #
+    # Decipher the state in place using the dec_keys of an
+    # expanded key, one fused round method call per round.
+    #---------------------------------------------------------------
+    def decipher(self, dec_keys):
+        num_rounds = len(dec_keys) // 4 - 1
+        dec_round = self.dec_round
+
+        self.add_round_key(dec_keys, 0)
+        for k in range(4, 4 * num_rounds, 4):
+            dec_round(dec_keys, k)
+        self.dec_final_round(dec_keys, 4 * num_rounds)
+
+
+#-------------------------------------------------------------------
+# aes_encipher_block()
+#
+# Drop in replacement for the tracing model using a temporary
+# state. Use an AESState directly to avoid the allocations.
+#-------------------------------------------------------------------
+def aes_encipher_block(key, block):
+    state = AESState(block)
+    state.encipher(expand_key(key).enc_keys)
+    return state.store()
+
+
+#-------------------------------------------------------------------
+# aes_decipher_block()
+#-------------------------------------------------------------------
+def aes_decipher_block(key, block):
+    state = AESState(block)
+    state.decipher(expand_key(key).dec_keys)
+    return state.store()
+
+
+#-------------------------------------------------------------------
+# encrypt_blocks_into()
+#
+# Encipher all blocks in data into out using one state for
+# all blocks.
+#-------------------------------------------------------------------
+def encrypt_blocks_into(key, data, out):
+    mv = check_length(data)
+    rk = expand_key(key).enc_keys
+    state = AESState()
+
+    for offset in range(0, len(mv), BLOCK_SIZE):
+        state.load_from(mv, offset)
+        state.encipher(rk)
+        state.store_into(out, offset)
+
+
+#-------------------------------------------------------------------
+# decrypt_blocks_into()
+#-------------------------------------------------------------------
+def decrypt_blocks_into(key, data, out):
+    mv = check_length(data)
+    rk = expand_key(key).dec_keys
+    state = AESState()
+
+    for offset in range(0, len(mv), BLOCK_SIZE):
+        state.load_from(mv, offset)
+        state.decipher(rk)
+        state.store_into(out, offset)
+
+
+#-------------------------------------------------------------------
+# test_state()
+#
+# Test the in place state against the T-table engine for
+# random keys and blocks of all key lengths. Returns the number
+# of failing test cases.
+#-------------------------------------------------------------------
+def test_state():
+    nist_key = (0x2b7e1516, 0x28aed2a6, 0xabf71588, 0x09cf4f3c)
+    nist_plaintext = (0x6bc1bee2, 0x2e409f96, 0xe93d7e11, 0x7393172a)
+    nist_expected = (0x3ad77bb4, 0x0d7a3660, 0xa89ecaf3, 0x2466ef97)
+
+    tc_errors = 0
+    tc = 0
+
+    if aes_encipher_block(nist_key, nist_plaintext) != nist_expected:
+        print("ERROR: Encipher of NIST vector failed.")
+        tc_errors += 1
+    if aes_decipher_block(nist_key, nist_expected) != nist_plaintext:
+        print("ERROR: Decipher of NIST vector failed.")
+        tc_errors += 1
+    tc += 2
+
+    for key_len in (16, 24, 32):
+        ek = expand_key(os.urandom(key_len))
+        block = block_struct.unpack(os.urandom(BLOCK_SIZE))
+        fused = AESState(block)
+        steps = AESState(block)
+        fused.encipher(ek.enc_keys)
+        steps.encipher_steps(ek.enc_keys)
+        if fused.store() != steps.store():
+            print("ERROR: AES-%d fused rounds do not match the round steps." % (key_len * 8))
+            tc_errors += 1
+        steps.decipher_steps(ek.enc_keys)
+        if steps.store() != block:
+            print("ERROR: AES-%d decipher with the round steps failed." % (key_len * 8))
+            tc_errors += 1
+        tc += 2
+
+        key = os.urandom(key_len)
+        data = os.urandom(100 * BLOCK_SIZE)
+        out = bytearray(len(data))
+
+        encrypt_blocks_into(key, data, out)
+        ek = expand_key(key)
+        expected = bytearray(len(data))
+        for offset in range(0, len(data), BLOCK_SIZE):
+            block = block_struct.unpack_from(data, offset)
+            block_struct.pack_into(expected, offset,
+                                   *aes_ttable.encipher_block(ek.enc_keys, block))
+        if out != expected:
+            print("ERROR: AES-%d encipher of random blocks failed." % (key_len * 8))
+            tc_errors += 1
+
+        decrypt_blocks_into(key, bytes(out), out)
+        if out != data:
+            print("ERROR: AES-%d decipher of random blocks failed." % (key_len * 8))
+            tc_errors += 1
+        tc += 2
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+    return tc_errors
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests the in place state and prints its
+# throughput next to the round step version and the other
+# scalar engines.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the in place AES state")
+    print("==============================")
+    errors = test_state()
+
+    print("")
+    print("Encipher of 64 KB, compared to the other scalar engines:")
+    key = os.urandom(16)
+    data = os.urandom(1 << 16)
+    out = bytearray(len(data))
+    rk = expand_key(key).enc_keys
+
+    def state_steps():
+        state = AESState()
+        for offset in range(0, len(data), BLOCK_SIZE):
+            state.load_from(data, offset)
+            state.encipher_steps(rk)
+            state.store_into(out, offset)
+
+    def scalar_blocks():
+        for offset in range(0, len(data), BLOCK_SIZE):
+            block_struct.pack_into(out, offset, *aes_fast.encipher_block(
+                rk, block_struct.unpack_from(data, offset)))
+
+    for (name, function) in (("state, round steps", state_steps),
+                             ("state, fused rounds", lambda: encrypt_blocks_into(key, data, out)),
+                             ("aes_fast", scalar_blocks),
+                             ("aes_ttable", lambda: aes_bulk.encrypt_blocks_into(key, data, out))):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        print("%-20s %.3f s, %.3f MB/s" % (name, elapsed, len(data) / elapsed / 1e6))
+    return errors
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_state.py
+#=======================================================================
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_ttable.py
+# -------------
+# T-table implementation of the AES cipher. SubBytes, ShiftRows
+# and MixColumns are merged into four 256 entry tables of 32 bit
+# words so that each round is 16 lookups and XORs. Decipher uses
+# the Td-tables together with InvMixColumns transformed round keys.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2014, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import io
+import random
+import contextlib
+
+import aes
+from aes_key_cache import expand_key
+from aes import sbox, inv_sbox
+from aes_galois import mul2, mul3, mul9, mul11, mul13, mul14
+
+
+#-------------------------------------------------------------------
+# rorx()
+#
+# Rotate the given 32 bit word x bits right.
+#-------------------------------------------------------------------
+def rorx(w, x):
+    return ((w >> x) | (w << (32 - x))) & 0xffffffff
+
+
+#-------------------------------------------------------------------
+# gen_te()
+#
+# Generate the four encipher T-tables. Te0[x] is the MixColumns
+# column for the S-box output of x in row 0. Te1..Te3 are the
+# same column rotated one, two and three bytes right.
+#-------------------------------------------------------------------
+def gen_te():
+    te0 = []
+    for x in range(256):
+        s = sbox[x]
+        te0.append((mul2[s] << 24) | (s << 16) | (s << 8) | mul3[s])
+
+    te1 = [rorx(w, 8) for w in te0]
+    te2 = [rorx(w, 16) for w in te0]
+    te3 = [rorx(w, 24) for w in te0]
+    return (te0, te1, te2, te3)
+
+
+#-------------------------------------------------------------------
+# gen_td()
+#
+# Generate the four decipher T-tables. Td0[x] is the inverse
+# MixColumns column for the inverse S-box output of x in row 0.
+#-------------------------------------------------------------------
+def gen_td():
+    td0 = []
+    for x in range(256):
+        s = inv_sbox[x]
+        td0.append((mul14[s] << 24) | (mul9[s] << 16) | (mul13[s] << 8) | mul11[s])
+
+    td1 = [rorx(w, 8) for w in td0]
+    td2 = [rorx(w, 16) for w in td0]
+    td3 = [rorx(w, 24) for w in td0]
+    return (td0, td1, td2, td3)
+
+
+#-------------------------------------------------------------------
+# Tables. Built once when the module is imported.
+#-------------------------------------------------------------------
+(Te0, Te1, Te2, Te3) = gen_te()
+(Td0, Td1, Td2, Td3) = gen_td()
+
+
+#-------------------------------------------------------------------
+# dec_key_gen()
+#
+# Generate the decipher round keys from the given flat encipher
+# round keys. The keys are stored in the order they are used
+# and the inner round keys have been through InvMixColumns so
+# that the rounds can be done with the Td-tables. Same result as
+# the dec_keys cached with the expanded key, which is what the
+# decipher functions use. Kept as an independent cross check.
+#-------------------------------------------------------------------
+def dec_key_gen(round_keys):
+    num_rounds = len(round_keys) // 4 - 1
+
+    dec_keys = list(round_keys[4 * num_rounds : 4 * num_rounds + 4])
+    for i in range(num_rounds - 1, 0, -1):
+        for w in round_keys[4 * i : 4 * i + 4]:
+            dec_keys.append(Td0[sbox[w >> 24]] ^ Td1[sbox[(w >> 16) & 0xff]] ^
+                            Td2[sbox[(w >> 8) & 0xff]] ^ Td3[sbox[w & 0xff]])
+    dec_keys.extend(round_keys[0 : 4])
+    return dec_keys
+
+
+#-------------------------------------------------------------------
+# encipher_block()
+#
+# Encipher the given block using the given flat round keys.
+# Each inner round is 16 table lookups and XORs.
+#-------------------------------------------------------------------
+def encipher_block(round_keys, block):
+    te0 = Te0
+    te1 = Te1
+    te2 = Te2
+    te3 = Te3
+    rk = round_keys
+    num_rounds = len(rk) // 4 - 1
+
+    (w0, w1, w2, w3) = block
+    s0 = w0 ^ rk[0]
+    s1 = w1 ^ rk[1]
+    s2 = w2 ^ rk[2]
+    s3 = w3 ^ rk[3]
+
+    k = 4
+    for i in range(1, num_rounds):
+        t0 = te0[s0 >> 24] ^ te1[(s1 >> 16) & 0xff] ^\
+             te2[(s2 >> 8) & 0xff] ^ te3[s3 & 0xff] ^ rk[k]
+        t1 = te0[s1 >> 24] ^ te1[(s2 >> 16) & 0xff] ^\
+             te2[(s3 >> 8) & 0xff] ^ te3[s0 & 0xff] ^ rk[k + 1]
+        t2 = te0[s2 >> 24] ^ te1[(s3 >> 16) & 0xff] ^\
+             te2[(s0 >> 8) & 0xff] ^ te3[s1 & 0xff] ^ rk[k + 2]
+        t3 = te0[s3 >> 24] ^ te1[(s0 >> 16) & 0xff] ^\
+             te2[(s1 >> 8) & 0xff] ^ te3[s2 & 0xff] ^ rk[k + 3]
+        s0 = t0
+        s1 = t1
+        s2 = t2
+        s3 = t3
+        k += 4
+
+    # Final round without MixColumns.
+    return (((sbox[s0 >> 24] << 24) | (sbox[(s1 >> 16) & 0xff] << 16) |
+             (sbox[(s2 >> 8) & 0xff] << 8) | sbox[s3 & 0xff]) ^ rk[k],
+            ((sbox[s1 >> 24] << 24) | (sbox[(s2 >> 16) & 0xff] << 16) |
+             (sbox[(s3 >> 8) & 0xff] << 8) | sbox[s0 & 0xff]) ^ rk[k + 1],
+            ((sbox[s2 >> 24] << 24) | (sbox[(s3 >> 16) & 0xff] << 16) |
+             (sbox[(s0 >> 8) & 0xff] << 8) | sbox[s1 & 0xff]) ^ rk[k + 2],
+            ((sbox[s3 >> 24] << 24) | (sbox[(s0 >> 16) & 0xff] << 16) |
+             (sbox[(s1 >> 8) & 0xff] << 8) | sbox[s2 & 0xff]) ^ rk[k + 3])
+
+
+#-------------------------------------------------------------------
+# decipher_block()
+#
+# Decipher the given block using the given flat decipher round
+# keys, the dec_keys of an expanded key.
+#-------------------------------------------------------------------
+def decipher_block(dec_keys, block):
+    td0 = Td0
+    td1 = Td1
+    td2 = Td2
+    td3 = Td3
+    rk = dec_keys
+    num_rounds = len(rk) // 4 - 1
+
+    (w0, w1, w2, w3) = block
+    s0 = w0 ^ rk[0]
+    s1 = w1 ^ rk[1]
+    s2 = w2 ^ rk[2]
+    s3 = w3 ^ rk[3]
+
+    k = 4
+    for i in range(1, num_rounds):
+        t0 = td0[s0 >> 24] ^ td1[(s3 >> 16) & 0xff] ^\
+             td2[(s2 >> 8) & 0xff] ^ td3[s1 & 0xff] ^ rk[k]
+        t1 = td0[s1 >> 24] ^ td1[(s0 >> 16) & 0xff] ^\
+             td2[(s3 >> 8) & 0xff] ^ td3[s2 & 0xff] ^ rk[k + 1]
+        t2 = td0[s2 >> 24] ^ td1[(s1 >> 16) & 0xff] ^\
+             td2[(s0 >> 8) & 0xff] ^ td3[s3 & 0xff] ^ rk[k + 2]
+        t3 = td0[s3 >> 24] ^ td1[(s2 >> 16) & 0xff] ^\
+             td2[(s1 >> 8) & 0xff] ^ td3[s0 & 0xff] ^ rk[k + 3]
+        s0 = t0
+        s1 = t1
+        s2 = t2
+        s3 = t3
+        k += 4
+
+    # Final round without InvMixColumns.
+    return (((inv_sbox[s0 >> 24] << 24) | (inv_sbox[(s3 >> 16) & 0xff] << 16) |
+             (inv_sbox[(s2 >> 8) & 0xff] << 8) | inv_sbox[s1 & 0xff]) ^ rk[k],
+            ((inv_sbox[s1 >> 24] << 24) | (inv_sbox[(s0 >> 16) & 0xff] << 16) |
+             (inv_sbox[(s3 >> 8) & 0xff] << 8) | inv_sbox[s2 & 0xff]) ^ rk[k + 1],
+            ((inv_sbox[s2 >> 24] << 24) | (inv_sbox[(s1 >> 16) & 0xff] << 16) |
+             (inv_sbox[(s0 >> 8) & 0xff] << 8) | inv_sbox[s3 & 0xff]) ^ rk[k + 2],
+            ((inv_sbox[s3 >> 24] << 24) | (inv_sbox[(s2 >> 16) & 0xff] << 16) |
+             (inv_sbox[(s1 >> 8) & 0xff] << 8) | inv_sbox[s0 & 0xff]) ^ rk[k + 3])
+
+
+#-------------------------------------------------------------------
+# aes_encipher_block()
+#
+# Perform AES encipher operation for the given block using the
+# given key. The round keys are taken from the key cache.
+#-------------------------------------------------------------------
+def aes_encipher_block(key, block):
+    return encipher_block(expand_key(key).enc_keys, block)
+
+
+#-------------------------------------------------------------------
+# aes_decipher_block()
+#
+# Perform AES decipher operation for the given block using the
+# given key. The round keys are taken from the key cache.
+#-------------------------------------------------------------------
+def aes_decipher_block(key, block):
+    return decipher_block(expand_key(key).dec_keys, block)
+
+
+#-------------------------------------------------------------------
+# test_aes()
+#
+# Test the T-table engine against the tracing model in aes.py
+# using the NIST vectors and a set of random keys and blocks.
+# Returns the number of failing test cases.
+#-------------------------------------------------------------------
+def test_aes():
+    nist_aes128_key = (0x2b7e1516, 0x28aed2a6, 0xabf71588, 0x09cf4f3c)
+    nist_aes192_key = (0x8e73b0f7, 0xda0e6452, 0xc810f32b, 0x809079e5,
+                       0x62f8ead2, 0x522c6b7b)
+    nist_aes256_key = (0x603deb10, 0x15ca71be, 0x2b73aef0, 0x857d7781,
+                       0x1f352c07, 0x3b6108d7, 0x2d9810a3, 0x0914dff4)
+
+    nist_plaintext = ((0x6bc1bee2, 0x2e409f96, 0xe93d7e11, 0x7393172a),
+                      (0xae2d8a57, 0x1e03ac9c, 0x9eb76fac, 0x45af8e51),
+                      (0x30c81c46, 0xa35ce411, 0xe5fbc119, 0x1a0a52ef),
+                      (0xf69f2445, 0xdf4f9b17, 0xad2b417b, 0xe66c3710))
+
+    tests = []
+    for key in (nist_aes128_key, nist_aes192_key, nist_aes256_key):
+        for block in nist_plaintext:
+            tests.append((key, block))
+
+    rng = random.Random(0)
+    for i in range(8):
+        key = tuple(rng.getrandbits(32) for j in range(rng.choice((4, 6, 8))))
+        block = tuple(rng.getrandbits(32) for j in range(4))
+        tests.append((key, block))
+
+    tc_errors = 0
+    tc = 0
+
+    for (key, block) in tests:
+        # The tracing model prints every step. Hide that.
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = aes.aes_encipher_block(key, block)
+            expected_dec = aes.aes_decipher_block(key, block)
+
+        if aes_encipher_block(key, block) != expected:
+            print("ERROR: Encipher test %d failed." % tc)
+            tc_errors += 1
+        if aes_decipher_block(key, block) != expected_dec:
+            print("ERROR: Decipher test %d failed." % tc)
+            tc_errors += 1
+        ek = expand_key(key)
+        if list(ek.dec_keys) != dec_key_gen(ek.enc_keys):
+            print("ERROR: Cached decipher round keys for test %d differ." % tc)
+            tc_errors += 1
+        tc += 1
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+    return tc_errors
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests the T-table engine using known test vectors.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the T-table AES engine")
+    print("==============================")
+    return test_aes()
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_ttable.py
+#=======================================================================
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_vectors.py
+# --------------
+# Generator of random AES test vectors with expected results for
+# the testbenches. Writes $readmemh files and a compact binary format.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2014, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import time
+import random
+import struct
+import argparse
+import binascii
+import tempfile
+
+import aes_ttable
+from aes_key_cache import expand_key
+
+try:
+    import numpy as np
+    import aes_numpy
+except ImportError:
+    np = None
+    aes_numpy = None
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+AES_DECIPHER = 0
+AES_ENCIPHER = 1
+
+AES_128_BIT_KEY = 0
+AES_256_BIT_KEY = 1
+
+# A record is the config byte with the encdec and keylen bits
+# as in the config register of the top level, the 256 bit key
+# with 128 bit keys in the first 16 bytes and zeros after, the
+# block and the expected result.
+RECORD_SIZE = 65
+CONFIG_OFFSET = 0
+KEY_OFFSET = 1
+BLOCK_OFFSET = 33
+EXPECTED_OFFSET = 49
+
+CONFIG_ENCDEC_BIT = 0
+CONFIG_KEYLEN_BIT = 1
+
+# The binary file is a header with magic, version and number of
+# records followed by the records.
+MAGIC = b"AESV"
+VERSION = 1
+header_struct = struct.Struct(">4sII")
+
+# Number of records generated per batch.
+BATCH_RECORDS = 65536
+
+HEX_DIGITS = b"0123456789abcdef"
+
+
+#-------------------------------------------------------------------
+# gen_random_records()
+#
+# Return count records with random config, key and block from
+# the given random generator. The expected results are not set.
+#-------------------------------------------------------------------
+def gen_random_records(rng, count):
+    records = bytearray(rng.randbytes(count * RECORD_SIZE))
+    if np is not None:
+        rows = np.frombuffer(records, dtype=np.uint8).reshape(-1, RECORD_SIZE)
+        rows[:, CONFIG_OFFSET] &= 0x03
+        short_keys = (rows[:, CONFIG_OFFSET] >> CONFIG_KEYLEN_BIT) & 1 == 0
+        rows[short_keys, KEY_OFFSET + 16 : BLOCK_OFFSET] = 0
+        return records
+
+    for offset in range(0, len(records), RECORD_SIZE):
+        records[offset + CONFIG_OFFSET] &= 0x03
+        if not (records[offset + CONFIG_OFFSET] >> CONFIG_KEYLEN_BIT) & 1:
+            records[offset + KEY_OFFSET + 16 : offset + BLOCK_OFFSET] = bytes(16)
+    return records
+
+
+#-------------------------------------------------------------------
+# set_expected_numpy()
+#
+# Compute the expected results for all records in place with
+# the NumPy engine. The records are grouped by key length and
+# direction and each group is processed with one key expansion
+# and one cipher call over all its keys.
+#-------------------------------------------------------------------
+def set_expected_numpy(records):
+    rows = np.frombuffer(records, dtype=np.uint8).reshape(-1, RECORD_SIZE)
+    config = rows[:, CONFIG_OFFSET]
+
+    for value in range(4):
+        selected = np.nonzero(config == value)[0]
+        if not len(selected):
+            continue
+
+        key_bytes = 32 if (value >> CONFIG_KEYLEN_BIT) & 1 else 16
+        rk = aes_numpy.key_expand_array(rows[selected, KEY_OFFSET : KEY_OFFSET + key_bytes])
+        blocks = rows[selected, BLOCK_OFFSET : EXPECTED_OFFSET]
+        if (value >> CONFIG_ENCDEC_BIT) & 1:
+            rows[selected, EXPECTED_OFFSET:] = aes_numpy.encipher_array(rk, blocks)
+        else:
+            rows[selected, EXPECTED_OFFSET:] = aes_numpy.decipher_array(rk, blocks)
+
+
+#-------------------------------------------------------------------
+# set_expected_scalar()
+#
+# Compute the expected results for all records in place one
+# record at a time with the T-table engine.
+#-------------------------------------------------------------------
+def set_expected_scalar(records):
+    for offset in range(0, len(records), RECORD_SIZE):
+        (keylen, encdec, key, block, expected) = parse_record(records, offset)
+        ek = expand_key(key[0 : 8 if keylen else 4])
+        if encdec:
+            result = aes_ttable.encipher_block(ek.enc_keys, block)
+        else:
+            result = aes_ttable.decipher_block(ek.dec_keys, block)
+        struct.pack_into(">4I", records, offset + EXPECTED_OFFSET, *result)
+
+
+#-------------------------------------------------------------------
+# parse_record()
+#
+# Return (keylen, encdec, key, block, expected) for the record
+# at the given offset. Key and blocks are tuples of words.
+#-------------------------------------------------------------------
+def parse_record(records, offset=0):
+    config = records[offset + CONFIG_OFFSET]
+    words = struct.unpack_from(">16I", records, offset + KEY_OFFSET)
+    return ((config >> CONFIG_KEYLEN_BIT) & 1, (config >> CONFIG_ENCDEC_BIT) & 1,
+            words[0 : 8], words[8 : 12], words[12 : 16])
+
+
+#-------------------------------------------------------------------
+# gen_vectors()
+#
+# Generator yielding batches of count random records in total
+# with the expected results set. The same seed gives the same
+# records with and without NumPy.
+#-------------------------------------------------------------------
+def gen_vectors(count, seed=None, batch=BATCH_RECORDS):
+    rng = random.Random(seed)
+    for start in range(0, count, batch):
+        n = min(batch, count - start)
+        records = gen_random_records(rng, n)
+        if np is not None:
+            set_expected_numpy(records)
+        else:
+            set_expected_scalar(records)
+        yield records
+
+
+#-------------------------------------------------------------------
+# to_hex_lines()
+#
+# Return the records as $readmemh lines of 130 hex digits each.
+# With the config byte first, bit 513 of each word is keylen,
+# bit 512 encdec, [511 : 256] the key, [255 : 128] the block and
+# [127 : 0] the expected result.
+#-------------------------------------------------------------------
+def to_hex_lines(records):
+    if np is not None:
+        rows = np.frombuffer(records, dtype=np.uint8).reshape(-1, RECORD_SIZE)
+        digits = np.frombuffer(HEX_DIGITS, dtype=np.uint8)
+        lines = np.empty((len(rows), 2 * RECORD_SIZE + 1), dtype=np.uint8)
+        lines[:, 0 : -1 : 2] = digits[rows >> 4]
+        lines[:, 1 : -1 : 2] = digits[rows & 0x0f]
+        lines[:, -1] = ord("\n")
+        return lines.tobytes()
+
+    return b"".join(binascii.hexlify(records[offset : offset + RECORD_SIZE]) + b"\n"
+                    for offset in range(0, len(records), RECORD_SIZE))
+
+
+#-------------------------------------------------------------------
+# write_vectors()
+#
+# Generate count records and write them to a $readmemh file,
+# a binary file or both. Returns the number of records.
+#-------------------------------------------------------------------
+def write_vectors(count, hex_path=None, bin_path=None, seed=None):
+    hex_file = open(hex_path, "wb") if hex_path else None
+    bin_file = open(bin_path, "wb") if bin_path else None
+    try:
+        if hex_file:
+            hex_file.write(b"// %d AES test vectors: config, key, block, expected.\n" % count)
+        if bin_file:
+            bin_file.write(header_struct.pack(MAGIC, VERSION, count))
+
+        for records in gen_vectors(count, seed):
+            if hex_file:
+                hex_file.write(to_hex_lines(records))
+            if bin_file:
+                bin_file.write(records)
+    finally:
+        if hex_file:
+            hex_file.close()
+        if bin_file:
+            bin_file.close()
+
+    return count
+
+
+#-------------------------------------------------------------------
+# read_vectors()
+#
+# Generator yielding the records in a binary file in batches.
+#-------------------------------------------------------------------
+def read_vectors(path, batch=BATCH_RECORDS):
+    with open(path, "rb") as f:
+        (magic, version, count) = header_struct.unpack(f.read(header_struct.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a version %d test vector file." % (path, VERSION))
+
+        while count:
+            n = min(batch, count)
+            records = f.read(n * RECORD_SIZE)
+            if len(records) != n * RECORD_SIZE:
+                raise ValueError("%s is truncated." % path)
+            count -= n
+            yield records
+
+
+#-------------------------------------------------------------------
+# test_vectors()
+#
+# Check generated records against the NIST vectors and the
+# scalar engine, and the written files. Returns the number of
+# failing test cases.
+#-------------------------------------------------------------------
+def test_vectors():
+    nist_aes128_key = (0x2b7e1516, 0x28aed2a6, 0xabf71588, 0x09cf4f3c)
+    nist_aes256_key = (0x603deb10, 0x15ca71be, 0x2b73aef0, 0x857d7781,
+                       0x1f352c07, 0x3b6108d7, 0x2d9810a3, 0x0914dff4)
+    nist_plaintext = (0x6bc1bee2, 0x2e409f96, 0xe93d7e11, 0x7393172a)
+    nist_exp128 = (0x3ad77bb4, 0x0d7a3660, 0xa89ecaf3, 0x2466ef97)
+    nist_exp256 = (0xf3eed1bd, 0xb5d2a03c, 0x064b5a7e, 0x3db181f8)
+
+    tc_errors = 0
+    tc = 0
+
+    records = bytearray()
+    for (keylen, key, expected) in ((AES_128_BIT_KEY, nist_aes128_key + (0,) * 4, nist_exp128),
+                                    (AES_256_BIT_KEY, nist_aes256_key, nist_exp256)):
+        for encdec in (AES_DECIPHER, AES_ENCIPHER):
+            block = nist_plaintext if encdec else expected
+            records += struct.pack(">B16I", (keylen << CONFIG_KEYLEN_BIT) | encdec,
+                                   *(key + block + (0,) * 4))
+
+    for (name, function) in (("NumPy", set_expected_numpy if np else None),
+                             ("scalar", set_expected_scalar)):
+        if not function:
+            continue
+        function(records)
+        for offset in range(0, len(records), RECORD_SIZE):
+            (keylen, encdec, key, block, expected) = parse_record(records, offset)
+            if expected != (nist_plaintext if not encdec else
+                            (nist_exp256 if keylen else nist_exp128)):
+                print("ERROR: %s engine failed on NIST record %d." %
+                      (name, offset // RECORD_SIZE))
+                tc_errors += 1
+            tc += 1
+
+    # Random records must match the scalar engine and be the
+    # same for the same seed.
+    records = b"".join(gen_vectors(1000, seed=1, batch=300))
+    check = bytearray(records)
+    set_expected_scalar(check)
+    if records != check:
+        print("ERROR: Random records do not match the scalar engine.")
+        tc_errors += 1
+    if records != b"".join(gen_vectors(1000, seed=1)):
+        print("ERROR: Same seed gave different records.")
+        tc_errors += 1
+    tc += 2
+
+    with tempfile.TemporaryDirectory() as tmp:
+        hex_path = os.path.join(tmp, "vectors.hex")
+        bin_path = os.path.join(tmp, "vectors.bin")
+        write_vectors(1000, hex_path, bin_path, seed=1)
+
+        if b"".join(read_vectors(bin_path, batch=256)) != records:
+            print("ERROR: Binary file does not match the records.")
+            tc_errors += 1
+        with open(hex_path, "rb") as f:
+            lines = f.read().splitlines()[1:]
+        if b"".join(binascii.unhexlify(line) for line in lines) != records:
+            print("ERROR: Hex file does not match the records.")
+            tc_errors += 1
+        tc += 2
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+    return tc_errors
+
+
+#-------------------------------------------------------------------
+# gen_parser()
+#-------------------------------------------------------------------
+def gen_parser():
+    parser = argparse.ArgumentParser(description="Generate random AES test vectors.")
+    parser.add_argument("--count", type=int, default=1000,
+                        help="Number of test vectors.")
+    parser.add_argument("--seed", type=int, help="Seed for the random generator.")
+    parser.add_argument("--hex", help="Write the vectors as a $readmemh file.")
+    parser.add_argument("--bin", help="Write the vectors as a binary file.")
+    return parser
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# With arguments generates test vectors, without runs the tests.
+#-------------------------------------------------------------------
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if argv:
+        parser = gen_parser()
+        args = parser.parse_args(argv)
+        if not (args.hex or args.bin):
+            parser.error("At least one of --hex and --bin is required.")
+
+        start = time.perf_counter()
+        write_vectors(args.count, args.hex, args.bin, args.seed)
+        elapsed = time.perf_counter() - start
+        sys.stderr.write("%d vectors in %.3f s, %.0f vectors/s\n" %
+                         (args.count, elapsed, args.count / max(elapsed, 1e-9)))
+        return 0
+
+    print("Testing the AES test vector generator")
+    print("=====================================")
+    return test_vectors()
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_vectors.py
+#=======================================================================
@@ -0,0 +1,548 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_xts.py
+# ----------
+# The XTS mode (IEEE 1619) using separate expanded data and tweak
+# keys. The tweak whitening is generated for a whole sector and the
+# sectors of a file are processed by worker processes through mmap.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2014, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import time
+import mmap
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import aes_ttable
+import aes_bulk
+from aes_bulk import BLOCK_SIZE, block_struct
+from aes_modes import xor_bytes
+from aes_key_cache import expand_key
+
+# The NumPy engine is used for the block operations if
+# available, otherwise the T-table bulk engine.
+try:
+    import aes_numpy as block_engine
+except ImportError:
+    import aes_bulk as block_engine
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+SECTOR_SIZE = 512
+
+# Number of sectors in each job handed to a worker. 2048
+# sectors of 512 bytes is 1 MiB of data.
+CHUNK_SECTORS = 2048
+
+MASK128 = (1 << 128) - 1
+
+# Number of blocks the NumPy tweak generation advances in one
+# step. At most 57 so the folded carry fits in 64 bits.
+TWEAK_STEP = 32
+
+# Below this number of sectors the first tweaks are enciphered
+# with the T-table code, the NumPy engine has a large fixed cost.
+NUMPY_MIN_SECTORS = 32
+XTS_POLY = (1 << 128) | 0x87
+
+
+#-------------------------------------------------------------------
+# Worker state. Set once per worker process by init_worker().
+#-------------------------------------------------------------------
+worker_keys = None
+
+
+#-------------------------------------------------------------------
+# split_key()
+#
+# Split the XTS key into the data key and the tweak key and
+# return them expanded.
+#-------------------------------------------------------------------
+def split_key(key):
+    if len(key) not in (32, 64):
+        raise ValueError("XTS key must be 32 or 64 bytes, got %d." % len(key))
+
+    half = len(key) // 2
+    return (expand_key(bytes(key[0 : half])), expand_key(bytes(key[half:])))
+
+
+#-------------------------------------------------------------------
+# gen_tweaks_scalar()
+#
+# Generate the whitening values for blocks 0 up to nblocks of
+# nsectors consecutive sectors, one tweak at a time with Python
+# integers. The tweak is multiplied by alpha for each block.
+#-------------------------------------------------------------------
+def gen_tweaks_scalar(tweak_key, sector, nblocks, nsectors=1):
+    tweaks = []
+    for s in range(sector, sector + nsectors):
+        t = aes_ttable.encipher_block(tweak_key.enc_keys,
+                                      block_struct.unpack(s.to_bytes(16, "little")))
+        t = int.from_bytes(block_struct.pack(*t), "little")
+
+        for i in range(nblocks):
+            tweaks.append(t.to_bytes(16, "little"))
+            t <<= 1
+            if t >> 128:
+                t ^= XTS_POLY
+    return b"".join(tweaks)
+
+
+#-------------------------------------------------------------------
+# mul_alpha_pow()
+#
+# Multiply the tweaks given as little endian uint64 halves by
+# alpha to the power k, 0 < k < 58. The bits shifted out of the
+# high half are folded back into the low half with x^7+x^2+x+1.
+#-------------------------------------------------------------------
+def mul_alpha_pow(lo, hi, k):
+    k = np.uint64(k)
+    right = np.uint64(64) - k
+    carry = hi >> right
+    hi = (hi << k) | (lo >> right)
+    lo = (lo << k) ^ carry ^ (carry << np.uint64(1)) ^\
+         (carry << np.uint64(2)) ^ (carry << np.uint64(7))
+    return (lo, hi)
+
+
+#-------------------------------------------------------------------
+# gen_tweaks_numpy()
+#
+# Same as gen_tweaks_scalar() with NumPy. The first tweaks of
+# many sectors are enciphered in one call. The chain is then
+# built as uint64 pairs, doubling the number of blocks done
+# until TWEAK_STEP and then TWEAK_STEP blocks at a time, each
+# step for all sectors at once.
+#-------------------------------------------------------------------
+def gen_tweaks_numpy(tweak_key, sector, nblocks, nsectors=1):
+    first = b"".join([s.to_bytes(16, "little") for s in range(sector, sector + nsectors)])
+    if nsectors < NUMPY_MIN_SECTORS:
+        first = aes_bulk.encrypt_blocks(tweak_key, first)
+    else:
+        first = block_engine.encrypt_blocks(tweak_key, first)
+
+    tweaks = np.empty((nsectors, nblocks, 2), dtype="<u8")
+    tweaks[:, 0] = np.frombuffer(first, dtype="<u8").reshape(nsectors, 2)
+    done = 1
+    while done < nblocks:
+        k = min(done, TWEAK_STEP)
+        n = min(k, nblocks - done)
+        prev = tweaks[:, done - k : done - k + n]
+        (tweaks[:, done : done + n, 0], tweaks[:, done : done + n, 1]) =\
+            mul_alpha_pow(prev[..., 0], prev[..., 1], k)
+        done += n
+    return tweaks.tobytes()
+
+
+#-------------------------------------------------------------------
+# gen_tweaks()
+#
+# Generate the whitening values for blocks 0 up to nblocks of
+# nsectors consecutive sectors starting with the given sector.
+# Returns them concatenated as bytes that can be XORed with the
+# sectors at once. Uses NumPy if available.
+#-------------------------------------------------------------------
+def gen_tweaks(tweak_key, sector, nblocks, nsectors=1):
+    if np is None or nblocks == 0 or nsectors == 0:
+        return gen_tweaks_scalar(tweak_key, sector, nblocks, nsectors)
+    return gen_tweaks_numpy(tweak_key, sector, nblocks, nsectors)
+
+
+#-------------------------------------------------------------------
+# crypt_blocks()
+#
+# Whiten, encipher or decipher and whiten the given blocks.
+#-------------------------------------------------------------------
+def crypt_blocks(data_key, data, whitening, encrypt):
+    if encrypt:
+        result = block_engine.encrypt_blocks(data_key, xor_bytes(data, whitening))
+    else:
+        result = block_engine.decrypt_blocks(data_key, xor_bytes(data, whitening))
+    return xor_bytes(result, whitening)
+
+
+#-------------------------------------------------------------------
+# crypt_sector()
+#
+# Encipher or decipher one sector. Sectors that are not a whole
+# number of blocks use ciphertext stealing for the last block.
+#-------------------------------------------------------------------
+def crypt_sector(keys, sector, data, encrypt):
+    (data_key, tweak_key) = keys
+    n = len(data)
+    if n < BLOCK_SIZE:
+        raise ValueError("XTS sector must be at least %d bytes, got %d." % (BLOCK_SIZE, n))
+
+    m = n // BLOCK_SIZE
+    r = n % BLOCK_SIZE
+    if r == 0:
+        return crypt_blocks(data_key, data, gen_tweaks(tweak_key, sector, m), encrypt)
+
+    whitening = gen_tweaks(tweak_key, sector, m + 1)
+    head = (m - 1) * BLOCK_SIZE
+    out = crypt_blocks(data_key, data[0 : head], whitening[0 : head], encrypt)
+
+    # The last full block uses tweak m - 1 when enciphering and
+    # tweak m when deciphering, the stolen block the other one.
+    t_last = whitening[head : head + BLOCK_SIZE]
+    t_stolen = whitening[head + BLOCK_SIZE:]
+    if not encrypt:
+        (t_last, t_stolen) = (t_stolen, t_last)
+
+    cc = crypt_blocks(data_key, data[head : head + BLOCK_SIZE], t_last, encrypt)
+    pp = bytes(data[head + BLOCK_SIZE:]) + cc[r:]
+    return out + crypt_blocks(data_key, pp, t_stolen, encrypt) + cc[0 : r]
+
+
+#-------------------------------------------------------------------
+# crypt_sectors()
+#
+# Encipher or decipher consecutive sectors starting with the
+# given sector number. When the sector size is a whole number
+# of blocks all full sectors are whitened and run through the
+# block engine in one go. A short last sector is allowed.
+#-------------------------------------------------------------------
+def crypt_sectors(keys, first_sector, data, sector_size, encrypt):
+    n = len(data)
+    nsectors = n // sector_size
+
+    if sector_size % BLOCK_SIZE:
+        out = [crypt_sector(keys, first_sector + s,
+                            data[s * sector_size : (s + 1) * sector_size], encrypt)
+               for s in range(nsectors)]
+        out = b"".join(out)
+    else:
+        blocks = sector_size // BLOCK_SIZE
+        whitening = gen_tweaks(keys[1], first_sector, blocks, nsectors)
+        out = crypt_blocks(keys[0], data[0 : nsectors * sector_size], whitening, encrypt)
+
+    if nsectors * sector_size < n:
+        out += crypt_sector(keys, first_sector + nsectors,
+                            data[nsectors * sector_size:], encrypt)
+    return out
+
+
+#-------------------------------------------------------------------
+# xts_encrypt()
+#
+# Encipher the data unit with the given sector number. With
+# sector_size set the data is split into consecutive sectors.
+#-------------------------------------------------------------------
+def xts_encrypt(key, sector, data, sector_size=None):
+    return crypt_sectors(split_key(key), sector, data, sector_size or len(data), True)
+
+
+#-------------------------------------------------------------------
+# xts_decrypt()
+#
+# Decipher the data unit with the given sector number.
+#-------------------------------------------------------------------
+def xts_decrypt(key, sector, data, sector_size=None):
+    return crypt_sectors(split_key(key), sector, data, sector_size or len(data), False)
+
+
+#-------------------------------------------------------------------
+# init_worker()
+#
+# Expand the keys once in each worker process.
+#-------------------------------------------------------------------
+def init_worker(key):
+    global worker_keys
+    worker_keys = split_key(key)
+
+
+#-------------------------------------------------------------------
+# xts_job()
+#
+# Process sectors first up to last of the input file into the
+# output file. Both files are memory mapped by the job, so only
+# the job description is passed between processes.
+#-------------------------------------------------------------------
+def xts_job(in_path, out_path, sector_size, first_sector, first, last, encrypt):
+    with open(in_path, "rb") as fin, open(out_path, "r+b") as fout:
+        in_map = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+        out_map = mmap.mmap(fout.fileno(), 0, access=mmap.ACCESS_WRITE)
+        try:
+            start = first * sector_size
+            end = min(last * sector_size, len(in_map))
+            out_map[start : end] = crypt_sectors(worker_keys, first_sector + first,
+                                                 in_map[start : end], sector_size,
+                                                 encrypt)
+        finally:
+            out_map.close()
+            in_map.close()
+
+    return end - start
+
+
+#-------------------------------------------------------------------
+# xts_crypt_file()
+#
+# Encipher or decipher the input file into the output file.
+# Sector i of the file uses sector number first_sector + i.
+# The output file is preallocated and the sectors are split
+# into jobs processed by a pool of worker processes. The output
+# must not be the input file, it is truncated first.
+#-------------------------------------------------------------------
+def xts_crypt_file(key, in_path, out_path, encrypt, sector_size=SECTOR_SIZE,
+                   first_sector=0, workers=None, chunk_sectors=CHUNK_SECTORS):
+    split_key(key)
+    if os.path.exists(out_path) and os.path.samefile(in_path, out_path):
+        raise ValueError("Input and output are the same file: %s" % out_path)
+
+    length = os.path.getsize(in_path)
+    if length % sector_size and length % sector_size < BLOCK_SIZE:
+        raise ValueError("Last sector of %d bytes is shorter than a block." %
+                         (length % sector_size))
+
+    with open(out_path, "wb") as fout:
+        fout.truncate(length)
+    if length == 0:
+        return
+
+    nsectors = (length + sector_size - 1) // sector_size
+    workers = workers or os.cpu_count() or 1
+
+    # Not worth the process round trip for small inputs. The
+    # jobs are still run one chunk at a time.
+    if workers == 1 or nsectors <= chunk_sectors:
+        init_worker(key)
+        for first in range(0, nsectors, chunk_sectors):
+            last = min(first + chunk_sectors, nsectors)
+            xts_job(in_path, out_path, sector_size, first_sector, first, last, encrypt)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(bytes(key),)) as executor:
+        jobs = []
+        for first in range(0, nsectors, chunk_sectors):
+            last = min(first + chunk_sectors, nsectors)
+            jobs.append(executor.submit(xts_job, in_path, out_path, sector_size,
+                                        first_sector, first, last, encrypt))
+        for job in jobs:
+            job.result()
+
+
+#-------------------------------------------------------------------
+# xts_encrypt_file()
+#-------------------------------------------------------------------
+def xts_encrypt_file(key, in_path, out_path, **kwargs):
+    xts_crypt_file(key, in_path, out_path, True, **kwargs)
+
+
+#-------------------------------------------------------------------
+# xts_decrypt_file()
+#-------------------------------------------------------------------
+def xts_decrypt_file(key, in_path, out_path, **kwargs):
+    xts_crypt_file(key, in_path, out_path, False, **kwargs)
+
+
+#-------------------------------------------------------------------
+# test_xts()
+#
+# Test XTS with vectors from IEEE 1619 and check that the
+# parallel file processing matches the in memory version.
+# Returns the number of failing test cases.
+#-------------------------------------------------------------------
+def test_xts():
+    pt2 = "44" * 32
+    key3 = "fffefdfcfbfaf9f8f7f6f5f4f3f2f1f0" + "22" * 16
+    key15 = "fffefdfcfbfaf9f8f7f6f5f4f3f2f1f0bfbebdbcbbbab9b8b7b6b5b4b3b2b1b0"
+
+    # (name, key, sector, plaintext, ciphertext)
+    tests = (
+        ("Vector 1", "00" * 32, 0, "00" * 32,
+         "917cf69ebd68b2ec9b9fe9a3eadda692cd43d2f59598ed858c02c2652fbf922e"),
+        ("Vector 2", "11" * 16 + "22" * 16, 0x3333333333, pt2,
+         "c454185e6a16936e39334038acef838bfb186fff7480adc4289382ecd6d394f0"),
+        ("Vector 3", key3, 0x3333333333, pt2,
+         "af85336b597afc1a900b2eb21ec949d292df4c047e0b21532186a5971a227a89"),
+        ("Vector 15", key15, 0x123456789a, "000102030405060708090a0b0c0d0e0f10",
+         "6c1625db4671522d3d7599601de7ca09ed"),
+    )
+
+    tc_errors = 0
+    tc = 0
+
+    for (name, key, sector, pt, ct) in tests:
+        (key, pt, ct) = [bytes.fromhex(x) for x in (key, pt, ct)]
+        if xts_encrypt(key, sector, pt) != ct:
+            print("ERROR: %s encipher failed." % name)
+            tc_errors += 1
+        if xts_decrypt(key, sector, ct) != pt:
+            print("ERROR: %s decipher failed." % name)
+            tc_errors += 1
+        tc += 1
+
+    # Ciphertext stealing round trip for all partial lengths.
+    key = os.urandom(64)
+    for n in range(17, 64):
+        data = os.urandom(n)
+        if xts_decrypt(key, n, xts_encrypt(key, n, data)) != data:
+            print("ERROR: Round trip of %d bytes failed." % n)
+            tc_errors += 1
+    tc += 1
+
+    # The NumPy tweaks must match the scalar ones, also for
+    # sectors where the tweak wraps around.
+    if np is not None:
+        tweak_key = split_key(key)[1]
+        for (sector, nblocks, nsectors) in ((0, 1, 1), (3, 33, 1), (2**64 - 3, 300, 5),
+                                            (int.from_bytes(os.urandom(8), "little"), 97, 3)):
+            if gen_tweaks_numpy(tweak_key, sector, nblocks, nsectors) !=\
+               gen_tweaks_scalar(tweak_key, sector, nblocks, nsectors):
+                print("ERROR: NumPy tweaks for sector %d, %d blocks failed." % (sector, nblocks))
+                tc_errors += 1
+        tc += 1
+
+    # Multi sector data must match sector by sector processing.
+    data = os.urandom(7 * SECTOR_SIZE + 100)
+    expected = b"".join([xts_encrypt(key, 5 + i, data[i * SECTOR_SIZE : (i + 1) * SECTOR_SIZE])
+                         for i in range(8)])
+    if xts_encrypt(key, 5, data, SECTOR_SIZE) != expected:
+        print("ERROR: Multi sector encipher failed.")
+        tc_errors += 1
+    tc += 1
+
+    # Parallel file processing.
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [os.path.join(tmp, name) for name in ("in", "enc", "dec")]
+        with open(paths[0], "wb") as f:
+            f.write(data)
+
+        xts_encrypt_file(key, paths[0], paths[1], first_sector=5,
+                         workers=1, chunk_sectors=3)
+        with open(paths[1], "rb") as f:
+            if f.read() != expected:
+                print("ERROR: Chunked file encipher in process failed.")
+                tc_errors += 1
+
+        xts_encrypt_file(key, paths[0], paths[1], first_sector=5,
+                         workers=2, chunk_sectors=3)
+        xts_decrypt_file(key, paths[1], paths[2], first_sector=5,
+                         workers=2, chunk_sectors=3)
+        with open(paths[1], "rb") as f:
+            if f.read() != expected:
+                print("ERROR: Parallel file encipher failed.")
+                tc_errors += 1
+        with open(paths[2], "rb") as f:
+            if f.read() != data:
+                print("ERROR: Parallel file decipher failed.")
+                tc_errors += 1
+        tc += 1
+
+        # Output to the input file, also through a hard link.
+        os.remove(paths[2])
+        os.link(paths[0], paths[2])
+        for out_path in paths[0 : 3 : 2]:
+            try:
+                xts_encrypt_file(key, paths[0], out_path)
+                print("ERROR: Output to the input file not rejected.")
+                tc_errors += 1
+            except ValueError:
+                pass
+        with open(paths[0], "rb") as f:
+            if f.read() != data:
+                print("ERROR: Input file changed by rejected run.")
+                tc_errors += 1
+        tc += 1
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+    return tc_errors
+
+
+#-------------------------------------------------------------------
+# bench_xts()
+#
+# Measure and print the file encipher throughput.
+#-------------------------------------------------------------------
+def bench_xts(size=1 << 24, workers=None):
+    key = os.urandom(64)
+    with tempfile.TemporaryDirectory() as tmp:
+        (in_path, out_path) = (os.path.join(tmp, "in"), os.path.join(tmp, "out"))
+        with open(in_path, "wb") as f:
+            f.write(os.urandom(size))
+
+        start = time.perf_counter()
+        xts_encrypt_file(key, in_path, out_path, workers=workers)
+        elapsed = time.perf_counter() - start
+        print("XTS file encipher of %d bytes using %s: %.3f s, %.3f MB/s" %
+              (size, block_engine.__name__, elapsed, size / elapsed / 1e6))
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests XTS using known test vectors and measures
+# the file throughput.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the AES-XTS mode")
+    print("========================")
+    errors = test_xts()
+    print("")
+    bench_xts()
+    return errors
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_xts.py
+#=======================================================================
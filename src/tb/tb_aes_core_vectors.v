@@ -0,0 +1,284 @@
+//======================================================================
+//
+// tb_aes_core_vectors.v
+// ---------------------
+// Testbench for the AES block cipher core running the test vectors
+// in a $readmemh file written by aes_vectors.py.
+//
+//
+// Author: Joachim Strombergson
+// Copyright (c) 2014, Secworks Sweden AB
+// All rights reserved.
+//
+// Redistribution and use in source and binary forms, with or
+// without modification, are permitted provided that the following
+// conditions are met:
+//
+// 1. Redistributions of source code must retain the above copyright
+//    notice, this list of conditions and the following disclaimer.
+//
+// 2. Redistributions in binary form must reproduce the above copyright
+//    notice, this list of conditions and the following disclaimer in
+//    the documentation and/or other materials provided with the
+//    distribution.
+//
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+// "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+// LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+// FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+// COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+// INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+// BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+// LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+// CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+// STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+// ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+// ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+//
+//======================================================================
+
+//------------------------------------------------------------------
+// Test module.
+//------------------------------------------------------------------
+module tb_aes_core_vectors();
+
+  //----------------------------------------------------------------
+  // Internal constant and parameter definitions.
+  //----------------------------------------------------------------
+  parameter CLK_HALF_PERIOD = 1;
+  parameter CLK_PERIOD = 2 * CLK_HALF_PERIOD;
+
+  // Max number of test vectors in one file.
+  parameter MAX_VECTORS = 65536;
+
+  // Fields of a test vector word, see aes_vectors.py.
+  localparam TV_KEYLEN_BIT = 513;
+  localparam TV_ENCDEC_BIT = 512;
+
+
+  //----------------------------------------------------------------
+  // Register and Wire declarations.
+  //----------------------------------------------------------------
+  reg [31 : 0] cycle_ctr;
+  reg [31 : 0] error_ctr;
+  reg [31 : 0] tc_ctr;
+
+  reg [519 : 0]  tv_mem [0 : (MAX_VECTORS - 1)];
+  reg [2047 : 0] tv_file;
+
+  reg            tb_clk;
+  reg            tb_reset_n;
+  reg            tb_encdec;
+  reg            tb_init;
+  reg            tb_next;
+  wire           tb_ready;
+  reg [255 : 0]  tb_key;
+  reg            tb_keylen;
+  reg [127 : 0]  tb_block;
+  wire [127 : 0] tb_result;
+  wire           tb_result_valid;
+
+
+  //----------------------------------------------------------------
+  // Device Under Test.
+  //----------------------------------------------------------------
+  aes_core dut(
+               .clk(tb_clk),
+               .reset_n(tb_reset_n),
+
+               .encdec(tb_encdec),
+               .init(tb_init),
+               .next(tb_next),
+               .ready(tb_ready),
+
+               .key(tb_key),
+               .keylen(tb_keylen),
+
+               .block(tb_block),
+               .result(tb_result),
+               .result_valid(tb_result_valid)
+              );
+
+
+  //----------------------------------------------------------------
+  // clk_gen
+  //
+  // Always running clock generator process.
+  //----------------------------------------------------------------
+  always
+    begin : clk_gen
+      #CLK_HALF_PERIOD;
+      tb_clk = !tb_clk;
+    end // clk_gen
+
+
+  //----------------------------------------------------------------
+  // sys_monitor()
+  //
+  // An always running process that creates a cycle counter.
+  //----------------------------------------------------------------
+  always
+    begin : sys_monitor
+      cycle_ctr = cycle_ctr + 1;
+      #(CLK_PERIOD);
+    end
+
+
+  //----------------------------------------------------------------
+  // reset_dut()
+  //
+  // Toggle reset to put the DUT into a well known state.
+  //----------------------------------------------------------------
+  task reset_dut;
+    begin
+      tb_reset_n = 0;
+      #(2 * CLK_PERIOD);
+      tb_reset_n = 1;
+    end
+  endtask // reset_dut
+
+
+  //----------------------------------------------------------------
+  // init_sim()
+  //
+  // Initialize all counters and testbed functionality as well
+  // as setting the DUT inputs to defined values.
+  //----------------------------------------------------------------
+  task init_sim;
+    begin
+      cycle_ctr = 0;
+      error_ctr = 0;
+      tc_ctr    = 0;
+
+      tb_clk     = 0;
+      tb_reset_n = 1;
+      tb_encdec  = 0;
+      tb_init    = 0;
+      tb_next    = 0;
+      tb_key     = {8{32'h00000000}};
+      tb_keylen  = 0;
+
+      tb_block  = {4{32'h00000000}};
+    end
+  endtask // init_sim
+
+
+  //----------------------------------------------------------------
+  // display_test_result()
+  //
+  // Display the accumulated test results.
+  //----------------------------------------------------------------
+  task display_test_result;
+    begin
+      if (error_ctr == 0)
+        begin
+          $display("*** All %0d test vectors completed successfully in %0d cycles",
+                   tc_ctr, cycle_ctr);
+        end
+      else
+        begin
+          $display("*** %0d test vectors completed - %0d test vectors did not complete successfully.",
+                   tc_ctr, error_ctr);
+        end
+    end
+  endtask // display_test_result
+
+
+  //----------------------------------------------------------------
+  // wait_ready()
+  //
+  // Wait for the ready flag in the dut to be set.
+  //----------------------------------------------------------------
+  task wait_ready;
+    begin
+      while (!tb_ready)
+        begin
+          #(CLK_PERIOD);
+        end
+    end
+  endtask // wait_ready
+
+
+  //----------------------------------------------------------------
+  // test_vector()
+  //
+  // Run one test vector. The key is only expanded when the key
+  // or key length differs from the previous test vector. The
+  // result is displayed as "TV <index> <result>" for scripts
+  // that check the output.
+  //----------------------------------------------------------------
+  task test_vector(input [31 : 0]  index,
+                   input [519 : 0] tv);
+    begin
+      tc_ctr = tc_ctr + 1;
+
+      if ((index == 0) || (tv[511 : 256] != tb_key) ||
+          (tv[TV_KEYLEN_BIT] != tb_keylen))
+        begin
+          tb_key = tv[511 : 256];
+          tb_keylen = tv[TV_KEYLEN_BIT];
+          tb_init = 1;
+          #(2 * CLK_PERIOD);
+          tb_init = 0;
+          wait_ready();
+        end
+
+      tb_encdec = tv[TV_ENCDEC_BIT];
+      tb_block = tv[255 : 128];
+      tb_next = 1;
+      #(2 * CLK_PERIOD);
+      tb_next = 0;
+      wait_ready();
+
+      $display("TV %0d %032x", index, tb_result);
+
+      if (tb_result != tv[127 : 0])
+        begin
+          $display("*** ERROR: TV %0d NOT successful.", index);
+          $display("Expected: 0x%032x", tv[127 : 0]);
+          $display("Got:      0x%032x", tb_result);
+          error_ctr = error_ctr + 1;
+        end
+    end
+  endtask // test_vector
+
+
+  //----------------------------------------------------------------
+  // aes_core_vectors_test
+  //
+  // Load the test vectors given with +vectors=<file>, by default
+  // vectors.hex, and run them until the first unused entry.
+  //----------------------------------------------------------------
+  initial
+    begin : aes_core_vectors_test
+      integer i;
+
+      if (!$value$plusargs("vectors=%s", tv_file))
+        tv_file = "vectors.hex";
+
+      $display("   -= Testbench for aes core test vectors started =-");
+      $display("     ==============================================");
+      $display("");
+
+      $readmemh(tv_file, tv_mem);
+
+      init_sim();
+      reset_dut();
+
+      i = 0;
+      while ((i < MAX_VECTORS) && (^tv_mem[i] !== 1'bx))
+        begin
+          test_vector(i, tv_mem[i]);
+          i = i + 1;
+        end
+
+      display_test_result();
+      $display("");
+      $display("*** AES core test vector simulation done. ***");
+      $finish;
+    end // aes_core_vectors_test
+endmodule // tb_aes_core_vectors
+
+//======================================================================
+// EOF tb_aes_core_vectors.v
+//======================================================================
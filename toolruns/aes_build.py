@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_build.py
+# ------------
+# Build wrapper for the simulation targets in the Makefile keyed on
+# a hash of the build command and the contents of the sources, with
+# the binaries kept in a local cache directory.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2014, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import re
+import shutil
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+TOOLRUNS_DIR = os.path.dirname(os.path.abspath(__file__))
+MAKEFILE = os.path.join(TOOLRUNS_DIR, "Makefile")
+
+# Cache directory, can be changed with AES_SIM_CACHE.
+CACHE_DIR = os.environ.get("AES_SIM_CACHE", os.path.join(TOOLRUNS_DIR, ".sim_cache"))
+
+VAR_RE = re.compile(r"^([A-Za-z_][A-Za-z0-9_]*)\s*[?:]?=\s*(.*)$")
+RULE_RE = re.compile(r"^(\S+\.sim)\s*:")
+REF_RE = re.compile(r"\$\(([A-Za-z_][A-Za-z0-9_]*)\)")
+
+
+#-------------------------------------------------------------------
+# expand()
+#
+# Expand the $(VAR) references in the text.
+#-------------------------------------------------------------------
+def expand(text, variables):
+    while REF_RE.search(text):
+        text = REF_RE.sub(lambda m: variables.get(m.group(1), ""), text)
+    return text
+
+
+#-------------------------------------------------------------------
+# read_makefile()
+#
+# Return the build command of each .sim target in the Makefile
+# as a dict of argument lists. Variables given as overrides
+# replace the ones in the Makefile, as on the make command line.
+#-------------------------------------------------------------------
+def read_makefile(path=MAKEFILE, overrides={}):
+    with open(path) as f:
+        lines = f.read().replace("\\\n", " ").splitlines()
+
+    variables = {}
+    recipes = {}
+    target = None
+    for line in lines:
+        if target and line.startswith("\t"):
+            recipes[target] = line.strip()
+            target = None
+            continue
+
+        target = None
+        match = RULE_RE.match(line)
+        if match:
+            target = match.group(1)
+            continue
+
+        match = VAR_RE.match(line)
+        if match:
+            variables[match.group(1)] = match.group(2).strip()
+
+    variables.update(overrides)
+    return {name : expand(recipe, variables).split() for (name, recipe) in recipes.items()}
+
+
+#-------------------------------------------------------------------
+# get_sources()
+#
+# Return the source files in a build command, the arguments
+# that are not options and not the output file.
+#-------------------------------------------------------------------
+def get_sources(command):
+    sources = []
+    i = 1
+    while i < len(command):
+        if command[i] == "-o":
+            i += 2
+            continue
+        if not command[i].startswith("-"):
+            sources.append(command[i])
+        i += 1
+    return sources
+
+
+#-------------------------------------------------------------------
+# get_key()
+#
+# Return the cache key of a build command: a hash of the command
+# with the output file left out and the contents of each source.
+#-------------------------------------------------------------------
+def get_key(command, cwd=TOOLRUNS_DIR):
+    digest = hashlib.sha256()
+    i = 0
+    while i < len(command):
+        if command[i] == "-o":
+            i += 2
+            continue
+        digest.update(command[i].encode() + b"\0")
+        i += 1
+
+    for source in get_sources(command):
+        with open(os.path.join(cwd, source), "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+#-------------------------------------------------------------------
+# same_contents()
+#-------------------------------------------------------------------
+def same_contents(path_a, path_b):
+    if os.path.getsize(path_a) != os.path.getsize(path_b):
+        return False
+    with open(path_a, "rb") as fa, open(path_b, "rb") as fb:
+        return fa.read() == fb.read()
+
+
+#-------------------------------------------------------------------
+# build_target()
+#
+# Build one target with the given command unless the cache has
+# a binary for its key. Returns "current", "cached" or "built".
+#-------------------------------------------------------------------
+def build_target(target, command, cache_dir=CACHE_DIR, cwd=TOOLRUNS_DIR):
+    key = get_key(command, cwd)
+    cached = os.path.join(cache_dir, "%s-%s" % (target, key))
+    target_path = os.path.join(cwd, target)
+
+    if os.path.exists(cached):
+        if os.path.exists(target_path) and same_contents(cached, target_path):
+            return "current"
+        status = "cached"
+
+    else:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = "%s.%d.tmp" % (cached, os.getpid())
+        build_command = list(command)
+        build_command[build_command.index("-o") + 1] = tmp
+        try:
+            subprocess.check_call(build_command, cwd=cwd)
+            os.replace(tmp, cached)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        status = "built"
+
+    shutil.copy2(cached, target_path + ".tmp")
+    os.replace(target_path + ".tmp", target_path)
+    return status
+
+
+#-------------------------------------------------------------------
+# build_targets()
+#
+# Build the given targets, all .sim targets in the Makefile if
+# None, with up to jobs builds in parallel. Returns a dict with
+# the status of each target.
+#-------------------------------------------------------------------
+def build_targets(targets=None, jobs=1, overrides={}, cache_dir=CACHE_DIR):
+    commands = read_makefile(overrides=overrides)
+    if targets is None:
+        targets = sorted(commands)
+    for target in targets:
+        if target not in commands:
+            raise ValueError("No build rule for %s in %s." % (target, MAKEFILE))
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        statuses = pool.map(lambda t: build_target(t, commands[t], cache_dir), targets)
+        return dict(zip(targets, statuses))
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Build the targets given as arguments or all .sim targets.
+# Arguments of the form VAR=value override Makefile variables.
+#-------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Build simulation targets with a content hash cache.")
+    parser.add_argument("targets", nargs="*", help="Targets and VAR=value overrides.")
+    parser.add_argument("--jobs", type=int, default=1, help="Parallel builds.")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Cache directory.")
+    parser.add_argument("--list", action="store_true",
+                        help="List the targets with their sources and keys.")
+    args = parser.parse_args(argv)
+
+    overrides = dict(arg.split("=", 1) for arg in args.targets if "=" in arg)
+    targets = [arg for arg in args.targets if "=" not in arg] or None
+
+    if args.list:
+        for (target, command) in sorted(read_makefile(overrides=overrides).items()):
+            print("%s %s: %s" % (target, get_key(command)[0 : 16],
+                                 " ".join(get_sources(command))))
+        return 0
+
+    try:
+        statuses = build_targets(targets, args.jobs, overrides, args.cache_dir)
+    except (ValueError, OSError, subprocess.CalledProcessError) as error:
+        sys.stderr.write("aes_build: error: %s\n" % error)
+        return 1
+
+    for target in sorted(statuses):
+        print("%-14s %s" % (target, statuses[target]))
+    return 0
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_build.py
+#=======================================================================
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_regress.py
+# --------------
+# Regression runner sharding test vectors from aes_vectors.py over
+# parallel simulations of tb_aes_core_vectors.v and checking the
+# results against the model as they are printed.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2014, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import time
+import argparse
+import tempfile
+import binascii
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+TOOLRUNS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TOOLRUNS_DIR, "..", "src", "model", "python"))
+
+import aes_build
+import aes_vectors
+from aes_vectors import RECORD_SIZE, EXPECTED_OFFSET
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+# MAX_VECTORS in tb_aes_core_vectors.v.
+MAX_SHARD_VECTORS = 65536
+
+# Number of mismatches printed per shard.
+MAX_REPORTED = 5
+
+
+#-------------------------------------------------------------------
+# ShardResult
+#
+# Counters for one shard of the regression.
+#-------------------------------------------------------------------
+class ShardResult(object):
+    def __init__(self, index, first, count):
+        self.index = index
+        self.first = first
+        self.count = count
+        self.checked = 0
+        self.mismatches = 0
+        self.seconds = 0.0
+        self.status = None
+        self.messages = []
+
+
+    #---------------------------------------------------------------
+    # report()
+    #---------------------------------------------------------------
+    def report(self):
+        rate = self.checked / self.seconds if self.seconds else 0.0
+        line = "Shard %3d: vectors %d - %d, checked %d, mismatches %d, %.3f s, %.0f vectors/s" %\
+               (self.index, self.first, self.first + self.count - 1, self.checked,
+                self.mismatches, self.seconds, rate)
+        if self.status:
+            line += ", exit status %d" % self.status
+        return line
+
+
+#-------------------------------------------------------------------
+# run_shard()
+#
+# Write the records of one shard as a $readmemh file, run the
+# simulation on it and check each result line against the
+# expected result from the model as it is printed.
+#-------------------------------------------------------------------
+def run_shard(sim, records, result, work_dir):
+    hex_path = os.path.join(work_dir, "shard%d.hex" % result.index)
+    with open(hex_path, "wb") as f:
+        f.write(aes_vectors.to_hex_lines(records))
+
+    start = time.perf_counter()
+    proc = subprocess.Popen([sim, "+vectors=" + hex_path], stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, universal_newlines=True)
+    for line in proc.stdout:
+        if not line.startswith("TV "):
+            continue
+
+        (index, value) = line.split()[1:3]
+        index = int(index)
+        if index >= result.count:
+            result.mismatches += 1
+            if len(result.messages) < MAX_REPORTED:
+                result.messages.append("Unexpected result for vector %d." % index)
+            continue
+
+        offset = index * RECORD_SIZE + EXPECTED_OFFSET
+        expected = binascii.hexlify(records[offset : offset + 16]).decode()
+        result.checked += 1
+        if value.lower() != expected:
+            result.mismatches += 1
+            if len(result.messages) < MAX_REPORTED:
+                result.messages.append("Vector %d: expected %s, got %s." %
+                                       (result.first + index, expected, value))
+
+    result.status = proc.wait()
+    result.seconds = time.perf_counter() - start
+    os.remove(hex_path)
+    return result
+
+
+#-------------------------------------------------------------------
+# get_shards()
+#
+# Split the records into at least num_shards shards of at most
+# MAX_SHARD_VECTORS records each. Returns (first, records).
+#-------------------------------------------------------------------
+def get_shards(records, num_shards):
+    total = len(records) // RECORD_SIZE
+    per_shard = max(1, min(MAX_SHARD_VECTORS, -(-total // max(1, num_shards))))
+    return [(first, records[first * RECORD_SIZE : (first + per_shard) * RECORD_SIZE])
+            for first in range(0, total, per_shard)]
+
+
+#-------------------------------------------------------------------
+# run_regression()
+#
+# Run all records on the given simulation with jobs processes
+# at a time. Returns the shard results.
+#-------------------------------------------------------------------
+def run_regression(sim, records, jobs, shards=None):
+    shards = get_shards(records, shards or jobs)
+    results = [ShardResult(i, first, len(data) // RECORD_SIZE)
+               for (i, (first, data)) in enumerate(shards)]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(run_shard, sim, data, result, work_dir)
+                       for ((first, data), result) in zip(shards, results)]
+            for future in futures:
+                result = future.result()
+                print(result.report())
+                for message in result.messages:
+                    print("    " + message)
+                sys.stdout.flush()
+
+    return results
+
+
+#-------------------------------------------------------------------
+# gen_parser()
+#-------------------------------------------------------------------
+def gen_parser():
+    parser = argparse.ArgumentParser(
+        description="Run AES test vectors on parallel core simulations.")
+    parser.add_argument("--vectors", help="Binary test vector file from aes_vectors.py.")
+    parser.add_argument("--count", type=int, default=100000,
+                        help="Number of vectors to generate without --vectors.")
+    parser.add_argument("--seed", type=int, help="Seed for the generated vectors.")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of simulations run in parallel.")
+    parser.add_argument("--shards", type=int,
+                        help="Number of shards, by default the number of jobs.")
+    parser.add_argument("--sim", default=os.path.join(TOOLRUNS_DIR, "vectors.sim"),
+                        help="Simulation to run.")
+    parser.add_argument("--no-build", action="store_true",
+                        help="Do not build vectors.sim with aes_build.py.")
+    return parser
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Build the simulation if needed, run the regression and print
+# the totals. Returns 1 if any vector failed.
+#-------------------------------------------------------------------
+def main(argv=None):
+    args = gen_parser().parse_args(argv)
+
+    if not args.no_build:
+        try:
+            statuses = aes_build.build_targets(["vectors.sim"])
+        except (ValueError, OSError, subprocess.CalledProcessError) as error:
+            sys.stderr.write("aes_regress: error: %s\n" % error)
+            return 1
+        print("vectors.sim: %s" % statuses["vectors.sim"])
+
+    if args.vectors:
+        records = b"".join(aes_vectors.read_vectors(args.vectors))
+    else:
+        records = b"".join(aes_vectors.gen_vectors(args.count, args.seed))
+
+    start = time.perf_counter()
+    results = run_regression(args.sim, records, max(1, args.jobs), args.shards)
+    elapsed = time.perf_counter() - start
+
+    total = len(records) // RECORD_SIZE
+    checked = sum(r.checked for r in results)
+    mismatches = sum(r.mismatches for r in results)
+    failed = [r for r in results if r.status]
+    print("")
+    print("Vectors: %d, checked: %d, mismatches: %d, failed shards: %d" %
+          (total, checked, mismatches, len(failed)))
+    print("Time: %.3f s, %.0f vectors/s with %d jobs" %
+          (elapsed, checked / elapsed if elapsed else 0.0, max(1, args.jobs)))
+
+    if mismatches or failed or checked != total:
+        return 1
+    return 0
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_regress.py
+#=======================================================================